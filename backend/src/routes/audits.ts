@@ -7,6 +7,10 @@ import { AuthRequest } from '../types';
 
 const router = Router();
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
+const ML_POLL_INTERVAL_MS = 2000;
+// give up on an audit after this long (default 1h), and after this many failed polls in a row
+const ML_AUDIT_TIMEOUT_MS = parseInt(process.env.ML_AUDIT_TIMEOUT_MS || '3600000');
+const ML_POLL_MAX_ERRORS = parseInt(process.env.ML_POLL_MAX_ERRORS || '5');
 
 // trigger a new audit
 router.post('/run',
@@ -65,15 +69,17 @@ async function triggerMLAudit(auditId: string, modelPath: string, auditType: str
   await query(`UPDATE audits SET status = 'running' WHERE id = $1`, [auditId]);
 
   try {
-    const response = await axios.post(`${ML_SERVICE_URL}/audit`, {
+    // queue the audit on the ml service, it answers right away with a job id
+    await axios.post(`${ML_SERVICE_URL}/audit`, {
       audit_id: auditId,
       model_path: modelPath,
-      audit_type: auditType
+      audit_type: auditType,
+      wait: false
     }, {
-      timeout: 300000 // 5 min timeout for big models
+      timeout: 30000
     });
 
-    const results = response.data;
+    const results = await waitForMLAudit(auditId);
 
     // update audit with results
     await query(
@@ -102,6 +108,67 @@ async function triggerMLAudit(auditId: string, modelPath: string, auditType: str
   }
 }
 
+// the ml service finished the audit without results (failed / cancelled)
+class MLAuditEndedError extends Error {}
+
+// poll the ml service until the queued audit is done, cancelling it there if we give up
+async function waitForMLAudit(auditId: string): Promise<any> {
+  const deadline = Date.now() + ML_AUDIT_TIMEOUT_MS;
+  let errors = 0;
+
+  try {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, ML_POLL_INTERVAL_MS));
+      if (Date.now() > deadline) {
+        throw new Error(`Audit timed out after ${Math.round(ML_AUDIT_TIMEOUT_MS / 1000)}s`);
+      }
+
+      let job: any;
+      try {
+        ({ data: job } = await axios.get(`${ML_SERVICE_URL}/audit/${auditId}`, {
+          timeout: 30000
+        }));
+        errors = 0;
+      } catch (err: any) {
+        // network errors, timeouts, 5xx and a 404 while the service restarts are worth retrying
+        errors++;
+        if (!isTransientError(err) || errors >= ML_POLL_MAX_ERRORS) {
+          throw err;
+        }
+        console.warn(`Polling audit ${auditId} failed (${errors}/${ML_POLL_MAX_ERRORS}):`, err.message);
+        continue;
+      }
+
+      if (job.status === 'completed') {
+        return job.result;
+      }
+      if (job.status === 'failed' || job.status === 'cancelled') {
+        throw new MLAuditEndedError(job.error || `Audit ${job.status}`);
+      }
+    }
+  } catch (err) {
+    // the job is already over for a failed / cancelled status, otherwise stop it
+    if (!(err instanceof MLAuditEndedError)) {
+      await cancelMLAudit(auditId);
+    }
+    throw err;
+  }
+}
+
+function isTransientError(err: any): boolean {
+  const status = err.response?.status;
+  return status === undefined || status === 404 || status === 429 || status >= 500;
+}
+
+// best effort, the audit is marked failed either way
+async function cancelMLAudit(auditId: string) {
+  try {
+    await axios.delete(`${ML_SERVICE_URL}/audit/${auditId}`, { timeout: 10000 });
+  } catch (err: any) {
+    console.warn(`Could not cancel audit ${auditId}:`, err.message);
+  }
+}
+
 // get audit status
 router.get('/:id', authenticate, async (req: AuthRequest, res: Response) => {
   try {
@@ -1,24 +1,49 @@
 import os
+import itertools
 import joblib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import pandas as pd
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 import logging
 
-# fairness libs
-from fairlearn.metrics import (
-    demographic_parity_difference,
-    equalized_odds_difference,
-    MetricFrame
+from config import config
+from explainability import (
+    ExplainerCache, build_explainer, compute_shap_values, permutation_importance, sparse_importance
 )
-from aif360.datasets import BinaryLabelDataset
-from aif360.metrics import BinaryLabelDatasetMetric, ClassificationMetric
+from group_metrics import (
+    GroupConfusionCounts, SensitiveEncoder, factorize_rows, threshold_counts, threshold_sweep,
+    worst_attributes, worst_case
+)
+from instrumentation import StageTimings, profile_call
+from stage_scheduler import StageScheduler
+from compact import compact_frame, compact_labels, float32_safe, memory_footprint, select_columns
+from dataset_cache import DatasetCache
+from fingerprint import cached_file_digest
+from deep_inference import KerasModel, TorchModel
+from model_cache import ModelCache
+from onnx_inference import OnnxModel, load_session
+from prediction_store import PredictionStore
+from sampling import StratifiedSample, interval
+from sparse_data import SparseFeatures, data_digest, densify_batches, is_sparse_path, load_sparse, with_width
 
-# explainability
-import shap
+# heavy libs (shap, torch, tensorflow, onnxruntime) are imported where they're
+# used so the service starts fast, see warmup.py for preloading them
 
 logger = logging.getLogger(__name__)
 
+# metrics a threshold sweep can optimize for
+SWEEP_METRICS = (
+    "demographic_parity", "equalized_odds", "disparate_impact",
+    "statistical_parity_difference", "equal_opportunity_difference", "average_odds_difference"
+)
+
+
+class AuditCancelled(Exception):
+    """Raised from a progress callback to stop an audit between stages."""
+    pass
+
+
 class AuditEngine:
     """
     Main audit engine that runs bias detection, fairness metrics, and explainability.
@@ -29,132 +54,912 @@ class AuditEngine:
         self.supported_frameworks = ['sklearn', 'pytorch', 'tensorflow', 'onnx']
         # default sensitive features if none provided
         self.default_sensitive = ['gender', 'sex', 'race', 'age', 'ethnicity']
+        # the same uploads get audited over and over, keep them deserialized
+        self.model_cache = ModelCache(
+            max_bytes=config.MODEL_CACHE_MAX_MB * 1024 * 1024,
+            hash_content=config.MODEL_CACHE_HASH_CONTENT
+        )
+        # building a shap explainer (background summary etc) isn't free either
+        self.explainer_cache = ExplainerCache(config.SHAP_EXPLAINER_CACHE_SIZE)
+        # parsed CSVs, memory-mapped on repeat loads
+        self.dataset_cache = DatasetCache(
+            config.DATASET_CACHE_DIR, config.DATASET_CACHE_MAX_MB * 1024 * 1024
+        )
+        # group counts + explainability per (model, dataset) for cheap re-scoring
+        self.prediction_store = PredictionStore(
+            config.PREDICTION_STORE_DIR, config.PREDICTION_STORE_MAX_MB * 1024 * 1024
+        )
+        # set while a profiled audit runs, its stages must stay on one thread
+        self._profiling = False
     
     def run_audit(
         self,
         model_path: str,
         audit_type: str = "full",
         sensitive_features: Optional[List[str]] = None,
-        test_data_path: Optional[str] = None
+        test_data_path: Optional[str] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None,
+        streaming: Optional[bool] = None,
+        profile: bool = False,
+        thresholds: Optional[Dict[str, float]] = None,
+        target_error: Optional[float] = None,
+        event_callback: Optional[Callable[[Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """
         Run the full audit pipeline.
         Returns all metrics and scores.
+
+        progress_callback gets (stage, fraction_done) before each stage. It can
+        raise AuditCancelled to abort the audit.
+
+        event_callback gets a dict per event as the audit goes: stage_started /
+        stage_finished, rows (rows predicted so far) and metrics (bias /
+        fairness metrics and the compliance score as soon as each is known,
+        so they arrive while explainability is still running).
+
+        streaming reads the test data in chunks instead of all at once, so
+        memory is bounded by STREAM_CHUNK_ROWS. None means decide from the file
+        size (STREAM_THRESHOLD_MB). Sparse test data (see sparse_data.py) is
+        never streamed, its CSR matrix is small to begin with.
+
+        The results carry per-stage timings; profile=True also attaches a
+        cProfile summary of the whole run.
+
+        thresholds overrides the scoring thresholds / compliance weights from
+        the config (see _thresholds). When the same model and test data were
+        audited before, the stored group counts and explainability are reused
+        and only the scoring runs again.
+
+        audit_type "quick" computes the bias and fairness metrics from a
+        stratified sample instead, see _run_quick_audit; target_error
+        overrides QUICK_TARGET_ERROR for it.
         """
+        if profile:
+            # cProfile only sees this thread, so stages run one after another
+            self._profiling = True
+            try:
+                results, summary = profile_call(
+                    self.run_audit, model_path, audit_type, sensitive_features,
+                    test_data_path, progress_callback, streaming, thresholds=thresholds,
+                    target_error=target_error, event_callback=event_callback,
+                    top=config.PROFILE_TOP_FUNCTIONS
+                )
+            finally:
+                self._profiling = False
+            results["profile"] = summary
+            return results
+        
+        timings = StageTimings(event_callback)
+        results = self._empty_results()
+        results["audit_type"] = audit_type
+        results["thresholds"] = self._thresholds(thresholds)
+        
+        has_test_data = bool(test_data_path) and os.path.exists(test_data_path)
+        if audit_type == "quick":
+            return self._run_quick_audit(
+                results, timings, model_path, sensitive_features,
+                test_data_path if has_test_data else None, target_error, progress_callback,
+                event_callback
+            )
+        if has_test_data and is_sparse_path(test_data_path):
+            streaming = False
+        elif streaming is None:
+            streaming = has_test_data and (
+                os.path.getsize(test_data_path) >= config.STREAM_THRESHOLD_MB * 1024 * 1024
+            )
+        
+        # same model and data as before: only the scoring has to run again
+        store_key = stored = None
+        if has_test_data and self.prediction_store.enabled:
+            with timings.stage("loading_predictions"):
+                store_key = self._store_key(model_path, test_data_path, sensitive_features, streaming)
+                stored = self.prediction_store.load(store_key)
+            needs_explainability = audit_type in ["explainability", "full"]
+            if stored is not None and (stored["explainability"] or not needs_explainability):
+                logger.info(f"Re-scoring stored predictions for {model_path}")
+                results["reused_predictions"] = True
+                try:
+                    self._complete_audit(
+                        results, audit_type, stored["counts"], stored["sensitive_cols"],
+                        None, None, None, None, None, progress_callback, timings,
+                        explainability=stored["explainability"], event_callback=event_callback
+                    )
+                except AuditCancelled:
+                    raise
+                except Exception as e:
+                    logger.error(f"Audit computation error: {e}")
+                    results["warnings"].append(f"Partial audit: {str(e)}")
+                results["timings"] = timings.to_dict()
+                return results
+        
         logger.info(f"Loading model from {model_path}")
         
         # load the model
-        model, framework = self._load_model(model_path)
+        self._report_progress(progress_callback, "loading_model", 0.0)
+        with timings.stage("loading_model"):
+            model, framework = self._load_model(model_path)
         
         # generate or load test data
+        self._report_progress(progress_callback, "loading_data", 0.1)
+        # only the columns the model and metrics use, as compact as the model allows
+        layout = self._data_layout(model, framework, sensitive_features)
+        with timings.stage("loading_data"):
+            if streaming and has_test_data:
+                # read chunk by chunk together with the predictions below
+                X_test = y_test = sensitive_cols = None
+            elif has_test_data:
+                X_test, y_test, sensitive_cols = self._load_test_data(
+                    test_data_path, sensitive_features, **layout
+                )
+            else:
+                # generate synthetic data for testing
+                # not ideal but works for demo purposes
+                X_test, y_test, sensitive_cols = self._generate_synthetic_data(
+                    sensitive_features, layout["float32"]
+                )
+        
+        try:
+            # get predictions
+            self._report_progress(progress_callback, "predicting", 0.2)
+            with timings.stage("predicting"):
+                y_pred = None
+                if X_test is None:
+                    # streaming: only the per-group counts and a small sample survive
+                    counts, X_test, y_test, sensitive_cols = self._stream_group_counts(
+                        model, framework, test_data_path, sensitive_features, progress_callback,
+                        layout, event_callback
+                    )
+                else:
+                    y_pred = self._get_predictions(model, X_test, framework)
+                    # one pass over the data, every metric below comes from these counts
+                    counts = self._group_counts(y_test, y_pred, X_test, sensitive_cols)
+                    self._emit(event_callback, "rows", rows=len(y_pred), fraction=1.0)
+            results["memory"] = memory_footprint(X_test, y_test, y_pred)
+            
+            self._complete_audit(
+                results, audit_type, counts, sensitive_cols,
+                model, framework, self.model_cache.key_for(model_path),
+                X_test, y_test, progress_callback, timings, event_callback=event_callback
+            )
+            
+            if store_key is not None:
+                explainability = results["explainability"] if results["explainability"].get(
+                    "feature_importance"
+                ) else None
+                self.prediction_store.save(store_key, counts, sensitive_cols, explainability)
+            
+        except AuditCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Audit computation error: {e}")
+            results["warnings"].append(f"Partial audit: {str(e)}")
+        
+        results["timings"] = timings.to_dict()
+        return results
+    
+    def _run_quick_audit(
+        self,
+        results: Dict[str, Any],
+        timings: StageTimings,
+        model_path: str,
+        sensitive_features: Optional[List[str]],
+        test_data_path: Optional[str],
+        target_error: Optional[float] = None,
+        progress_callback=None,
+        event_callback=None
+    ) -> Dict[str, Any]:
+        """
+        Bias and fairness metrics from a stratified sample of the test data
+        (sensitive group x label, see sampling.py), predicting only the
+        sampled rows. Every metric gets the interval it could be off by at
+        BOOTSTRAP_CONFIDENCE, and with a target error the sample keeps growing
+        (only the new rows are predicted) until all of them are within it, the
+        whole test set is sampled or QUICK_MAX_ROWS is reached.
+        """
+        target_error = config.QUICK_TARGET_ERROR if target_error is None else target_error
+        confidence = config.BOOTSTRAP_CONFIDENCE
+        
+        self._report_progress(progress_callback, "loading_model", 0.0)
+        with timings.stage("loading_model"):
+            model, framework = self._load_model(model_path)
+        
+        self._report_progress(progress_callback, "loading_data", 0.1)
+        layout = self._data_layout(model, framework, sensitive_features)
+        with timings.stage("loading_data"):
+            if test_data_path:
+                X_test, y_test, sensitive_cols = self._load_test_data(
+                    test_data_path, sensitive_features, **layout
+                )
+            else:
+                X_test, y_test, sensitive_cols = self._generate_synthetic_data(
+                    sensitive_features, layout["float32"]
+                )
+        
+        try:
+            with timings.stage("sampling"):
+                sensitive = self._sensitive_frame(X_test, sensitive_cols, len(y_test))
+                codes, cells = factorize_rows(sensitive)
+                strata = np.where(codes >= 0, codes * 2 + (np.asarray(y_test) == 1), -1)
+                sample = StratifiedSample(strata, 2 * len(cells), config.QUICK_MIN_STRATUM_ROWS)
+                # a cell of missing values has no rows, drop it
+                kept = [i for i, cell in enumerate(cells) if cell is not None]
+                attributes = list(sensitive.columns)
+            
+            rows, rounds, errors = config.QUICK_SAMPLE_ROWS, 0, {}
+            while True:
+                rounds += 1
+                self._report_progress(
+                    progress_callback, "predicting", 0.2 + 0.2 * sample.rows_taken / max(sample.rows_total, 1)
+                )
+                with timings.stage("predicting"):
+                    new = sample.grow(rows)
+                    if len(new):
+                        sample.add(new, self._get_predictions(model, X_test.iloc[new], framework))
+                
+                with timings.stage("sampling_error"):
+                    counts = GroupConfusionCounts.from_dict({
+                        "attributes": attributes,
+                        "groups": [cells[i] for i in kept],
+                        "counts": np.rint(sample.estimated_counts()[kept]),
+                    })
+                    replicates = sample.replicate_counts(config.QUICK_REPLICATES)[:, kept]
+                    intervals = self._sampling_intervals(counts, replicates, confidence)
+                    errors = self._sampling_errors(
+                        self._worst_case_intervals(self._analyze_groups(counts, intervals))
+                    )
+                
+                worst = max(errors.values(), default=0.0)
+                self._emit(
+                    event_callback, "rows", rows=sample.rows_taken,
+                    fraction=sample.rows_taken / max(sample.rows_total, 1), errors=errors
+                )
+                if (
+                    target_error <= 0 or worst <= target_error or sample.complete
+                    or sample.rows_taken >= config.QUICK_MAX_ROWS
+                ):
+                    break
+                # the error shrinks with the square root of the sample size
+                needed = sample.rows_taken * (worst / target_error) ** 2 * 1.2
+                rows = int(min(max(needed, 2 * sample.rows_taken), config.QUICK_MAX_ROWS))
+            
+            results["sampling"] = {
+                "rows_total": sample.rows_total,
+                "rows_sampled": sample.rows_taken,
+                "sample_fraction": sample.rows_taken / max(sample.rows_total, 1),
+                "strata": int((sample.sizes > 0).sum()),
+                "rounds": rounds,
+                "confidence": confidence,
+                "target_error": target_error,
+                "target_met": target_error <= 0 or worst <= target_error,
+                "errors": errors,
+            }
+            results["memory"] = memory_footprint(X_test, y_test)
+            
+            self._complete_audit(
+                results, "quick", counts, sensitive_cols, model, framework,
+                self.model_cache.key_for(model_path), X_test, y_test,
+                progress_callback, timings, intervals=intervals, event_callback=event_callback
+            )
+            if not results["sampling"]["target_met"]:
+                results["warnings"].append(
+                    f"Quick audit stopped at {sample.rows_taken} sampled rows with metric errors "
+                    f"up to {worst:.3f}, above the {target_error:g} target"
+                )
+        
+        except AuditCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Audit computation error: {e}")
+            results["warnings"].append(f"Partial audit: {str(e)}")
+        
+        results["timings"] = timings.to_dict()
+        return results
+    
+    def _sampling_intervals(self, counts: GroupConfusionCounts, replicates: np.ndarray, confidence: float):
+        """intervals callback for _analyze_groups from sampling replicates of the joint counts."""
+        def intervals(sub: GroupConfusionCounts, attributes: List[str], min_size: int):
+            stack = replicates
+            if len(attributes) < len(counts.attributes):
+                stack = counts.marginal_stack(attributes, replicates)
+            values = sub.batch_metrics(stack, min_size)
+            return {name: interval(v, confidence) for name, v in values.items()}
+        return intervals
+    
+    def _sampling_errors(self, intervals: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+        """How far each reported metric may be off: half the width of its interval."""
+        return {
+            name: (bounds["high"] - bounds["low"]) / 2 for name, bounds in intervals.items()
+        }
+    
+    def run_batch_audit(
+        self,
+        models: List[Dict[str, Any]],
+        audit_type: str = "full",
+        sensitive_features: Optional[List[str]] = None,
+        test_data_path: Optional[str] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Audit several models against the same test data.
+        
+        models is a list of {"model_path": ..., "audit_type": ...} (audit_type
+        optional, defaults to the batch one). The data is loaded and its
+        sensitive groups factorized once, and every distinct model is
+        predicted once, concurrently on a thread pool - so the same model can
+        be listed with several audit types for free.
+        """
+        self._report_progress(progress_callback, "loading_data", 0.0)
         if test_data_path and os.path.exists(test_data_path):
             X_test, y_test, sensitive_cols = self._load_test_data(test_data_path, sensitive_features)
         else:
-            # generate synthetic data for testing
-            # not ideal but works for demo purposes
             X_test, y_test, sensitive_cols = self._generate_synthetic_data(sensitive_features)
         
-        results = {
+        sensitive = self._sensitive_frame(X_test, sensitive_cols, len(y_test))
+        group_codes, group_cells = factorize_rows(sensitive)
+        
+        # predict every distinct model once
+        self._report_progress(progress_callback, "predicting", 0.1)
+        paths = list(dict.fromkeys(item["model_path"] for item in models))
+        predictions: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        
+        def predict(path):
+            model, framework = self._load_model(path)
+            return model, framework, self._get_predictions(model, X_test, framework)
+        
+        workers = max(1, min(len(paths), config.BATCH_PREDICT_THREADS))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(predict, path): path for path in paths}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                try:
+                    predictions[path] = future.result()
+                except Exception as e:
+                    logger.error(f"Batch prediction failed for {path}: {e}")
+                    errors[path] = str(e)
+                self._report_progress(progress_callback, "predicting", 0.1 + 0.4 * done / len(paths))
+        
+        batch_results = []
+        for i, item in enumerate(models):
+            path = item["model_path"]
+            item_type = item.get("audit_type") or audit_type
+            results = self._empty_results()
+            results.update({"model_path": path, "audit_type": item_type, "status": "completed"})
+            self._report_progress(progress_callback, "auditing", 0.5 + 0.5 * i / len(models))
+            
+            if path in errors:
+                results["status"] = "failed"
+                results["error"] = errors[path]
+                batch_results.append(results)
+                continue
+            
+            model, framework, y_pred = predictions[path]
+            timings = StageTimings()
+            try:
+                counts = GroupConfusionCounts.from_codes(
+                    list(sensitive.columns), group_codes, group_cells, y_test, y_pred
+                )
+                self._complete_audit(
+                    results, item_type, counts, sensitive_cols,
+                    model, framework, self.model_cache.key_for(path),
+                    X_test, y_test, timings=timings
+                )
+            except AuditCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"Audit computation error for {path}: {e}")
+                results["warnings"].append(f"Partial audit: {str(e)}")
+            results["timings"] = timings.to_dict()
+            batch_results.append(results)
+        
+        return batch_results
+    
+    def run_threshold_sweep(
+        self,
+        model_path: str,
+        sensitive_features: Optional[List[str]] = None,
+        test_data_path: Optional[str] = None,
+        n_thresholds: Optional[int] = None,
+        metric: Optional[str] = None,
+        accuracy_tolerance: Optional[float] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Fairness and accuracy at many decision thresholds from one set of scores.
+
+        Scores (predict_proba / raw outputs) are computed once and the group
+        confusion counts at every threshold come from sorted scores
+        (threshold_counts), so hundreds of thresholds cost about as much as
+        one. Returns the worst-case curve over the sensitive attributes, the
+        per-attribute curves, the fairness-accuracy frontier and the fairest
+        threshold whose accuracy is within accuracy_tolerance of the best.
+        """
+        metric = metric or config.SWEEP_METRIC
+        if metric not in SWEEP_METRICS:
+            raise ValueError(f"Unknown sweep metric: {metric}")
+        tolerance = config.SWEEP_ACCURACY_TOLERANCE if accuracy_tolerance is None else accuracy_tolerance
+        timings = StageTimings()
+        
+        self._report_progress(progress_callback, "loading_model", 0.0)
+        with timings.stage("loading_model"):
+            model, framework = self._load_model(model_path)
+        
+        self._report_progress(progress_callback, "loading_data", 0.1)
+        layout = self._data_layout(model, framework, sensitive_features)
+        with timings.stage("loading_data"):
+            if test_data_path and os.path.exists(test_data_path):
+                X_test, y_test, sensitive_cols = self._load_test_data(
+                    test_data_path, sensitive_features, **layout
+                )
+            else:
+                X_test, y_test, sensitive_cols = self._generate_synthetic_data(
+                    sensitive_features, layout["float32"]
+                )
+        
+        self._report_progress(progress_callback, "predicting", 0.3)
+        with timings.stage("predicting"):
+            scores = self._get_scores(model, X_test, framework)
+        
+        self._report_progress(progress_callback, "sweeping", 0.7)
+        with timings.stage("sweeping"):
+            thresholds = self._sweep_thresholds(scores, n_thresholds or config.SWEEP_THRESHOLDS)
+            sensitive = self._sensitive_frame(X_test, sensitive_cols, len(y_test))
+            by_attribute = {
+                col: threshold_sweep(sensitive[[col]], y_test, scores, thresholds)
+                for col in sensitive.columns
+            }
+            curve = self._worst_case_curve(by_attribute)
+            overall = threshold_counts(np.zeros(len(scores), dtype=np.int64), 1, y_test, scores, thresholds)[:, 0]
+            curve["accuracy"] = (overall[:, 3] + overall[:, 0]) / max(len(scores), 1)
+            curve["selection_rate"] = (overall[:, 3] + overall[:, 1]) / max(len(scores), 1)
+            
+            # disparate impact is best at 1, everything else at 0
+            disparity = np.abs(1 - curve[metric]) if metric == "disparate_impact" else curve[metric]
+            eligible = curve["accuracy"] >= curve["accuracy"].max() - tolerance
+            # fairest eligible threshold, the more accurate one on ties
+            fairest = np.lexsort((-curve["accuracy"], np.where(eligible, disparity, np.inf)))[0]
+            
+            def point(i):
+                return {"threshold": float(thresholds[i]), **{k: float(v[i]) for k, v in curve.items()}}
+            
+            # pareto frontier: walking from fairest to least fair, keep points that gain accuracy
+            frontier, best_accuracy = [], -np.inf
+            for i in np.lexsort((-curve["accuracy"], disparity)):
+                if curve["accuracy"][i] > best_accuracy:
+                    frontier.append(point(i))
+                    best_accuracy = curve["accuracy"][i]
+        
+        return {
+            "audit_type": "threshold_sweep",
+            "metric": metric,
+            "accuracy_tolerance": tolerance,
+            "thresholds": thresholds.tolist(),
+            "curve": {k: v.tolist() for k, v in curve.items()},
+            "by_attribute": {
+                attr: {k: v.tolist() for k, v in metrics.items()}
+                for attr, metrics in by_attribute.items()
+            },
+            "fairness_optimal": point(fairest),
+            "accuracy_optimal": point(int(np.argmax(curve["accuracy"]))),
+            "frontier": frontier,
+            "timings": timings.to_dict(),
+        }
+    
+    def _get_scores(self, model, X, framework: str) -> np.ndarray:
+        """Positive class scores, thresholded at 0.5 they give _get_predictions."""
+        if framework != 'sklearn':
+            return self._predict_scores(model, X, framework)
+        if hasattr(model, 'predict_proba'):
+            return np.asarray(self._sklearn_call(model, "predict_proba", X))[:, -1]
+        if hasattr(model, 'decision_function'):
+            return np.asarray(self._sklearn_call(model, "decision_function", X)).reshape(-1)
+        return np.asarray(self._sklearn_call(model, "predict", X), dtype=np.float64)
+    
+    def _sweep_thresholds(self, scores: np.ndarray, n_thresholds: int) -> np.ndarray:
+        """Evenly spaced over [0, 1] for probabilities, over the score range otherwise."""
+        low, high = float(np.min(scores)), float(np.max(scores))
+        if low >= 0 and high <= 1:
+            low, high = 0.0, 1.0
+        return np.linspace(low, high, max(n_thresholds, 2))
+    
+    def _worst_case_curve(self, by_attribute: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Per threshold worst value over the attributes, like worst_case."""
+        curve = {}
+        for name in SWEEP_METRICS:
+            stacked = np.stack([metrics[name] for metrics in by_attribute.values()])
+            if name == "disparate_impact":
+                worst = np.argmax(np.abs(1 - stacked), axis=0)
+                curve[name] = stacked[worst, np.arange(stacked.shape[1])]
+            else:
+                curve[name] = stacked.max(axis=0)
+        return curve
+    
+    def _empty_results(self) -> Dict[str, Any]:
+        return {
             "bias_score": 0.0,
             "fairness_score": 0.0,
             "cern_compliance": 0.0,
             "bias_metrics": {},
             "fairness_metrics": {},
+            "group_metrics": {},
+            "confidence_intervals": {},
             "explainability": {},
             "cern_compliance_details": {},
             "warnings": [],
-            "recommendations": []
+            "recommendations": [],
+            "memory": {}
         }
+    
+    def _thresholds(self, overrides: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """Scoring thresholds and compliance weights, config values unless overridden."""
+        thresholds = {
+            "bias_threshold": config.BIAS_THRESHOLD,
+            "disparate_impact_min": config.DISPARATE_IMPACT_MIN,
+            "transparency_weight": config.TRANSPARENCY_WEIGHT,
+            "accountability_weight": config.ACCOUNTABILITY_WEIGHT,
+            "fairness_weight": config.FAIRNESS_WEIGHT,
+            "safety_weight": config.SAFETY_WEIGHT,
+        }
+        for name, value in (overrides or {}).items():
+            if name not in thresholds:
+                raise ValueError(f"Unknown threshold: {name}")
+            thresholds[name] = float(value)
+        return thresholds
+    
+    def _store_key(
+        self,
+        model_path: str,
+        data_path: str,
+        sensitive_features: Optional[List[str]],
+        streaming: bool
+    ) -> str:
+        """Prediction store key: content of model + data and every setting that shapes the counts."""
+        return self.prediction_store.key_for(
+            cached_file_digest(model_path),
+            data_digest(data_path),
+            sensitive_features,
+            bool(streaming),
+            config.STREAM_CHUNK_ROWS if streaming else None,
+            config.SENSITIVE_MAX_CATEGORIES,
+            config.SENSITIVE_BUCKETS,
+            [config.SHAP_EXPLAINER, config.SHAP_SAMPLE_ROWS, config.SHAP_BACKGROUND_K, config.SHAP_NSAMPLES],
+            [config.PERMUTATION_SAMPLE_ROWS, config.PERMUTATION_REPEATS],
+            [config.LIBSVM_ZERO_BASED, config.SPARSE_TOP_FEATURES],
+            # dtypes and inference settings change the predictions themselves
+            [config.COMPACT_DTYPES, config.FLOAT32_FEATURES, config.STREAM_SAMPLE_ROWS],
+            [config.ONNX_BATCH_ROWS, config.ONNX_IO_BINDING, config.ONNX_GRAPH_OPTIMIZATION],
+            [config.INFERENCE_BATCH_ROWS, config.TORCH_COMPILE, config.TF_GRAPH_MODE],
+        )
+    
+    def _complete_audit(
+        self,
+        results: Dict[str, Any],
+        audit_type: str,
+        counts: GroupConfusionCounts,
+        sensitive_cols: List[str],
+        model,
+        framework: str,
+        model_key: str,
+        X_test,
+        y_test,
+        progress_callback=None,
+        timings: Optional[StageTimings] = None,
+        explainability: Optional[Dict[str, Any]] = None,
+        intervals: Optional[Callable[[GroupConfusionCounts, List[str], int], Dict[str, List[float]]]] = None,
+        event_callback=None
+    ):
+        """
+        Everything after the predictions: metrics, explainability, scores.
+        A precomputed explainability result is used as is. Independent stages
+        run concurrently (STAGE_THREADS), compliance once they're all done.
+        intervals replaces the bootstrap intervals, see _analyze_groups.
+        Each metric block goes to event_callback as soon as it's computed.
+        """
+        timings = timings or StageTimings()
+        scheduler = StageScheduler(1 if self._profiling else config.STAGE_THREADS)
+        group_analysis: Dict[str, Any] = {}
         
-        try:
-            # get predictions
-            y_pred = self._get_predictions(model, X_test, framework)
-            
-            # run bias detection
-            if audit_type in ["bias", "full"]:
-                results["bias_metrics"] = self._compute_bias_metrics(
-                    y_test, y_pred, X_test, sensitive_cols
-                )
+        # per attribute and intersection metrics, all marginals of the counts
+        def analyze_groups():
+            with timings.stage("group_analysis"):
+                group_analysis.update(self._analyze_groups(counts, intervals))
+                results["confidence_intervals"] = self._worst_case_intervals(group_analysis)
+            if sensitive_cols:
+                results["group_metrics"] = group_analysis
+        
+        # run bias detection
+        def bias_metrics():
+            self._report_progress(progress_callback, "bias_metrics", 0.4)
+            with timings.stage("bias_metrics"):
+                results["bias_metrics"] = self._bias_metrics_from_groups(group_analysis)
                 results["bias_score"] = self._calculate_bias_score(results["bias_metrics"])
-            
-            # run fairness metrics
-            if audit_type in ["fairness", "full"]:
-                results["fairness_metrics"] = self._compute_fairness_metrics(
-                    y_test, y_pred, X_test, sensitive_cols
+            self._emit(
+                event_callback, "metrics", stage="bias_metrics",
+                bias_metrics=results["bias_metrics"], bias_score=results["bias_score"],
+                confidence_intervals=results["confidence_intervals"]
+            )
+        
+        # run fairness metrics
+        def fairness_metrics():
+            self._report_progress(progress_callback, "fairness_metrics", 0.5)
+            with timings.stage("fairness_metrics"):
+                results["fairness_metrics"] = self._fairness_metrics_from_groups(
+                    group_analysis, sensitive_cols
                 )
                 results["fairness_score"] = self._calculate_fairness_score(results["fairness_metrics"])
-            
-            # run explainability
-            if audit_type in ["explainability", "full"]:
-                results["explainability"] = self._compute_explainability(
-                    model, X_test, framework
-                )
-            
-            # compute CERN compliance
-            results["cern_compliance_details"] = self._compute_cern_compliance(results)
-            results["cern_compliance"] = results["cern_compliance_details"]["overall_score"]
-            
-            # generate warnings and recommendations
-            results["warnings"] = self._generate_warnings(results)
-            results["recommendations"] = self._generate_recommendations(results)
-            
-        except Exception as e:
-            logger.error(f"Audit computation error: {e}")
-            results["warnings"].append(f"Partial audit: {str(e)}")
+            self._emit(
+                event_callback, "metrics", stage="fairness_metrics",
+                fairness_metrics=results["fairness_metrics"], fairness_score=results["fairness_score"]
+            )
         
-        return results
+        # run explainability, needs none of the metrics so it runs alongside them
+        def explain():
+            self._report_progress(progress_callback, "explainability", 0.6)
+            with timings.stage("explainability"):
+                if explainability is not None:
+                    results["explainability"] = explainability
+                else:
+                    results["explainability"] = self._compute_explainability(
+                        model, X_test, framework,
+                        model_key=model_key, y=y_test
+                    )
+        
+        # compute CERN compliance
+        def compliance():
+            self._report_progress(progress_callback, "compliance", 0.9)
+            with timings.stage("compliance"):
+                results["cern_compliance_details"] = self._compute_cern_compliance(results)
+                results["cern_compliance"] = results["cern_compliance_details"]["overall_score"]
+                
+                # generate warnings and recommendations
+                results["warnings"] = self._generate_warnings(results)
+                results["recommendations"] = self._generate_recommendations(results)
+            self._emit(
+                event_callback, "metrics", stage="compliance",
+                cern_compliance=results["cern_compliance"], warnings=results["warnings"]
+            )
+        
+        if audit_type in ["bias", "fairness", "full", "quick"]:
+            scheduler.add("group_analysis", analyze_groups)
+        if audit_type in ["bias", "full", "quick"]:
+            scheduler.add("bias_metrics", bias_metrics, after=["group_analysis"])
+        if audit_type in ["fairness", "full", "quick"]:
+            scheduler.add("fairness_metrics", fairness_metrics, after=["group_analysis"])
+        if audit_type in ["explainability", "full"]:
+            scheduler.add("explainability", explain)
+        scheduler.add("compliance", compliance, after=scheduler.stages)
+        scheduler.run()
+    
+    def _report_progress(self, callback, stage: str, progress: float):
+        """Forward progress to the caller, if anyone is listening."""
+        if callback is not None:
+            callback(stage, progress)
+    
+    def _emit(self, callback, event_type: str, **data):
+        """Send an audit event (see run_audit) to the caller, if anyone is listening."""
+        if callback is not None:
+            callback({"type": event_type, **data})
     
     def _load_model(self, model_path: str):
+        """Load model from file, going through the model cache."""
+        if config.MODEL_CACHE_MAX_MB <= 0:
+            return self._deserialize_model(model_path)
+        return self.model_cache.get_or_load(model_path, self._deserialize_model)
+    
+    def _deserialize_model(self, model_path: str):
         """Load model from file. Supports multiple formats."""
         ext = os.path.splitext(model_path)[1].lower()
         
         if ext in ['.pkl', '.joblib']:
-            model = joblib.load(model_path)
+            model = self._joblib_load(model_path)
             return model, 'sklearn'
         elif ext in ['.pt', '.pth']:
             import torch
-            model = torch.load(model_path, map_location='cpu')
+            model = TorchModel(
+                torch.load(model_path, map_location='cpu'),
+                batch_rows=config.INFERENCE_BATCH_ROWS,
+                num_threads=config.TORCH_NUM_THREADS,
+                compile=config.TORCH_COMPILE
+            )
             return model, 'pytorch'
         elif ext == '.h5':
             import tensorflow as tf
-            model = tf.keras.models.load_model(model_path)
+            model = KerasModel(
+                tf.keras.models.load_model(model_path),
+                batch_rows=config.INFERENCE_BATCH_ROWS,
+                graph_mode=config.TF_GRAPH_MODE,
+                intra_op_threads=config.TF_INTRA_OP_THREADS,
+                inter_op_threads=config.TF_INTER_OP_THREADS
+            )
             return model, 'tensorflow'
         elif ext == '.onnx':
-            import onnxruntime as ort
-            model = ort.InferenceSession(model_path)
+            session = load_session(
+                model_path,
+                intra_op_threads=config.ONNX_INTRA_OP_THREADS,
+                inter_op_threads=config.ONNX_INTER_OP_THREADS,
+                optimization=config.ONNX_GRAPH_OPTIMIZATION,
+                optimized_dir=config.ONNX_OPTIMIZED_MODEL_DIR
+            )
+            model = OnnxModel(session, config.ONNX_BATCH_ROWS, config.ONNX_IO_BINDING)
             return model, 'onnx'
         else:
             # try joblib as fallback
             try:
-                model = joblib.load(model_path)
+                model = self._joblib_load(model_path)
                 return model, 'sklearn'
             except:
                 raise ValueError(f"Unsupported model format: {ext}")
     
+    def _joblib_load(self, model_path: str):
+        """
+        joblib.load, with MODEL_MMAP the arrays of an uncompressed joblib
+        dump are memory-mapped copy-on-write instead of read into memory.
+        Every process using the model then shares the file's pages. Plain
+        pickles load as usual, compressed dumps can't be mapped.
+        """
+        if config.MODEL_MMAP:
+            try:
+                return joblib.load(model_path, mmap_mode="c")
+            except ValueError:
+                logger.debug(f"Can't memory-map {model_path}, loading it into memory")
+        return joblib.load(model_path)
+    
     def _load_test_data(
         self, 
         data_path: str, 
-        sensitive_features: Optional[List[str]]
+        sensitive_features: Optional[List[str]],
+        columns: Optional[List[str]] = None,
+        float32: bool = False
     ):
-        """Load test data from CSV or parquet."""
+        """
+        Load test data from CSV or parquet. With columns only those feature
+        columns (plus the label) are read, see _data_layout. Sparse formats
+        come back as SparseFeatures, see _load_sparse_test_data.
+        """
+        if is_sparse_path(data_path):
+            return self._load_sparse_test_data(data_path, sensitive_features, float32)
+        if not config.COMPACT_DTYPES:
+            columns = None
         if data_path.endswith('.parquet'):
-            df = pd.read_parquet(data_path)
+            df = self._read_parquet(data_path, columns)
+        elif self.dataset_cache.enabled:
+            df = self.dataset_cache.load(data_path, pd.read_csv, columns)
         else:
-            df = pd.read_csv(data_path)
+            df = self._read_csv(data_path, columns)
         
+        return self._split_frame(df, sensitive_features, float32)
+    
+    def _load_sparse_test_data(
+        self,
+        data_path: str,
+        sensitive_features: Optional[List[str]],
+        float32: bool = False
+    ):
+        """
+        Sparse test data (.npz, libsvm, list column parquet): the features stay
+        a CSR matrix and the sensitive columns are a separate dense frame, so
+        X is SparseFeatures. Every feature is read, there are no names to
+        narrow them down by.
+        """
+        matrix, side, y = load_sparse(data_path, config.LIBSVM_ZERO_BASED)
+        if float32 and matrix.dtype == np.float64:
+            matrix = matrix.astype(np.float32)
+        if config.COMPACT_DTYPES:
+            side, y = compact_frame(side), compact_labels(y)
+        X = SparseFeatures(matrix, side)
+        logger.info(
+            f"Loaded sparse test data {data_path}: {X.shape[0]} x {X.shape[1]}, "
+            f"{matrix.nnz} nonzeros"
+        )
+        return X, y, self._find_sensitive(X.columns, sensitive_features)
+    
+    def _read_csv(self, data_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        if columns is None:
+            return pd.read_csv(data_path)
+        header = pd.read_csv(data_path, nrows=0).columns
+        keep = set(select_columns(header, columns))
+        return pd.read_csv(data_path, usecols=lambda c: c in keep)
+    
+    def _read_parquet(self, data_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        if columns is None:
+            return pd.read_parquet(data_path)
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(data_path)
+        # a stored pandas index isn't a data column
+        index = {c for c in (schema.pandas_metadata or {}).get("index_columns", []) if isinstance(c, str)}
+        names = [n for n in schema.names if n not in index]
+        return pd.read_parquet(data_path, columns=select_columns(names, columns))
+    
+    def _data_layout(self, model, framework: str, sensitive_features: Optional[List[str]]) -> Dict[str, Any]:
+        """
+        Which feature columns to read (None = all) and whether float features
+        can be float32 for this model. Columns are only narrowed when the
+        model knows its feature names (sklearn fitted on a DataFrame).
+        """
+        if not config.COMPACT_DTYPES:
+            return {"columns": None, "float32": False}
+        names = getattr(model, "feature_names_in_", None) if framework == 'sklearn' else None
+        columns = None
+        if names is not None:
+            columns = list(names) + list(sensitive_features or self.default_sensitive)
+        return {
+            "columns": columns,
+            "float32": config.FLOAT32_FEATURES and float32_safe(model, framework),
+        }
+    
+    def _iter_test_data(
+        self,
+        data_path: str,
+        sensitive_features: Optional[List[str]],
+        chunk_rows: int,
+        columns: Optional[List[str]] = None,
+        float32: bool = False
+    ):
+        """
+        Read test data in chunks. Yields (X, y, sensitive_cols, fraction_read).
+        Parquet is read one record batch at a time, CSV with a chunked reader,
+        or in slices of its dataset cache snapshot when a non-streamed audit
+        already wrote one (streaming never parses the whole file, so it
+        doesn't write snapshots).
+        """
+        if not config.COMPACT_DTYPES:
+            columns = None
+        snapshot = None
+        if not data_path.endswith('.parquet') and self.dataset_cache.enabled:
+            snapshot = self.dataset_cache.get(data_path, columns)
+        if snapshot is not None:
+            total = max(len(snapshot), 1)
+            for start in range(0, len(snapshot), max(chunk_rows, 1)):
+                df = snapshot.iloc[start:start + chunk_rows]
+                yield (
+                    *self._split_frame(df, sensitive_features, float32),
+                    min((start + len(df)) / total, 1.0)
+                )
+            return
+        if data_path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            pf = pq.ParquetFile(data_path)
+            total = max(pf.metadata.num_rows, 1)
+            seen = 0
+            for batch in pf.iter_batches(batch_size=chunk_rows):
+                seen += batch.num_rows
+                df = batch.to_pandas()
+                df = df[select_columns(df.columns, columns)] if columns is not None else df
+                yield (*self._split_frame(df, sensitive_features, float32), seen / total)
+        else:
+            total = max(os.path.getsize(data_path), 1)
+            usecols = None
+            if columns is not None:
+                keep = set(select_columns(pd.read_csv(data_path, nrows=0).columns, columns))
+                usecols = lambda c: c in keep
+            with open(data_path, 'rb') as f:
+                for df in pd.read_csv(f, chunksize=chunk_rows, usecols=usecols):
+                    # the parser reads ahead so this is approximate
+                    yield (
+                        *self._split_frame(df, sensitive_features, float32),
+                        min(f.tell() / total, 1.0)
+                    )
+    
+    def _split_frame(self, df: pd.DataFrame, sensitive_features: Optional[List[str]], float32: bool = False):
+        """Split a raw frame into features, labels and sensitive column names."""
         # assume last column is target
         y = df.iloc[:, -1].values
-        X = df.iloc[:, :-1]
-        
-        # find sensitive columns
-        if sensitive_features:
-            sensitive_cols = [c for c in sensitive_features if c in X.columns]
+        if config.COMPACT_DTYPES:
+            # int8 labels, downcast ints, categorical strings, float32 if the model allows
+            X = compact_frame(df, float32, columns=df.columns[:-1])
+            y = compact_labels(y)
         else:
-            sensitive_cols = [c for c in self.default_sensitive if c in X.columns]
+            X = df.iloc[:, :-1]
         
-        return X, y, sensitive_cols
+        return X, y, self._find_sensitive(X.columns, sensitive_features)
     
-    def _generate_synthetic_data(self, sensitive_features: Optional[List[str]]):
+    def _find_sensitive(self, columns, sensitive_features: Optional[List[str]]) -> List[str]:
+        """The requested (default: well known) sensitive columns that exist."""
+        if sensitive_features:
+            return [c for c in sensitive_features if c in columns]
+        return [c for c in self.default_sensitive if c in columns]
+    
+    def _generate_synthetic_data(self, sensitive_features: Optional[List[str]], float32: bool = False):
         """Generate synthetic test data when no real data is provided."""
         np.random.seed(42)
         n_samples = 1000
@@ -183,183 +988,281 @@ class AuditEngine:
         # generate labels with some bias
         y = (X.iloc[:, 0] + X.iloc[:, 1] + np.random.randn(n_samples) * 0.5 > 0).astype(int)
         
+        if config.COMPACT_DTYPES:
+            # int8 sensitive columns and labels
+            X, y = compact_frame(X, float32), compact_labels(y)
         return X, y, sensitive_cols
     
+    def _stream_group_counts(
+        self,
+        model,
+        framework: str,
+        data_path: str,
+        sensitive_features: Optional[List[str]],
+        progress_callback=None,
+        layout: Optional[Dict[str, Any]] = None,
+        event_callback=None
+    ):
+        """
+        Predict chunk by chunk and accumulate per-group confusion counts.
+        Returns (counts, X_sample, y_sample, sensitive_cols); the samples are
+        the head of the data, kept around for explainability.
+        """
+        counts = None
+        # bucket edges for continuous attributes get fit on the first chunk
+        encoder = self._sensitive_encoder()
+        X_sample = y_sample = None
+        sensitive_cols: List[str] = []
+        
+        for X, y, sensitive_cols, fraction in self._iter_test_data(
+            data_path, sensitive_features, config.STREAM_CHUNK_ROWS, **(layout or {})
+        ):
+            if X_sample is None:
+                X_sample = X.iloc[:config.STREAM_SAMPLE_ROWS].copy()
+                y_sample = np.asarray(y[:config.STREAM_SAMPLE_ROWS]).copy()
+            y_pred = self._get_predictions(model, X, framework)
+            sensitive = self._sensitive_frame(X, sensitive_cols, len(y), encoder)
+            if counts is None:
+                counts = GroupConfusionCounts(list(sensitive.columns))
+            counts.update(sensitive, y, y_pred)
+            # predicting spans 0.2 -> 0.4 of the overall progress
+            self._report_progress(progress_callback, "predicting", 0.2 + 0.2 * fraction)
+            self._emit(event_callback, "rows", rows=counts.n_rows, fraction=fraction)
+        
+        if X_sample is None:
+            raise ValueError(f"No rows in test data: {data_path}")
+        
+        logger.info(f"Streamed {counts.n_rows} rows from {data_path}")
+        return counts, X_sample, y_sample, sensitive_cols
+    
     def _get_predictions(self, model, X, framework: str):
-        """Get model predictions."""
+        """Get model predictions (int8 when they're 0/1)."""
         if framework == 'sklearn':
-            return model.predict(X)
-        elif framework == 'pytorch':
-            import torch
-            model.eval()
-            with torch.no_grad():
-                X_tensor = torch.FloatTensor(X.values if hasattr(X, 'values') else X)
-                outputs = model(X_tensor)
-                return (outputs > 0.5).numpy().flatten()
-        elif framework == 'tensorflow':
-            preds = model.predict(X, verbose=0)
-            return (preds > 0.5).astype(int).flatten()
-        elif framework == 'onnx':
-            input_name = model.get_inputs()[0].name
-            X_np = X.values if hasattr(X, 'values') else X
-            outputs = model.run(None, {input_name: X_np.astype(np.float32)})
-            return (outputs[0] > 0.5).astype(int).flatten()
+            return compact_labels(self._sklearn_call(model, "predict", X))
+        elif framework in ('pytorch', 'tensorflow', 'onnx'):
+            return (self._predict_scores(model, X, framework) > 0.5).astype(np.int8)
         else:
             raise ValueError(f"Unknown framework: {framework}")
     
-    def _compute_bias_metrics(
-        self, 
-        y_true, 
-        y_pred, 
-        X, 
-        sensitive_cols: List[str]
-    ) -> Dict[str, float]:
-        """Compute bias metrics using Fairlearn."""
+    def _predict_scores(self, model, X, framework: str) -> np.ndarray:
+        """Raw positive class scores from the deep learning / onnx models."""
+        if framework not in ('pytorch', 'tensorflow', 'onnx'):
+            raise ValueError(f"Unknown framework: {framework}")
+        # TorchModel / KerasModel / OnnxModel, batched float32 conversion inside
+        # (sparse rows are densified batch by batch there too)
+        outputs = np.asarray(model.run(self._model_input(model, X)))
+        # (n, 2) softmax style output -> probability of the positive class
+        if outputs.ndim == 2 and outputs.shape[1] > 1:
+            return outputs[:, -1]
+        return outputs.reshape(-1)
+    
+    def _model_input(self, model, X):
+        """
+        What goes into the model: X itself, or the CSR matrix of sparse test
+        data, widened to the model's feature count if the file's last
+        features never occur.
+        """
+        if not isinstance(X, SparseFeatures):
+            return X
+        return with_width(X.matrix, getattr(model, "n_features_in_", None) or getattr(model, "n_features", None))
+    
+    def _sklearn_call(self, model, method: str, X):
+        """
+        model.<method>(X). Sparse matrices go in as they are; a model that
+        needs dense input gets them densified INFERENCE_BATCH_ROWS rows at a
+        time.
+        """
+        X = self._model_input(model, X)
+        fn = getattr(model, method)
+        if not hasattr(X, "toarray"):
+            return fn(X)
+        try:
+            return fn(X)
+        except TypeError as e:
+            if "dense data is required" not in str(e):
+                raise
+        logger.info(f"{type(model).__name__} needs dense input, densifying in batches")
+        return np.concatenate([
+            np.asarray(fn(rows)) for _, _, rows in densify_batches(X, config.INFERENCE_BATCH_ROWS)
+        ])
+    
+    def _sensitive_encoder(self) -> SensitiveEncoder:
+        return SensitiveEncoder(
+            max_categories=config.SENSITIVE_MAX_CATEGORIES,
+            n_buckets=config.SENSITIVE_BUCKETS
+        )
+    
+    def _sensitive_frame(
+        self,
+        X,
+        sensitive_cols: List[str],
+        n_rows: int,
+        encoder: Optional[SensitiveEncoder] = None
+    ) -> pd.DataFrame:
+        """Group labels for every sensitive attribute, or a random split if there are none."""
+        if not sensitive_cols:
+            logger.warning("No sensitive features found, using random split")
+            return pd.DataFrame({"random_split": np.random.randint(0, 2, n_rows)})
+        encoder = encoder or self._sensitive_encoder()
+        return encoder.transform(X[sensitive_cols])
+    
+    def _group_counts(self, y_true, y_pred, X, sensitive_cols: List[str]) -> GroupConfusionCounts:
+        """Confusion matrix per joint sensitive group, built with a single bincount."""
+        sensitive = self._sensitive_frame(X, sensitive_cols, len(y_true))
+        return GroupConfusionCounts.from_arrays(sensitive, y_true, y_pred)
+    
+    def _analyze_groups(
+        self,
+        counts: GroupConfusionCounts,
+        intervals: Optional[Callable[[GroupConfusionCounts, List[str], int], Dict[str, List[float]]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Bias and fairness metrics for every attribute on its own and for their
+        intersections (up to INTERSECTION_MAX_ORDER attributes at a time).
+        Tiny intersection cells are left out of the metrics since they're
+        mostly noise, but still show up in the group table. With
+        BOOTSTRAP_SAMPLES > 0 every entry also gets bootstrap intervals,
+        or whatever intervals(sub_counts, attributes, min_size) returns.
+        """
+        analysis = {}
+        attributes = counts.attributes
+        max_order = min(len(attributes), max(config.INTERSECTION_MAX_ORDER, 1))
+        for order in range(1, max_order + 1):
+            min_size = 1 if order == 1 else config.INTERSECTION_MIN_GROUP_SIZE
+            for combo in itertools.combinations(attributes, order):
+                sub = counts if len(combo) == len(attributes) else counts.marginal(combo)
+                entry = {
+                    "attributes": list(combo),
+                    "bias_metrics": sub.bias_metrics(min_size),
+                    "fairness_metrics": sub.fairness_metrics(min_size),
+                    "groups": sub.group_table(),
+                }
+                if intervals is not None:
+                    entry["intervals"] = intervals(sub, list(combo), min_size)
+                elif config.BOOTSTRAP_SAMPLES > 0:
+                    entry["intervals"] = sub.bootstrap_intervals(
+                        config.BOOTSTRAP_SAMPLES, config.BOOTSTRAP_CONFIDENCE, min_size,
+                        n_jobs=config.BOOTSTRAP_JOBS or None
+                    )
+                analysis["*".join(combo)] = entry
+        return analysis
+    
+    def _worst_case_intervals(self, analysis: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Bootstrap interval of each reported metric, from the attribute it came from."""
+        intervals = {}
+        for key in ("bias_metrics", "fairness_metrics"):
+            for name, attr in worst_attributes(analysis, key).items():
+                interval = analysis[attr].get("intervals", {}).get(name)
+                if interval is not None:
+                    intervals[name] = {"attribute": attr, "low": interval[0], "high": interval[1]}
+        return intervals
+    
+    def _bias_metrics_from_groups(self, analysis: Dict[str, Any]) -> Dict[str, float]:
         metrics = {
             "demographic_parity": 0.0,
             "equalized_odds": 0.0,
             "disparate_impact": 0.0
         }
-        
-        if not sensitive_cols:
-            logger.warning("No sensitive features found, using random split")
-            sensitive = np.random.randint(0, 2, len(y_true))
-        else:
-            # use first sensitive column
-            sensitive = X[sensitive_cols[0]].values if hasattr(X, 'values') else X[:, 0]
-        
         try:
-            # demographic parity difference
-            dpd = demographic_parity_difference(y_true, y_pred, sensitive_features=sensitive)
-            metrics["demographic_parity"] = abs(float(dpd))
-            
-            # equalized odds difference
-            eod = equalized_odds_difference(y_true, y_pred, sensitive_features=sensitive)
-            metrics["equalized_odds"] = abs(float(eod))
-            
-            # disparate impact using AIF360
-            # need to be careful here, aif360 can be finicky
-            try:
-                metrics["disparate_impact"] = self._compute_disparate_impact(
-                    y_true, y_pred, sensitive
-                )
-            except Exception as e:
-                logger.warning(f"Disparate impact calc failed: {e}")
-                metrics["disparate_impact"] = 0.0
-                
+            metrics.update(worst_case(analysis, "bias_metrics"))
         except Exception as e:
             logger.error(f"Bias metrics error: {e}")
-        
         return metrics
     
-    def _compute_disparate_impact(self, y_true, y_pred, sensitive) -> float:
-        """Calculate disparate impact ratio."""
-        # group by sensitive attribute
-        group_0_mask = sensitive == 0
-        group_1_mask = sensitive == 1
-        
-        # positive rate for each group
-        if group_0_mask.sum() > 0 and group_1_mask.sum() > 0:
-            rate_0 = y_pred[group_0_mask].mean()
-            rate_1 = y_pred[group_1_mask].mean()
-            
-            if rate_1 > 0:
-                di = rate_0 / rate_1
-            elif rate_0 > 0:
-                di = 0.0  # infinite disparity
-            else:
-                di = 1.0  # both zero, technically fair
-            
-            return float(di)
-        return 1.0
-    
-    def _compute_fairness_metrics(
+    def _fairness_metrics_from_groups(
         self,
-        y_true,
-        y_pred,
-        X,
+        analysis: Dict[str, Any],
         sensitive_cols: List[str]
     ) -> Dict[str, float]:
-        """Compute additional fairness metrics."""
         metrics = {
             "statistical_parity_difference": 0.0,
             "equal_opportunity_difference": 0.0,
             "average_odds_difference": 0.0
         }
-        
+        # a random split says nothing about fairness
         if not sensitive_cols:
             return metrics
-        
-        sensitive = X[sensitive_cols[0]].values if hasattr(X, 'values') else X[:, 0]
-        
         try:
-            # statistical parity (same as demographic parity basically)
-            group_0_rate = y_pred[sensitive == 0].mean()
-            group_1_rate = y_pred[sensitive == 1].mean()
-            metrics["statistical_parity_difference"] = abs(group_0_rate - group_1_rate)
-            
-            # equal opportunity - TPR difference
-            tpr_0 = self._true_positive_rate(y_true[sensitive == 0], y_pred[sensitive == 0])
-            tpr_1 = self._true_positive_rate(y_true[sensitive == 1], y_pred[sensitive == 1])
-            metrics["equal_opportunity_difference"] = abs(tpr_0 - tpr_1)
-            
-            # average odds - average of TPR and FPR differences
-            fpr_0 = self._false_positive_rate(y_true[sensitive == 0], y_pred[sensitive == 0])
-            fpr_1 = self._false_positive_rate(y_true[sensitive == 1], y_pred[sensitive == 1])
-            metrics["average_odds_difference"] = (abs(tpr_0 - tpr_1) + abs(fpr_0 - fpr_1)) / 2
-            
+            metrics.update(worst_case(analysis, "fairness_metrics"))
         except Exception as e:
             logger.error(f"Fairness metrics error: {e}")
-        
         return metrics
     
-    def _true_positive_rate(self, y_true, y_pred) -> float:
-        """Calculate TPR."""
-        positives = y_true == 1
-        if positives.sum() == 0:
-            return 0.0
-        return (y_pred[positives] == 1).mean()
+    def _compute_bias_metrics(
+        self, 
+        y_true, 
+        y_pred, 
+        X, 
+        sensitive_cols: List[str]
+    ) -> Dict[str, float]:
+        """
+        Demographic parity and equalized odds difference (same definitions as
+        fairlearn) plus the disparate impact ratio.
+        """
+        counts = self._group_counts(y_true, y_pred, X, sensitive_cols)
+        return self._bias_metrics_from_groups(self._analyze_groups(counts))
     
-    def _false_positive_rate(self, y_true, y_pred) -> float:
-        """Calculate FPR."""
-        negatives = y_true == 0
-        if negatives.sum() == 0:
-            return 0.0
-        return (y_pred[negatives] == 1).mean()
+    def _compute_fairness_metrics(
+        self,
+        y_true,
+        y_pred,
+        X,
+        sensitive_cols: List[str]
+    ) -> Dict[str, float]:
+        """Compute additional fairness metrics."""
+        if not sensitive_cols:
+            return self._fairness_metrics_from_groups({}, sensitive_cols)
+        counts = self._group_counts(y_true, y_pred, X, sensitive_cols)
+        return self._fairness_metrics_from_groups(self._analyze_groups(counts), sensitive_cols)
     
     def _compute_explainability(
         self,
         model,
         X,
-        framework: str
+        framework: str,
+        model_key: Optional[str] = None,
+        y=None
     ) -> Dict[str, Any]:
-        """Compute SHAP values for explainability."""
+        """
+        Compute SHAP values for explainability.
+        Explainer type, background size and evaluation budget come from the
+        SHAP_* settings; explainers are reused across audits of the same model.
+        Non-sklearn models get permutation importance instead (needs y).
+        """
         result = {
             "shap_values": [],
             "feature_importance": {},
             "top_features": []
         }
+        if isinstance(X, SparseFeatures):
+            return self._sparse_explainability(model, X, framework, result)
         
         try:
             # use a sample for speed
-            X_sample = X.iloc[:100] if hasattr(X, 'iloc') else X[:100]
+            n_rows = config.SHAP_SAMPLE_ROWS
+            X_sample = X.iloc[:n_rows] if hasattr(X, 'iloc') else X[:n_rows]
             
             if framework == 'sklearn':
-                # try tree explainer first, fall back to kernel
-                try:
-                    explainer = shap.TreeExplainer(model)
-                except:
-                    explainer = shap.KernelExplainer(model.predict, X_sample)
+                feature_names = X.columns.tolist() if hasattr(X, 'columns') else [f"f{i}" for i in range(X.shape[1])]
                 
-                shap_values = explainer.shap_values(X_sample)
+                cache_key = (model_key, tuple(feature_names)) if model_key else None
+                cached = self.explainer_cache.get(cache_key) if cache_key else None
+                if cached is not None:
+                    explainer, kind = cached
+                else:
+                    explainer, kind = build_explainer(
+                        model, X_sample,
+                        preferred=config.SHAP_EXPLAINER,
+                        background_k=config.SHAP_BACKGROUND_K
+                    )
+                    if cache_key:
+                        self.explainer_cache.put(cache_key, explainer, kind)
                 
-                # handle multi-output
-                if isinstance(shap_values, list):
-                    shap_values = shap_values[1] if len(shap_values) > 1 else shap_values[0]
+                shap_values = compute_shap_values(explainer, kind, X_sample, config.SHAP_NSAMPLES)
+                result["explainer"] = kind
                 
                 # feature importance from shap
                 importance = np.abs(shap_values).mean(axis=0)
-                feature_names = X.columns.tolist() if hasattr(X, 'columns') else [f"f{i}" for i in range(X.shape[1])]
                 
                 result["feature_importance"] = {
                     name: float(imp) for name, imp in zip(feature_names, importance)
@@ -375,9 +1278,27 @@ class AuditEngine:
             else:
                 # for other frameworks, just use permutation importance
                 # shap can be slow with deep learning models
-                logger.info(f"Using simplified explainability for {framework}")
-                result["feature_importance"] = {}
-                result["top_features"] = []
+                logger.info(f"Using permutation importance for {framework}")
+                n_rows = config.PERMUTATION_SAMPLE_ROWS
+                X_perm = X.iloc[:n_rows] if hasattr(X, 'iloc') else X[:n_rows]
+                feature_names = X.columns.tolist() if hasattr(X, 'columns') else [f"f{i}" for i in range(X.shape[1])]
+                
+                importance, spread = permutation_importance(
+                    lambda batch: self._predict_scores(model, batch, framework),
+                    np.asarray(X_perm, dtype=np.float32),
+                    None if y is None else np.asarray(y)[:n_rows],
+                    n_repeats=config.PERMUTATION_REPEATS,
+                    max_stack_bytes=config.PERMUTATION_MAX_STACK_MB * 1024 * 1024
+                )
+                result["explainer"] = "permutation_importance"
+                result["feature_importance"] = {
+                    name: float(imp) for name, imp in zip(feature_names, importance)
+                }
+                result["feature_importance_std"] = {
+                    name: float(sd) for name, sd in zip(feature_names, spread)
+                }
+                sorted_idx = np.argsort(importance)[::-1][:5]
+                result["top_features"] = [feature_names[i] for i in sorted_idx]
                 
         except Exception as e:
             logger.error(f"Explainability error: {e}")
@@ -385,6 +1306,32 @@ class AuditEngine:
         
         return result
     
+    def _sparse_explainability(self, model, X: SparseFeatures, framework: str, result: Dict[str, Any]):
+        """
+        Explainability for sparse test data. SHAP and permutation importance
+        work feature by feature, which is hopeless with 100k+ features, so
+        sklearn models get importances read off the model (sparse_importance)
+        and the rest none. Only the SPARSE_TOP_FEATURES strongest are kept.
+        """
+        found = None
+        if framework == 'sklearn':
+            try:
+                found = sparse_importance(model, self._model_input(model, X))
+            except Exception as e:
+                logger.error(f"Explainability error: {e}")
+        if found is None:
+            logger.warning(f"No explainability for a {framework} model on sparse data")
+            return result
+        
+        importance, kind = found
+        top = np.argsort(importance)[::-1][:config.SPARSE_TOP_FEATURES]
+        top = top[importance[top] > 0]
+        names = [f"f{i}" for i in top]
+        result["explainer"] = kind
+        result["feature_importance"] = {name: float(importance[i]) for name, i in zip(names, top)}
+        result["top_features"] = names[:5]
+        return result
+    
     def _compute_cern_compliance(self, results: Dict[str, Any]) -> Dict[str, float]:
         """
         Compute CERN AI ethics compliance score.
@@ -424,11 +1371,12 @@ class AuditEngine:
         scores["safety_score"] = scores["fairness_score"] * 0.9
         
         # overall weighted average
+        thresholds = results.get("thresholds") or self._thresholds()
         weights = {
-            "transparency_score": 0.2,
-            "accountability_score": 0.2,
-            "fairness_score": 0.4,
-            "safety_score": 0.2
+            "transparency_score": thresholds["transparency_weight"],
+            "accountability_score": thresholds["accountability_weight"],
+            "fairness_score": thresholds["fairness_weight"],
+            "safety_score": thresholds["safety_weight"]
         }
         
         scores["overall_score"] = sum(
@@ -469,12 +1417,41 @@ class AuditEngine:
         warnings = []
         
         bias = results.get("bias_metrics", {})
+        thresholds = results.get("thresholds") or self._thresholds()
+        max_gap = thresholds["bias_threshold"]
+        min_impact = thresholds["disparate_impact_min"]
+        # with bootstrap intervals only gaps that are clear of the noise count
+        intervals = results.get("confidence_intervals", {})
         
-        if bias.get("demographic_parity", 0) > 0.1:
-            warnings.append("High demographic parity difference detected (>0.1)")
+        if bias.get("demographic_parity", 0) > max_gap:
+            interval = intervals.get("demographic_parity")
+            if interval is None or interval["low"] > max_gap:
+                warnings.append(f"High demographic parity difference detected (>{max_gap:g})")
+            else:
+                warnings.append(
+                    f"Demographic parity difference above {max_gap:g} but within sampling noise "
+                    f"(CI {interval['low']:.3f}-{interval['high']:.3f})"
+                )
+        
+        if bias.get("disparate_impact", 1) < min_impact:
+            interval = intervals.get("disparate_impact")
+            if interval is None or interval["high"] < min_impact:
+                warnings.append(f"Disparate impact below {min_impact:g} threshold (potential discrimination)")
+            else:
+                warnings.append(
+                    f"Disparate impact below {min_impact:g} but within sampling noise "
+                    f"(CI {interval['low']:.3f}-{interval['high']:.3f})"
+                )
         
-        if bias.get("disparate_impact", 1) < 0.8:
-            warnings.append("Disparate impact below 0.8 threshold (potential discrimination)")
+        # intersections can be biased even when each attribute alone looks fine
+        for name, entry in results.get("group_metrics", {}).items():
+            if len(entry["attributes"]) < 2:
+                continue
+            interval = entry.get("intervals", {}).get("demographic_parity")
+            if entry["bias_metrics"].get("demographic_parity", 0) > max_gap and (
+                interval is None or interval[0] > max_gap
+            ):
+                warnings.append(f"High demographic parity difference for {name} subgroups (>{max_gap:g})")
         
         if results.get("fairness_score", 1) < 0.7:
             warnings.append("Overall fairness score below acceptable threshold")
@@ -489,8 +1466,10 @@ class AuditEngine:
         recs = []
         
         bias = results.get("bias_metrics", {})
+        thresholds = results.get("thresholds") or self._thresholds()
         
-        if bias.get("demographic_parity", 0) > 0.05:
+        # act well before the warning threshold
+        if bias.get("demographic_parity", 0) > thresholds["bias_threshold"] / 2:
             recs.append("Consider rebalancing training data or applying bias mitigation techniques")
         
         if not results.get("explainability", {}).get("feature_importance"):
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the audit pipeline.
+
+Generates credit-risk style datasets (same scheme as
+backend/test-data/create_test_model.py) at several sizes, audits them with a
+tree, a linear and an ONNX model and records per-stage latency, throughput and
+peak memory to JSON. Every case runs in a fresh process so peak RSS belongs to
+that case alone.
+
+Usage:
+    python benchmarks/bench_audit.py                        # 1k .. 10M rows
+    python benchmarks/bench_audit.py --sizes 1000,100000 --models linear,onnx
+    python benchmarks/bench_audit.py --output new.json --compare baseline.json
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+
+ML_AUDIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_AUDIT_DIR)
+
+GENERATOR_PATH = os.path.join(
+    os.path.dirname(ML_AUDIT_DIR), "backend", "test-data", "create_test_model.py"
+)
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+MODELS = ["tree", "linear", "onnx"]
+# models are fit on a fixed sample, only the audited data grows
+TRAIN_ROWS = 20_000
+
+
+def generate_data(n_rows: int):
+    """Dataset from the test model generator, features + label."""
+    spec = importlib.util.spec_from_file_location("create_test_model", GENERATOR_PATH)
+    generator = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(generator)
+    df, _ = generator.generate_synthetic_data(n_samples=n_rows)
+    return df
+
+
+def build_model(kind: str, workdir: str) -> str:
+    """Fit (or export) one benchmark model, returns its path."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+
+    train = generate_data(TRAIN_ROWS)
+    X, y = train.drop(columns="label"), train["label"]
+
+    if kind == "tree":
+        model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42, n_jobs=-1)
+        path = os.path.join(workdir, "tree.pkl")
+        joblib.dump(model.fit(X, y), path)
+        return path
+
+    linear = LogisticRegression(max_iter=1000).fit(X, y)
+    if kind == "linear":
+        path = os.path.join(workdir, "linear.pkl")
+        joblib.dump(linear, path)
+        return path
+    if kind == "onnx":
+        path = os.path.join(workdir, "linear.onnx")
+        _save_onnx_logistic(path, linear.coef_[0], linear.intercept_[0])
+        return path
+    raise ValueError(f"Unknown model: {kind}")
+
+
+def _save_onnx_logistic(path: str, coef, intercept):
+    """sigmoid(X @ w + b) as an onnx graph, so skl2onnx isn't needed."""
+    import onnx
+    from onnx import helper, TensorProto, numpy_helper
+
+    d = len(coef)
+    graph = helper.make_graph(
+        [
+            helper.make_node("MatMul", ["X", "W"], ["xw"]),
+            helper.make_node("Add", ["xw", "B"], ["logit"]),
+            helper.make_node("Sigmoid", ["logit"], ["prob"]),
+        ],
+        "logistic",
+        [helper.make_tensor_value_info("X", TensorProto.FLOAT, [None, d])],
+        [helper.make_tensor_value_info("prob", TensorProto.FLOAT, [None, 1])],
+        initializer=[
+            numpy_helper.from_array(np.asarray(coef, dtype=np.float32).reshape(d, 1), "W"),
+            numpy_helper.from_array(np.asarray([intercept], dtype=np.float32), "B"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+def run_case(model_path: str, data_path: str, n_rows: int, repeats: int,
+             audit_type: str = "full") -> Dict[str, Any]:
+    """
+    Audit one model on one dataset repeats times in this process. The first
+    run is reported separately as cold (empty caches), the rest as warm.
+    """
+    from audit_engine import AuditEngine
+    from config import config
+    from instrumentation import peak_rss_mb
+
+    # warm runs should measure the pipeline, not re-scoring stored predictions
+    config.PREDICTION_STORE_MAX_MB = 0
+    engine = AuditEngine()
+    runs = []
+    for _ in range(max(repeats, 1)):
+        results = engine.run_audit(
+            model_path, audit_type=audit_type, sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        if any(w.startswith("Partial audit") for w in results["warnings"]):
+            raise RuntimeError(f"audit failed: {results['warnings']}")
+        runs.append(results["timings"])
+
+    cold, warm = runs[0], runs[1:] or runs
+    total = statistics.median(t["total_wall_s"] for t in warm)
+    stages = {
+        stage: {
+            key: statistics.median(t["stages"][stage][key] for t in warm)
+            for key in ("wall_s", "cpu_s")
+        }
+        for stage in warm[0]["stages"]
+    }
+    return {
+        "rows": n_rows,
+        "cold_wall_s": cold["total_wall_s"],
+        "wall_s": total,
+        "rows_per_s": n_rows / total if total > 0 else None,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_benchmarks(sizes: List[int], models: List[str], repeats: int,
+                   workdir: str, audit_type: str = "full") -> List[Dict[str, Any]]:
+    model_paths = {kind: build_model(kind, workdir) for kind in models}
+    results = []
+    for n_rows in sizes:
+        data_path = os.path.join(workdir, f"data_{n_rows}.csv")
+        generate_data(n_rows).to_csv(data_path, index=False)
+        for kind in models:
+            # fresh process per case: clean peak RSS and no caches carried over
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                case = pool.submit(
+                    run_case, model_paths[kind], data_path, n_rows, repeats, audit_type
+                ).result()
+            case["model"] = kind
+            results.append(case)
+            print(
+                f"{kind:>6} {n_rows:>10,} rows  {case['wall_s']:8.3f}s  "
+                f"{case['rows_per_s'] or 0:>12,.0f} rows/s  {case['peak_rss_mb'] or 0:8.0f} MB"
+            )
+        os.remove(data_path)
+    return results
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Cases / stages that got slower than baseline by more than tolerance (0.1 = 10%)."""
+    before = {(r["model"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for case in current["results"]:
+        old = before.get((case["model"], case["rows"]))
+        if old is None:
+            continue
+        name = f"{case['model']}/{case['rows']}"
+        checks = [("total", old["wall_s"], case["wall_s"])]
+        for stage, entry in case["stages"].items():
+            if stage in old["stages"]:
+                checks.append((stage, old["stages"][stage]["wall_s"], entry["wall_s"]))
+        for what, was, now in checks:
+            # ignore noise on stages that take next to nothing
+            if was > 0.005 and now > was * (1 + tolerance):
+                regressions.append(f"{name} {what}: {was:.4f}s -> {now:.4f}s (+{now / was - 1:.0%})")
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ML_AUDIT_DIR,
+            capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the audit pipeline")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma separated row counts")
+    parser.add_argument("--models", default=",".join(MODELS), help="tree, linear, onnx")
+    parser.add_argument("--audit-type", default="full")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per case, first one is cold")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed slowdown before it counts as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="ml-audit-bench-") as workdir:
+        # keep dataset snapshots out of the real cache
+        os.environ["DATASET_CACHE_DIR"] = os.path.join(workdir, "dataset_cache")
+        results = run_benchmarks(sizes, models, args.repeats, workdir, args.audit_type)
+
+    report = {"environment": environment(), "audit_type": args.audit_type, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
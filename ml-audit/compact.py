@@ -0,0 +1,140 @@
+"""
+Compact dtypes for audit data.
+
+Test sets come out of pandas as int64 / float64 columns and python strings,
+which is several times more memory than the values need: labels and
+predictions are 0/1, most integer features fit in a byte or two and
+sensitive attributes have a handful of distinct values. Integers are
+downcast losslessly, strings with few distinct values become categoricals
+(int codes) and float features go to float32 where the model would convert
+them anyway, so predictions don't change.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sparse_data import SparseFeatures
+
+_MB = 1024 * 1024
+
+
+def downcast_integers(values: np.ndarray) -> np.ndarray:
+    """Smallest signed integer dtype that holds every value (lossless)."""
+    values = np.asarray(values)
+    if values.dtype.kind not in "iu" or values.size == 0:
+        return values
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values if values.dtype == dtype else values.astype(dtype)
+    return values
+
+
+def compact_labels(values) -> np.ndarray:
+    """Binary labels / predictions as int8, anything else as compact as it losslessly goes."""
+    values = np.asarray(values)
+    if values.dtype == bool:
+        return values.astype(np.int8)
+    if values.dtype.kind == "f" and values.size and np.isin(values, (0.0, 1.0)).all():
+        return values.astype(np.int8)
+    return downcast_integers(values)
+
+
+def compact_frame(df: pd.DataFrame, float32: bool = False, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Frame of the given columns (default all) with compact dtypes. Columns
+    that are already compact aren't copied, so memory-mapped snapshot
+    columns stay mapped.
+    """
+    out = {}
+    for name in (df.columns if columns is None else columns):
+        col = df[name]
+        kind = col.dtype.kind
+        if kind in "iu":
+            out[name] = downcast_integers(col.to_numpy())
+        elif kind == "f" and float32 and col.dtype == np.float64:
+            out[name] = col.to_numpy(dtype=np.float32)
+        elif col.dtype == object:
+            out[name] = _categorical(col)
+        else:
+            out[name] = col
+    return pd.DataFrame(out, index=df.index, copy=False)
+
+
+def select_columns(names: List[str], wanted: Optional[Iterable[str]]) -> List[str]:
+    """
+    The feature columns in wanted plus the label (last column), in file
+    order. wanted=None keeps everything.
+    """
+    names = list(names)
+    if wanted is None or not names:
+        return names
+    wanted = set(wanted)
+    return [c for c in names[:-1] if c in wanted] + names[-1:]
+
+
+def float32_safe(model, framework: str) -> bool:
+    """
+    Whether float32 features give this model the same predictions. ONNX,
+    PyTorch and TensorFlow run on float32 anyway; sklearn trees and tree
+    ensembles cast to float32 before predicting. Everything else (linear
+    models, pipelines, ...) keeps float64.
+    """
+    if framework in ("onnx", "pytorch", "tensorflow"):
+        return True
+    if hasattr(model, "tree_"):
+        return True
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None or hasattr(model, "steps"):
+        return False
+    trees = np.asarray(estimators, dtype=object).reshape(-1)
+    return len(trees) > 0 and all(hasattr(tree, "tree_") for tree in trees)
+
+
+def nbytes(obj) -> int:
+    """Memory held by a frame / series / array, including python strings."""
+    if obj is None:
+        return 0
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=False, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=False, deep=True))
+    if isinstance(obj, SparseFeatures):
+        return obj.nbytes
+    return int(np.asarray(obj).nbytes)
+
+
+def memory_footprint(X, y=None, y_pred=None) -> Dict[str, Any]:
+    """
+    MB held by the test data and predictions, plus the feature dtypes (of
+    the sensitive columns for sparse data, with the matrix shape in sparse).
+    """
+    footprint = {
+        "features_mb": round(nbytes(X) / _MB, 3),
+        "labels_mb": round(nbytes(y) / _MB, 3),
+        "predictions_mb": round(nbytes(y_pred) / _MB, 3),
+        "dtypes": {str(k): str(v) for k, v in X.dtypes.items()} if isinstance(X, pd.DataFrame) else {},
+    }
+    if isinstance(X, SparseFeatures):
+        footprint["dtypes"] = {str(k): str(v) for k, v in X.side.dtypes.items()}
+        footprint["sparse"] = {
+            "rows": X.shape[0],
+            "features": X.shape[1],
+            "nnz": int(X.matrix.nnz),
+            "density": X.density,
+            "dtype": str(X.matrix.dtype),
+        }
+    return footprint
+
+
+def _categorical(col: pd.Series):
+    # only worth it when values repeat, ids and free text stay as they are
+    try:
+        categorical = pd.Categorical(col)
+    except TypeError:
+        return col
+    if len(categorical.categories) > max(len(col) // 2, 1):
+        return col
+    return categorical
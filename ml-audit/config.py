@@ -8,15 +8,173 @@ class Config:
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     MODEL_UPLOAD_PATH = os.getenv("MODEL_UPLOAD_PATH", "./uploads")
     
-    # thresholds for compliance scoring
-    BIAS_THRESHOLD = 0.1
+    # heavy libs imported in the background after startup, /ready waits for them.
+    # add torch / tensorflow here if you audit those models a lot
+    PRELOAD_MODULES = [
+        m.strip() for m in os.getenv("PRELOAD_MODULES", "sklearn,shap,onnxruntime").split(",")
+        if m.strip()
+    ]
+    
+    # audit job queue - how many audits run in parallel and how many can wait
+    AUDIT_WORKERS = int(os.getenv("AUDIT_WORKERS", os.cpu_count() or 1))
+    AUDIT_MAX_QUEUED = int(os.getenv("AUDIT_MAX_QUEUED", "32"))
+    AUDIT_JOB_HISTORY = int(os.getenv("AUDIT_JOB_HISTORY", "500"))
+    # progress / stage / metrics events kept per job for GET /audit/{id}/events,
+    # which sends a keepalive comment when nothing happened for SSE_KEEPALIVE_SECONDS
+    JOB_EVENTS_MAX = int(os.getenv("JOB_EVENTS_MAX", "1000"))
+    SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+    # independent audit stages (metrics, explainability) run on this many threads, 1 = in order
+    STAGE_THREADS = int(os.getenv("STAGE_THREADS", "4"))
+    # batch audits: models predicted concurrently inside one worker
+    BATCH_PREDICT_THREADS = int(os.getenv("BATCH_PREDICT_THREADS", "4"))
+    
+    # model cache (per worker process), 0 turns it off
+    MODEL_CACHE_MAX_MB = int(os.getenv("MODEL_CACHE_MAX_MB", "1024"))
+    # hash file contents instead of path+mtime+size, slower but dedupes copies
+    MODEL_CACHE_HASH_CONTENT = os.getenv("MODEL_CACHE_HASH_CONTENT", "false").lower() == "true"
+    # memory-map the arrays of uncompressed joblib dumps, so every process
+    # auditing the same model shares their pages instead of holding a copy
+    MODEL_MMAP = os.getenv("MODEL_MMAP", "true").lower() == "true"
+    
+    # serve.py: libraries and the PRELOAD_MODELS (comma separated paths or
+    # globs) are loaded before serving, the audit workers forked from the
+    # API process share those pages
+    SERVE_HOST = os.getenv("SERVE_HOST", "0.0.0.0")
+    SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+    PRELOAD_MODELS = [
+        p.strip() for p in os.getenv("PRELOAD_MODELS", "").split(",") if p.strip()
+    ]
+    
+    # downcast test data (int8 labels, small ints, categorical strings) and only
+    # read the columns the model uses. FLOAT32_FEATURES also narrows float features
+    # for models that compute in float32 anyway (trees, onnx, torch, tf)
+    COMPACT_DTYPES = os.getenv("COMPACT_DTYPES", "true").lower() == "true"
+    FLOAT32_FEATURES = os.getenv("FLOAT32_FEATURES", "true").lower() == "true"
+    
+    # parsed test data snapshots (.npy per column), shared by all workers. 0 turns it off.
+    # Streamed audits (STREAM_THRESHOLD_MB) read existing snapshots but don't write them
+    DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "./dataset_cache")
+    DATASET_CACHE_MAX_MB = int(os.getenv("DATASET_CACHE_MAX_MB", "4096"))
+    
+    # functions listed in the profile=true summary
+    PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "30"))
+    
+    # onnxruntime sessions. 0 threads = all cores, with several workers set
+    # intra op threads to about cores / AUDIT_WORKERS to avoid oversubscription
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "0"))
+    # disabled, basic, extended or all
+    ONNX_GRAPH_OPTIMIZATION = os.getenv("ONNX_GRAPH_OPTIMIZATION", "all")
+    # keep optimized graphs here so reloads skip the optimization passes, empty = off
+    ONNX_OPTIMIZED_MODEL_DIR = os.getenv("ONNX_OPTIMIZED_MODEL_DIR", "")
+    # rows per inference call (bounds the float32 input buffer), 0 = all at once
+    ONNX_BATCH_ROWS = int(os.getenv("ONNX_BATCH_ROWS", "65536"))
+    ONNX_IO_BINDING = os.getenv("ONNX_IO_BINDING", "true").lower() == "true"
+    
+    # pytorch / tensorflow inference, rows per forward pass
+    INFERENCE_BATCH_ROWS = int(os.getenv("INFERENCE_BATCH_ROWS", "8192"))
+    # 0 = framework default
+    TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+    TORCH_COMPILE = os.getenv("TORCH_COMPILE", "false").lower() == "true"
+    TF_GRAPH_MODE = os.getenv("TF_GRAPH_MODE", "true").lower() == "true"
+    TF_INTRA_OP_THREADS = int(os.getenv("TF_INTRA_OP_THREADS", "0"))
+    TF_INTER_OP_THREADS = int(os.getenv("TF_INTER_OP_THREADS", "0"))
+    
+    # streaming evaluation - test sets bigger than the threshold are read in chunks
+    STREAM_THRESHOLD_MB = int(os.getenv("STREAM_THRESHOLD_MB", "256"))
+    STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "100000"))
+    # rows kept from the first chunk for explainability
+    STREAM_SAMPLE_ROWS = int(os.getenv("STREAM_SAMPLE_ROWS", "1000"))
+    # libsvm feature indices: true, false or auto (guessed from the file like sklearn does)
+    LIBSVM_ZERO_BASED = {"true": True, "false": False}.get(
+        os.getenv("LIBSVM_ZERO_BASED", "auto").lower(), "auto"
+    )
+    
+    # thresholds for compliance scoring, can be overridden per audit
+    BIAS_THRESHOLD = float(os.getenv("BIAS_THRESHOLD", "0.1"))
     FAIRNESS_THRESHOLD = 0.8
-    DISPARATE_IMPACT_MIN = 0.8
+    DISPARATE_IMPACT_MIN = float(os.getenv("DISPARATE_IMPACT_MIN", "0.8"))
+    
+    # stored group counts / explainability per (model, dataset) so re-audits
+    # with other thresholds skip predicting. 0 turns it off
+    PREDICTION_STORE_DIR = os.getenv("PREDICTION_STORE_DIR", "./prediction_store")
+    PREDICTION_STORE_MAX_MB = int(os.getenv("PREDICTION_STORE_MAX_MB", "1024"))
+    
+    # sensitive groups - numeric attributes with more distinct values than
+    # SENSITIVE_MAX_CATEGORIES (age, income) get bucketed into quantiles
+    SENSITIVE_MAX_CATEGORIES = int(os.getenv("SENSITIVE_MAX_CATEGORIES", "10"))
+    SENSITIVE_BUCKETS = int(os.getenv("SENSITIVE_BUCKETS", "4"))
+    # intersections of up to this many attributes get their own metrics
+    INTERSECTION_MAX_ORDER = int(os.getenv("INTERSECTION_MAX_ORDER", "2"))
+    # intersection cells smaller than this are ignored in the metrics
+    INTERSECTION_MIN_GROUP_SIZE = int(os.getenv("INTERSECTION_MIN_GROUP_SIZE", "30"))
+    # bootstrap confidence intervals of the group metrics, 0 samples turns them off.
+    # resamples the per-group confusion counts, so the cost doesn't depend on rows
+    BOOTSTRAP_SAMPLES = int(os.getenv("BOOTSTRAP_SAMPLES", "1000"))
+    BOOTSTRAP_CONFIDENCE = float(os.getenv("BOOTSTRAP_CONFIDENCE", "0.95"))
+    # 0 = cpu count
+    BOOTSTRAP_JOBS = int(os.getenv("BOOTSTRAP_JOBS", "0"))
+    
+    # threshold sweep: number of thresholds, metric to optimize and how much
+    # accuracy the fairest threshold may give up versus the most accurate one
+    SWEEP_THRESHOLDS = int(os.getenv("SWEEP_THRESHOLDS", "101"))
+    SWEEP_METRIC = os.getenv("SWEEP_METRIC", "demographic_parity")
+    SWEEP_ACCURACY_TOLERANCE = float(os.getenv("SWEEP_ACCURACY_TOLERANCE", "0.01"))
+    
+    # audit_type "quick": metrics from a stratified sample (sensitive group x
+    # label) of QUICK_SAMPLE_ROWS rows, with QUICK_REPLICATES replicates for the
+    # error of each metric. With QUICK_TARGET_ERROR > 0 the sample grows until
+    # every metric is within that (at BOOTSTRAP_CONFIDENCE) or QUICK_MAX_ROWS
+    QUICK_SAMPLE_ROWS = int(os.getenv("QUICK_SAMPLE_ROWS", "20000"))
+    QUICK_MAX_ROWS = int(os.getenv("QUICK_MAX_ROWS", "500000"))
+    QUICK_MIN_STRATUM_ROWS = int(os.getenv("QUICK_MIN_STRATUM_ROWS", "100"))
+    QUICK_TARGET_ERROR = float(os.getenv("QUICK_TARGET_ERROR", "0.02"))
+    QUICK_REPLICATES = int(os.getenv("QUICK_REPLICATES", "500"))
+    
+    # /monitor: sliding window over the last MONITOR_WINDOW_ROWS logged rows,
+    # slid MONITOR_PANES steps per window. Followed log files are polled every
+    # MONITOR_POLL_SECONDS, reading MONITOR_READ_MB at a time
+    MONITOR_WINDOW_ROWS = int(os.getenv("MONITOR_WINDOW_ROWS", "100000"))
+    MONITOR_PANES = int(os.getenv("MONITOR_PANES", "10"))
+    MONITOR_POLL_SECONDS = float(os.getenv("MONITOR_POLL_SECONDS", "5"))
+    MONITOR_READ_MB = int(os.getenv("MONITOR_READ_MB", "16"))
+    MONITOR_MAX = int(os.getenv("MONITOR_MAX", "32"))
+    # change of a metric against the first full window that raises an alert
+    MONITOR_DRIFT_THRESHOLD = float(os.getenv("MONITOR_DRIFT_THRESHOLD", "0.05"))
+    # rows a monitor collects before deciding which attributes to bucket
+    MONITOR_FIT_ROWS = int(os.getenv("MONITOR_FIT_ROWS", "1000"))
+    
+    # finished results by request fingerprint (sqlite), identical requests are
+    # answered from here. entries expire after RESULT_STORE_TTL_SECONDS, 0 MB turns it off
+    RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", "./result_store/results.db")
+    RESULT_STORE_TTL_SECONDS = float(os.getenv("RESULT_STORE_TTL_SECONDS", "86400"))
+    RESULT_STORE_MAX_MB = int(os.getenv("RESULT_STORE_MAX_MB", "256"))
+    
+    # explainability budget
+    SHAP_SAMPLE_ROWS = int(os.getenv("SHAP_SAMPLE_ROWS", "100"))
+    # auto picks tree -> linear -> permutation based on the model
+    SHAP_EXPLAINER = os.getenv("SHAP_EXPLAINER", "auto")
+    # background rows get summarized into this many k-means centroids
+    SHAP_BACKGROUND_K = int(os.getenv("SHAP_BACKGROUND_K", "10"))
+    # cap on model evaluations per explained row (kernel / permutation)
+    SHAP_NSAMPLES = int(os.getenv("SHAP_NSAMPLES", "200"))
+    SHAP_EXPLAINER_CACHE_SIZE = int(os.getenv("SHAP_EXPLAINER_CACHE_SIZE", "8"))
+    # permutation importance for pytorch / tensorflow / onnx models
+    PERMUTATION_SAMPLE_ROWS = int(os.getenv("PERMUTATION_SAMPLE_ROWS", "1000"))
+    PERMUTATION_REPEATS = int(os.getenv("PERMUTATION_REPEATS", "5"))
+    # permuted copies of all features are sent as one batch if they fit in this
+    PERMUTATION_MAX_STACK_MB = int(os.getenv("PERMUTATION_MAX_STACK_MB", "256"))
+    # sparse test data: importances come from the model, only the strongest are kept
+    SPARSE_TOP_FEATURES = int(os.getenv("SPARSE_TOP_FEATURES", "100"))
     
     # cern compliance weights
-    TRANSPARENCY_WEIGHT = 0.2
-    ACCOUNTABILITY_WEIGHT = 0.2
-    FAIRNESS_WEIGHT = 0.4
-    SAFETY_WEIGHT = 0.2
+    TRANSPARENCY_WEIGHT = float(os.getenv("TRANSPARENCY_WEIGHT", "0.2"))
+    ACCOUNTABILITY_WEIGHT = float(os.getenv("ACCOUNTABILITY_WEIGHT", "0.2"))
+    FAIRNESS_WEIGHT = float(os.getenv("FAIRNESS_WEIGHT", "0.4"))
+    SAFETY_WEIGHT = float(os.getenv("SAFETY_WEIGHT", "0.2"))
+    
+    def snapshot(self) -> dict:
+        """Every setting, for keys of cached results that depend on them."""
+        return {name: getattr(self, name) for name in dir(self) if name.isupper()}
 
 config = Config()
@@ -0,0 +1,191 @@
+"""
+On-disk cache of parsed test datasets.
+
+Parsing a big CSV takes far longer than the audit math on it, and the same
+holdout set tends to be audited over and over. The first load writes every
+column to its own .npy file (string columns as category codes) and later
+loads memory-map those files instead of parsing again. Worker processes that
+map the same snapshot share the page cache.
+
+Snapshots are keyed by the content hash of the source file, so a copy of the
+same CSV under another name is a hit and an edited one is a miss. Integer
+columns are stored downcast and string columns come back as categoricals,
+so the mapped data is already compact.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from compact import downcast_integers, select_columns
+from fingerprint import cached_file_digest
+
+logger = logging.getLogger(__name__)
+
+_META = "meta.json"
+
+
+class DatasetCache:
+    """
+    Directory of column snapshots, least recently used ones are deleted once
+    the snapshots take up more than max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def load(
+        self,
+        path: str,
+        reader: Callable[[str], pd.DataFrame],
+        columns: Optional[Iterable[str]] = None
+    ) -> pd.DataFrame:
+        """
+        DataFrame for path, memory-mapped from the snapshot or read with
+        reader. With columns only those plus the label (last column) come
+        back; the snapshot always has them all.
+        """
+        if not self.enabled:
+            df = reader(path)
+            return df[select_columns(df.columns, columns)] if columns is not None else df
+
+        df = self.get(path, columns)
+        if df is not None:
+            return df
+
+        snapshot = os.path.join(self.cache_dir, cached_file_digest(path))
+        df = reader(path)
+        try:
+            self._write_snapshot(snapshot, df)
+            evict_snapshots(self.cache_dir, self.max_bytes)
+        except Exception as e:
+            # cache is best effort, the audit goes on with the parsed frame
+            logger.warning(f"Could not snapshot {path}: {e}")
+        if columns is not None:
+            df = pd.DataFrame({c: df[c] for c in select_columns(df.columns, columns)}, copy=False)
+        return df
+
+    def get(self, path: str, columns: Optional[Iterable[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        The snapshot of path memory-mapped, or None if there is none (yet).
+        Streamed audits use it this way: they never parse the whole file at
+        once, so they don't write snapshots, only read them.
+        """
+        if not self.enabled:
+            return None
+        df = self._read_snapshot(os.path.join(self.cache_dir, cached_file_digest(path)), columns)
+        with self._lock:
+            if df is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if df is not None:
+            logger.info(f"Dataset cache hit for {path}")
+        return df
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _read_snapshot(self, snapshot: str, wanted: Optional[Iterable[str]] = None) -> Optional[pd.DataFrame]:
+        meta_path = os.path.join(snapshot, _META)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        keep = set(select_columns([col["name"] for col in meta["columns"]], wanted))
+        columns = {}
+        try:
+            for i, col in enumerate(meta["columns"]):
+                if col["name"] not in keep:
+                    continue
+                values = np.load(os.path.join(snapshot, f"{i}.npy"), mmap_mode="r")
+                if col["categories"] is not None:
+                    categories = pd.Index(col["categories"], dtype=object)
+                    values = pd.Categorical.from_codes(values, categories)
+                columns[col["name"]] = values
+            # mark as recently used for eviction
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            # evicted by another worker while we read it, parse the file instead
+            return None
+        # copy=False keeps the numeric columns as views of the mapped files
+        return pd.DataFrame(columns, copy=False)
+
+    def _write_snapshot(self, snapshot: str, df: pd.DataFrame):
+        if os.path.exists(snapshot):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            columns = []
+            for i, name in enumerate(df.columns):
+                values = df[name]
+                categories = None
+                if values.dtype == object:
+                    codes, uniques = pd.factorize(values)
+                    if not all(isinstance(u, str) for u in uniques):
+                        raise ValueError(f"column {name} has mixed types")
+                    values, categories = downcast_integers(codes), list(uniques)
+                elif values.dtype.kind in "iu":
+                    values = downcast_integers(values.to_numpy())
+                np.save(os.path.join(tmp, f"{i}.npy"), np.asarray(values))
+                columns.append({"name": str(name), "categories": categories})
+            with open(os.path.join(tmp, _META), "w") as f:
+                json.dump({"rows": len(df), "columns": columns}, f)
+            # another worker may have won the race, theirs is just as good
+            try:
+                os.rename(tmp, snapshot)
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+
+def evict_snapshots(cache_dir: str, max_bytes: int, marker: str = _META):
+    """
+    Delete the least recently used snapshot directories under cache_dir
+    until the rest fit in max_bytes. A directory counts as a snapshot once
+    it has its marker file, whose mtime is the last use.
+    """
+    snapshots = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        marker_path = os.path.join(path, marker)
+        if name.startswith(".") or not os.path.exists(marker_path):
+            continue
+        try:
+            size = sum(e.stat().st_size for e in os.scandir(path))
+            snapshots.append((os.path.getmtime(marker_path), size, path))
+        except FileNotFoundError:
+            continue  # another process is evicting it right now
+
+    total = sum(size for _, size, _ in snapshots)
+    for _, size, path in sorted(snapshots):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        logger.info(f"Evicted snapshot {path}")
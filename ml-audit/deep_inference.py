@@ -0,0 +1,103 @@
+"""
+Batched inference for PyTorch and TensorFlow models.
+
+Both frameworks used to get the whole test set as one tensor, which for a few
+million rows is several copies of the data plus every activation at once.
+Here rows go through the model in fixed size batches that are converted to
+float32 one at a time (zero-copy when they already are), and the outputs are
+written into one preallocated array. Sparse (CSR) inputs are densified one
+batch at a time the same way.
+"""
+import logging
+from typing import Iterator, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def iter_batches(X, batch_rows: int) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """(start, stop, contiguous float32 rows) for every batch of X."""
+    n = X.shape[0]
+    batch = min(batch_rows, n) if batch_rows > 0 else n
+    for start in range(0, n, max(batch, 1)):
+        stop = min(start + batch, n)
+        rows = X.iloc[start:stop].to_numpy() if hasattr(X, "iloc") else X[start:stop]
+        if hasattr(rows, "toarray"):
+            rows = rows.toarray()
+        yield start, stop, np.ascontiguousarray(rows, dtype=np.float32)
+
+
+def _collect(batches, n: int) -> np.ndarray:
+    """Write per-batch outputs into a single array."""
+    outputs = None
+    for start, stop, out in batches:
+        if outputs is None:
+            outputs = np.empty((n,) + out.shape[1:], dtype=out.dtype)
+        outputs[start:stop] = out
+    return outputs if outputs is not None else np.empty((0,), dtype=np.float32)
+
+
+class TorchModel:
+    """
+    nn.Module run under inference_mode, batch by batch. torch.from_numpy shares
+    memory with the float32 batch, so there's no extra tensor copy.
+    """
+
+    def __init__(self, module, batch_rows: int = 8192, num_threads: int = 0, compile: bool = False):
+        import torch
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        module.eval()
+        self.module = module
+        self.batch_rows = batch_rows
+        self._forward = module
+        if compile:
+            try:
+                self._forward = torch.compile(module)
+            except Exception as e:
+                # no compiler toolchain in the image, eager works fine
+                logger.warning(f"torch.compile failed, running eagerly: {e}")
+
+    def run(self, X) -> np.ndarray:
+        import torch
+
+        def batches():
+            with torch.inference_mode():
+                for start, stop, rows in iter_batches(X, self.batch_rows):
+                    yield start, stop, self._forward(torch.from_numpy(rows)).numpy()
+        return _collect(batches(), X.shape[0])
+
+
+class KerasModel:
+    """
+    Keras model called batch by batch, through a tf.function when graph mode
+    is on so the python overhead per batch goes away after the first trace.
+    """
+
+    def __init__(self, model, batch_rows: int = 8192, graph_mode: bool = True,
+                 intra_op_threads: int = 0, inter_op_threads: int = 0):
+        import tensorflow as tf
+
+        try:
+            if intra_op_threads > 0:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads > 0:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError as e:
+            # only possible before the tf runtime starts, i.e. for the first model
+            logger.warning(f"Could not set tensorflow threads: {e}")
+
+        self.model = model
+        self.batch_rows = batch_rows
+        if graph_mode:
+            self._forward = tf.function(lambda x: model(x, training=False), reduce_retracing=True)
+        else:
+            self._forward = lambda x: model(x, training=False)
+
+    def run(self, X) -> np.ndarray:
+        def batches():
+            for start, stop, rows in iter_batches(X, self.batch_rows):
+                yield start, stop, np.asarray(self._forward(rows))
+        return _collect(batches(), X.shape[0])
@@ -0,0 +1,218 @@
+"""
+SHAP explainers on a budget.
+
+Picks the cheapest explainer that fits the model (exact tree / linear
+explainers where possible, model agnostic ones otherwise), summarizes the
+background data with k-means and caps the number of model evaluations. Built
+explainers are cached per model so repeat audits skip the setup.
+
+Deep learning / onnx models get batched permutation importance instead.
+Both go feature by feature, so sparse data with 100k+ features gets
+importances read off the model (sparse_importance).
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class ExplainerCache:
+    """Small LRU of built explainers, keyed by model fingerprint + feature set."""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, explainer, kind: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (explainer, kind)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def build_explainer(model, X_background, preferred: str = "auto", background_k: int = 10):
+    """
+    Returns (explainer, kind).
+
+    auto tries TreeExplainer first (it rejects non-tree models right away),
+    then LinearExplainer for anything with coef_/intercept_, and falls back to
+    the permutation explainer.
+    """
+    import shap
+    
+    if preferred in ("auto", "tree"):
+        try:
+            return shap.TreeExplainer(model), "tree"
+        except Exception:
+            if preferred == "tree":
+                raise
+
+    kind = preferred
+    if kind == "auto":
+        kind = "linear" if hasattr(model, "coef_") and hasattr(model, "intercept_") else "permutation"
+
+    # k-means centroids instead of every background row
+    background = summarize_background(X_background, background_k, weighted=kind == "kernel")
+    if kind == "kernel":
+        return shap.KernelExplainer(predict_fn(model), background), kind
+    if kind == "linear":
+        return shap.LinearExplainer(model, background), kind
+    if kind == "permutation":
+        return shap.PermutationExplainer(predict_fn(model), background), kind
+    raise ValueError(f"Unknown explainer: {preferred}")
+
+
+def summarize_background(X, k: int, weighted: bool = False):
+    """
+    k-means summary of the background data, or the data itself if it's small.
+    weighted keeps shap's DenseData wrapper (cluster sizes as weights), which
+    only KernelExplainer understands.
+    """
+    import shap
+    
+    X = np.asarray(X, dtype=np.float64)
+    if k <= 0 or len(X) <= k:
+        return X
+    summary = shap.kmeans(X, k)
+    return summary if weighted else summary.data
+
+
+def predict_fn(model):
+    """
+    Positive class probability if the model has it, plain predict otherwise.
+    shap hands over plain arrays, models fit on a DataFrame get their column
+    names back.
+    """
+    names = getattr(model, "feature_names_in_", None)
+    predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+
+    def f(X):
+        if names is not None:
+            X = pd.DataFrame(X, columns=names)
+        out = np.asarray(predict(X))
+        return out[:, -1] if out.ndim == 2 else out
+    return f
+
+
+def compute_shap_values(explainer, kind: str, X_sample, nsamples: int) -> np.ndarray:
+    """SHAP values as a (rows, features) array for the positive class."""
+    X_sample = np.asarray(X_sample, dtype=np.float64)
+    if kind == "kernel":
+        values = explainer.shap_values(X_sample, nsamples=nsamples, silent=True)
+    elif kind == "permutation":
+        # needs at least 2 * features + 1 evaluations for one permutation
+        max_evals = max(nsamples, 2 * X_sample.shape[1] + 1)
+        values = explainer(X_sample, max_evals=max_evals, silent=True).values
+    else:
+        values = explainer.shap_values(X_sample)
+
+    # handle multi-output
+    if isinstance(values, list):
+        values = values[1] if len(values) > 1 else values[0]
+    values = np.asarray(values)
+    if values.ndim == 3:
+        values = values[..., 1] if values.shape[2] > 1 else values[..., 0]
+    return values
+
+
+def permutation_importance(
+    score_fn: Callable[[np.ndarray], np.ndarray],
+    X: np.ndarray,
+    y=None,
+    n_repeats: int = 5,
+    max_stack_bytes: int = 256 * 1024 * 1024,
+    n_jobs: Optional[int] = None,
+    random_state: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Drop in accuracy when a single feature column gets shuffled.
+
+    score_fn maps a (rows, features) float array to positive class scores.
+    When all the permuted copies of X fit in max_stack_bytes they're stacked
+    into one (features * rows, features) batch, so every repeat is a single
+    big inference call instead of one call per feature. Repeats run on a
+    thread pool; torch, tensorflow and onnxruntime release the GIL during
+    inference. Without labels, agreement with the unpermuted predictions is
+    used instead of accuracy.
+
+    Returns (mean importance, std) per feature.
+    """
+    X = np.ascontiguousarray(X)
+    n, d = X.shape
+    n_repeats = max(n_repeats, 1)
+    baseline_pred = score_fn(X) > 0.5
+    reference = baseline_pred if y is None else (np.asarray(y) == 1)
+    baseline = (baseline_pred == reference).mean()
+
+    workers = n_jobs or min(n_repeats, os.cpu_count() or 1)
+    # every worker holds its own stacked copy
+    stack = n * d * d * X.itemsize * workers <= max_stack_bytes
+
+    def one_repeat(seed) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        if stack:
+            stacked = np.tile(X, (d, 1))
+            for j in range(d):
+                stacked[j * n:(j + 1) * n, j] = X[rng.permutation(n), j]
+            pred = (score_fn(stacked) > 0.5).reshape(d, n)
+        else:
+            pred = np.empty((d, n), dtype=bool)
+            X_perm = X.copy()
+            for j in range(d):
+                X_perm[:, j] = X[rng.permutation(n), j]
+                pred[j] = score_fn(X_perm) > 0.5
+                X_perm[:, j] = X[:, j]
+        return baseline - (pred == reference).mean(axis=1)
+
+    seeds = np.random.SeedSequence(random_state).spawn(n_repeats)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        drops = np.array(list(pool.map(one_repeat, seeds)))
+    return drops.mean(axis=0), drops.std(axis=0)
+
+
+def sparse_importance(model, X) -> Optional[Tuple[np.ndarray, str]]:
+    """
+    (importance per feature, kind) for a sklearn model on a CSR matrix
+    without densifying it, None if the model has nothing to offer.
+
+    Linear models get the mean |SHAP value| of a linear explainer with X as
+    its background, which is exact and only needs the nonzeros:
+    |coef_j| * mean |x_j - mean(x_j)|. Trees and ensembles get their impurity
+    based feature_importances_.
+    """
+    coef = getattr(model, "coef_", None)
+    if coef is not None:
+        coef = np.asarray(coef, dtype=np.float64)
+        # positive class row for binary / one-vs-rest models
+        coef = coef.reshape(-1) if coef.ndim == 1 else coef[-1]
+        n, d = X.shape
+        if n == 0 or coef.shape[0] != d:
+            return None
+        cols = X.indices
+        mean = np.asarray(X.sum(axis=0), dtype=np.float64).reshape(-1) / n
+        # nonzeros, then the zeros of every column at |0 - mean|
+        spread = np.bincount(cols, weights=np.abs(X.data - mean[cols]), minlength=d)
+        spread += (n - np.bincount(cols, minlength=d)) * np.abs(mean)
+        return np.abs(coef) * spread / n, "linear"
+    importances = getattr(model, "feature_importances_", None)
+    if importances is not None and len(importances) == X.shape[1]:
+        return np.asarray(importances, dtype=np.float64), "feature_importances"
+    return None
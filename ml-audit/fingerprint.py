@@ -0,0 +1,48 @@
+"""
+Helpers for identifying files by what's in them, used as cache keys.
+"""
+import hashlib
+import os
+import threading
+from typing import Dict
+
+_CHUNK_SIZE = 1024 * 1024
+
+# stat fingerprint -> content digest, so each file version is hashed once per process
+_digests: Dict[str, str] = {}
+_digests_lock = threading.Lock()
+
+
+def file_fingerprint(path: str, content_hash: bool = False) -> str:
+    """
+    Cheap fingerprint from path + mtime + size, or a full content hash.
+
+    The stat version is plenty for uploads (they get unique names and are
+    never edited in place). The content hash also catches identical files
+    under different paths but has to read the whole file.
+    """
+    if content_hash:
+        return "blake2b:" + file_digest(path)
+    st = os.stat(path)
+    return f"stat:{os.path.realpath(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def file_digest(path: str) -> str:
+    """blake2b hex digest of the file contents, read in chunks."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cached_file_digest(path: str) -> str:
+    """file_digest, remembered per path + mtime + size for this process."""
+    key = file_fingerprint(path)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        digest = file_digest(path)
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
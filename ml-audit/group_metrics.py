@@ -0,0 +1,579 @@
+"""
+Per-group confusion counts and the fairness metrics derived from them.
+
+The confusion matrix of every sensitive group is a sufficient statistic for
+all the bias and fairness metrics the engine reports. That means counts can
+be accumulated batch by batch while streaming a big test set and finalized at
+the end, without ever holding all predictions in memory.
+
+Counts are kept per joint cell of all sensitive attributes (e.g. gender x age
+bucket). Per-attribute and intersection metrics are marginals of those cells,
+so adding attributes doesn't mean another pass over the rows.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# column order of the per-group count matrix
+TN, FP, FN, TP = 0, 1, 2, 3
+
+
+def confusion_by_group(codes: np.ndarray, y_true, y_pred, n_groups: int) -> np.ndarray:
+    """
+    Confusion matrix of every group in a single pass.
+
+    Each row gets the combined code group*4 + label*2 + prediction and one
+    bincount over those codes gives all the [tn, fp, fn, tp] cells at once,
+    instead of building a boolean mask per group and metric.
+    """
+    y_true = np.asarray(y_true) == 1
+    y_pred = np.asarray(y_pred) == 1
+    cells = codes.astype(np.int64) * 4
+    cells += y_true * 2
+    cells += y_pred
+    return np.bincount(cells, minlength=n_groups * 4).reshape(n_groups, 4)
+
+
+def factorize_rows(sensitive) -> Tuple[np.ndarray, List[Tuple]]:
+    """
+    Factorize rows of one or more sensitive columns into joint cell codes.
+
+    Returns (codes, cells) where cells[code] is the tuple of attribute values.
+    Each column is factorized once, the per-column codes are combined into a
+    single integer and factorized again, so the cost is linear in the number
+    of attributes. When the number of possible combinations doesn't fit in
+    an int64 (several high-cardinality attributes) the rows of the code
+    matrix are made unique instead, which is slower but can't wrap around.
+    Rows with a missing value get code -1.
+    """
+    if isinstance(sensitive, pd.DataFrame):
+        columns = [sensitive[c].values for c in sensitive.columns]
+    else:
+        columns = [np.asarray(sensitive)]
+
+    missing = np.zeros(len(columns[0]), dtype=bool)
+    col_codes = []
+    col_uniques = []
+    for values in columns:
+        codes, uniques = pd.factorize(values)
+        missing |= codes < 0
+        col_codes.append(np.maximum(codes, 0))
+        col_uniques.append(uniques)
+
+    combinations = 1
+    for uniques in col_uniques:
+        combinations *= max(len(uniques), 1)
+    if combinations < 2 ** 63:
+        joint_codes, cells = _combine_codes(col_codes, col_uniques, missing)
+    else:
+        joint_codes, cells = _unique_code_rows(col_codes, col_uniques, missing)
+
+    # rows with a missing value were factorized like any other, point them at -1
+    for i, cell in enumerate(cells):
+        if cell is None:
+            joint_codes[joint_codes == i] = -1
+    return joint_codes, cells
+
+
+def _combine_codes(col_codes, col_uniques, missing) -> Tuple[np.ndarray, List[Optional[Tuple]]]:
+    # mixed radix: one int64 per row, only safe while the combinations fit
+    combined = np.zeros(len(missing), dtype=np.int64)
+    for codes, uniques in zip(col_codes, col_uniques):
+        combined = combined * len(uniques) + codes
+    if missing.any():
+        combined[missing] = -1
+    joint_codes, joint_uniques = pd.factorize(combined, use_na_sentinel=False)
+
+    # decode the combined integers back into one value per attribute
+    cells: List[Optional[Tuple]] = []
+    for value in joint_uniques:
+        if value < 0:
+            cells.append(None)
+            continue
+        parts = []
+        for uniques in reversed(col_uniques):
+            value, code = divmod(value, len(uniques))
+            parts.append(uniques[code])
+        cells.append(tuple(reversed(parts)))
+    return joint_codes, cells
+
+
+def _unique_code_rows(col_codes, col_uniques, missing) -> Tuple[np.ndarray, List[Optional[Tuple]]]:
+    matrix = np.column_stack(col_codes)
+    matrix[missing] = -1
+    _, first, inverse = np.unique(matrix, axis=0, return_index=True, return_inverse=True)
+    # number cells in order of first appearance, like pd.factorize does
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    cells: List[Optional[Tuple]] = []
+    for row in first[order]:
+        if missing[row]:
+            cells.append(None)
+        else:
+            cells.append(tuple(uniques[code] for code, uniques in zip(matrix[row], col_uniques)))
+    return rank[inverse.ravel()], cells
+
+
+class GroupConfusionCounts:
+    """
+    Running confusion matrix per joint group of the sensitive attributes.
+
+    counts has one row per group (in the order groups were first seen) with
+    columns [tn, fp, fn, tp]; groups[i] is the tuple of attribute values of
+    row i. Rows with a missing sensitive value are skipped.
+    """
+
+    def __init__(self, attributes: Optional[Sequence[str]] = None):
+        self.attributes: List[str] = list(attributes or ["group"])
+        self.groups: List[Tuple] = []
+        self._codes: Dict[Tuple, int] = {}
+        self.counts = np.zeros((0, 4), dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, sensitive, y_true, y_pred, attributes=None) -> "GroupConfusionCounts":
+        if attributes is None and isinstance(sensitive, pd.DataFrame):
+            attributes = list(sensitive.columns)
+        counts = cls(attributes)
+        counts.update(sensitive, y_true, y_pred)
+        return counts
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GroupConfusionCounts":
+        """Inverse of to_dict."""
+        counts = cls(data["attributes"])
+        counts.groups = [tuple(cell) for cell in data["groups"]]
+        counts._codes = {cell: i for i, cell in enumerate(counts.groups)}
+        counts.counts = np.asarray(data["counts"], dtype=np.int64).reshape(-1, 4)
+        return counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON friendly form, enough to rebuild every metric later."""
+        return {
+            "attributes": self.attributes,
+            "groups": [[_jsonable(v) for v in cell] for cell in self.groups],
+            "counts": self.counts.tolist(),
+        }
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.counts.sum())
+
+    @classmethod
+    def from_codes(cls, attributes, codes: np.ndarray, cells: List[Optional[Tuple]], y_true, y_pred) -> "GroupConfusionCounts":
+        """
+        Build counts from a precomputed factorize_rows result, so several
+        models scored on the same data share one factorization.
+        """
+        counts = cls(attributes)
+        counts._add(codes, cells, y_true, y_pred)
+        return counts
+
+    def update(self, sensitive, y_true, y_pred):
+        """
+        Add one batch of rows. sensitive is a 1-D array for a single attribute
+        or a DataFrame with one column per attribute.
+        """
+        local_codes, cells = factorize_rows(sensitive)
+        self._add(local_codes, cells, y_true, y_pred)
+
+    def _add(self, local_codes: np.ndarray, cells: List[Optional[Tuple]], y_true, y_pred):
+        # map this batch's codes onto the codes we've handed out so far
+        mapping = np.zeros(len(cells), dtype=np.int64)
+        for i, cell in enumerate(cells):
+            if cell is None:
+                continue
+            code = self._codes.get(cell)
+            if code is None:
+                code = len(self.groups)
+                self._codes[cell] = code
+                self.groups.append(cell)
+            mapping[i] = code
+        if not self.groups:
+            return
+
+        valid = local_codes >= 0
+        codes = mapping[np.where(valid, local_codes, 0)]
+        y_true = np.asarray(y_true)
+        y_pred = np.asarray(y_pred)
+        if not valid.all():
+            codes, y_true, y_pred = codes[valid], y_true[valid], y_pred[valid]
+
+        self._grow(len(self.groups))
+        self.counts += confusion_by_group(codes, y_true, y_pred, len(self.groups))
+
+    def marginal(self, attributes: Sequence[str]) -> "GroupConfusionCounts":
+        """Counts for a subset of the attributes, summed over all the others."""
+        out, mapping = self._marginal_mapping(attributes)
+        np.add.at(out.counts, mapping, self.counts)
+        return out
+
+    def marginal_stack(self, attributes: Sequence[str], stack: np.ndarray) -> np.ndarray:
+        """
+        A stack of count matrices (n, groups, 4) over this one's groups summed
+        like marginal, so it lines up with marginal(attributes).groups.
+        """
+        out, mapping = self._marginal_mapping(attributes)
+        summed = np.zeros((len(stack), len(out.groups), 4), dtype=stack.dtype)
+        np.add.at(summed, (slice(None), mapping), stack)
+        return summed
+
+    def _marginal_mapping(self, attributes: Sequence[str]) -> Tuple["GroupConfusionCounts", np.ndarray]:
+        # empty counts over the marginal groups, and the marginal group of each of ours
+        idx = [self.attributes.index(a) for a in attributes]
+        out = GroupConfusionCounts(attributes)
+        mapping = np.empty(len(self.groups), dtype=np.int64)
+        for i, cell in enumerate(self.groups):
+            key = tuple(cell[j] for j in idx)
+            code = out._codes.get(key)
+            if code is None:
+                code = len(out.groups)
+                out._codes[key] = code
+                out.groups.append(key)
+            mapping[i] = code
+        out._grow(len(out.groups))
+        return out, mapping
+
+    def group_rates(self) -> Dict[str, np.ndarray]:
+        """Selection rate, TPR and FPR for every group (0 where undefined)."""
+        c = self.counts.astype(np.float64)
+        size = c.sum(axis=1)
+        positives = c[:, FN] + c[:, TP]
+        negatives = c[:, TN] + c[:, FP]
+        return {
+            "size": size,
+            "selection_rate": _safe_div(c[:, FP] + c[:, TP], size),
+            "tpr": _safe_div(c[:, TP], positives),
+            "fpr": _safe_div(c[:, FP], negatives),
+        }
+
+    def bias_metrics(self, min_group_size: int = 1) -> Dict[str, float]:
+        """
+        Demographic parity / equalized odds difference (biggest gap between
+        any two groups, like fairlearn) and the disparate impact ratio.
+        Groups smaller than min_group_size are left out.
+        """
+        rates = self.group_rates()
+        present = rates["size"] >= max(min_group_size, 1)
+        if present.sum() < 2:
+            return {"demographic_parity": 0.0, "equalized_odds": 0.0, "disparate_impact": 1.0}
+
+        sel = rates["selection_rate"][present]
+        tpr = rates["tpr"][present]
+        fpr = rates["fpr"][present]
+        return {
+            "demographic_parity": float(np.ptp(sel)),
+            "equalized_odds": float(max(np.ptp(tpr), np.ptp(fpr))),
+            "disparate_impact": self._disparate_impact(rates, present),
+        }
+
+    def fairness_metrics(self, min_group_size: int = 1) -> Dict[str, float]:
+        """
+        Statistical parity, equal opportunity and average odds differences.
+        With two groups these are the plain absolute differences, with more
+        it's the gap between the best and worst group.
+        """
+        rates = self.group_rates()
+        present = rates["size"] >= max(min_group_size, 1)
+        if present.sum() < 2:
+            return {
+                "statistical_parity_difference": 0.0,
+                "equal_opportunity_difference": 0.0,
+                "average_odds_difference": 0.0
+            }
+
+        tpr_gap = np.ptp(rates["tpr"][present])
+        fpr_gap = np.ptp(rates["fpr"][present])
+        return {
+            "statistical_parity_difference": float(np.ptp(rates["selection_rate"][present])),
+            "equal_opportunity_difference": float(tpr_gap),
+            "average_odds_difference": float((tpr_gap + fpr_gap) / 2),
+        }
+
+    def bootstrap_intervals(
+        self,
+        n_boot: int = 1000,
+        confidence: float = 0.95,
+        min_group_size: int = 1,
+        random_state: int = 0,
+        n_jobs: Optional[int] = None
+    ) -> Dict[str, List[float]]:
+        """
+        Percentile bootstrap interval of every bias and fairness metric.
+
+        Resampling rows with replacement only changes how many rows land in
+        each (group, label, prediction) cell, so a replicate is one multinomial
+        draw over the cells of the count matrix. That makes the cost depend on
+        the number of groups, not rows. Replicates are drawn in chunks on a
+        thread pool (numpy releases the GIL while drawing).
+        """
+        n = self.n_rows
+        if n == 0 or n_boot <= 0:
+            return {}
+        p = (self.counts / n).reshape(-1)
+        n_cells = self.counts.shape[0]
+
+        def draw(args):
+            seed, size = args
+            rng = np.random.default_rng(seed)
+            samples = rng.multinomial(n, p, size=size).reshape(size, n_cells, 4)
+            return self.batch_metrics(samples, min_group_size)
+
+        workers = n_jobs or os.cpu_count() or 1
+        # threads only pay off once there's real work per chunk
+        if n_boot * p.size < 1_000_000:
+            workers = 1
+        sizes = [len(c) for c in np.array_split(np.arange(n_boot), workers) if len(c)]
+        seeds = np.random.SeedSequence(random_state).spawn(len(sizes))
+        if len(sizes) == 1:
+            chunks = [draw((seeds[0], sizes[0]))]
+        else:
+            with ThreadPoolExecutor(max_workers=len(sizes)) as pool:
+                chunks = list(pool.map(draw, zip(seeds, sizes)))
+
+        alpha = (1 - confidence) / 2
+        intervals = {}
+        for name in chunks[0]:
+            values = np.concatenate([chunk[name] for chunk in chunks])
+            low, high = np.quantile(values, [alpha, 1 - alpha])
+            intervals[name] = [float(low), float(high)]
+        return intervals
+
+    def batch_metrics(self, counts: np.ndarray, min_group_size: int = 1) -> Dict[str, np.ndarray]:
+        """
+        bias_metrics / fairness_metrics for a stack of count matrices
+        (n, groups, 4) with the same groups as this one (bootstrap replicates,
+        thresholds), vectorized over the stack.
+        """
+        c = counts.astype(np.float64)
+        size = c.sum(axis=2)
+        sel = _safe_div(c[..., FP] + c[..., TP], size)
+        tpr = _safe_div(c[..., TP], c[..., FN] + c[..., TP])
+        fpr = _safe_div(c[..., FP], c[..., TN] + c[..., FP])
+        present = size >= max(min_group_size, 1)
+        enough = present.sum(axis=1) >= 2
+
+        def gap(rates):
+            high = np.where(present, rates, -np.inf).max(axis=1)
+            low = np.where(present, rates, np.inf).min(axis=1)
+            return np.where(enough, high - low, 0.0)
+
+        sel_gap, tpr_gap, fpr_gap = gap(sel), gap(tpr), gap(fpr)
+
+        # disparate impact: group 0 vs group 1 for a binary attribute, worst vs best otherwise
+        rate_0 = np.where(present, sel, np.inf).min(axis=1)
+        rate_1 = np.where(present, sel, -np.inf).max(axis=1)
+        g0, g1 = self._codes.get((0,)), self._codes.get((1,))
+        if g0 is not None and g1 is not None:
+            binary = present[:, g0] & present[:, g1] & (present.sum(axis=1) == 2)
+            rate_0 = np.where(binary, sel[:, g0], rate_0)
+            rate_1 = np.where(binary, sel[:, g1], rate_1)
+        ratio = _safe_div(rate_0, rate_1)
+        disparate = np.where(rate_1 > 0, ratio, np.where(rate_0 > 0, 0.0, 1.0))
+
+        return {
+            "demographic_parity": sel_gap,
+            "equalized_odds": np.maximum(tpr_gap, fpr_gap),
+            "disparate_impact": np.where(enough, disparate, 1.0),
+            "statistical_parity_difference": sel_gap,
+            "equal_opportunity_difference": tpr_gap,
+            "average_odds_difference": (tpr_gap + fpr_gap) / 2,
+        }
+
+    def group_table(self) -> List[Dict[str, Any]]:
+        """Size and rates of every group, JSON friendly."""
+        rates = self.group_rates()
+        table = []
+        for i, cell in enumerate(self.groups):
+            table.append({
+                "group": {a: _jsonable(v) for a, v in zip(self.attributes, cell)},
+                "size": int(rates["size"][i]),
+                "selection_rate": float(rates["selection_rate"][i]),
+                "tpr": float(rates["tpr"][i]),
+                "fpr": float(rates["fpr"][i]),
+            })
+        return table
+
+    def _disparate_impact(self, rates: Dict[str, np.ndarray], present: np.ndarray) -> float:
+        # binary 0/1 attribute: group 1 is the reference, like before
+        g0, g1 = self._code_for((0,)), self._code_for((1,))
+        if g0 is not None and g1 is not None and present.sum() == 2:
+            rate_0 = rates["selection_rate"][g0]
+            rate_1 = rates["selection_rate"][g1]
+        else:
+            # anything else: worst group vs best group (four-fifths rule)
+            sel = rates["selection_rate"][present]
+            rate_0, rate_1 = sel.min(), sel.max()
+        if rate_1 > 0:
+            return float(rate_0 / rate_1)
+        elif rate_0 > 0:
+            return 0.0  # infinite disparity
+        return 1.0  # both zero, technically fair
+
+    def _code_for(self, cell: Tuple) -> Optional[int]:
+        code = self._codes.get(cell)
+        if code is None or self.counts[code].sum() == 0:
+            return None
+        return code
+
+    def _grow(self, n_groups: int):
+        if self.counts.shape[0] < n_groups:
+            grown = np.zeros((n_groups, 4), dtype=np.int64)
+            grown[:self.counts.shape[0]] = self.counts
+            self.counts = grown
+
+
+def threshold_counts(codes: np.ndarray, n_groups: int, y_true, scores, thresholds) -> np.ndarray:
+    """
+    Confusion counts per group for prediction = score > t at every threshold,
+    as a (thresholds, groups, 4) array.
+
+    Rows are sorted once by (group, label, score); within each group/label
+    run the number of scores above t is a binary search. O(n log n) overall
+    instead of one pass over the rows per threshold.
+    """
+    y_true = (np.asarray(y_true) == 1).astype(np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    order = np.lexsort((scores, y_true, codes))
+    sorted_scores = scores[order]
+    # run boundaries of every (group, label) pair in the sorted order
+    run_sizes = np.bincount(codes[order] * 2 + y_true[order], minlength=n_groups * 2)
+    bounds = np.concatenate([[0], np.cumsum(run_sizes)])
+
+    out = np.empty((len(thresholds), n_groups, 4), dtype=np.int64)
+    for g in range(n_groups):
+        for label in (0, 1):
+            run = sorted_scores[bounds[g * 2 + label]:bounds[g * 2 + label + 1]]
+            above = len(run) - np.searchsorted(run, thresholds, side="right")
+            if label:
+                out[:, g, TP], out[:, g, FN] = above, len(run) - above
+            else:
+                out[:, g, FP], out[:, g, TN] = above, len(run) - above
+    return out
+
+
+def threshold_sweep(sensitive, y_true, scores, thresholds, min_group_size: int = 1) -> Dict[str, np.ndarray]:
+    """
+    Bias / fairness metrics, accuracy and selection rate at every threshold
+    for the groups of one attribute (1-D array or single column frame).
+    Rows with a missing group value are left out.
+    """
+    codes, cells = factorize_rows(sensitive)
+    keep = codes >= 0
+    # drop the missing-value cell and renumber the rest
+    renumber = np.cumsum([cell is not None for cell in cells]) - 1
+    counts = GroupConfusionCounts(list(sensitive.columns) if isinstance(sensitive, pd.DataFrame) else None)
+    counts.groups = [cell for cell in cells if cell is not None]
+    counts._codes = {cell: i for i, cell in enumerate(counts.groups)}
+
+    stack = threshold_counts(
+        renumber[codes[keep]], len(counts.groups),
+        np.asarray(y_true)[keep], np.asarray(scores)[keep], thresholds
+    )
+    metrics = counts.batch_metrics(stack, min_group_size)
+    totals = stack.sum(axis=1)
+    n = max(int(keep.sum()), 1)
+    metrics["accuracy"] = (totals[:, TP] + totals[:, TN]) / n
+    metrics["selection_rate"] = (totals[:, TP] + totals[:, FP]) / n
+    return metrics
+
+
+def worst_attributes(analysis: Dict[str, Any], key: str) -> Dict[str, str]:
+    """
+    For each metric under analysis[attr][key], the single attribute with the
+    worst value. analysis maps names to entries with "attributes" and the
+    metric dicts, intersection entries are skipped.
+    """
+    worst: Dict[str, str] = {}
+    for attr, entry in analysis.items():
+        if len(entry["attributes"]) != 1:
+            continue
+        for name, value in entry[key].items():
+            if name not in worst:
+                worst[name] = attr
+                continue
+            current = analysis[worst[name]][key][name]
+            if name == "disparate_impact":
+                # furthest from 1 is worst
+                if abs(1 - value) > abs(1 - current):
+                    worst[name] = attr
+            elif value > current:
+                worst[name] = attr
+    return worst
+
+
+def worst_case(analysis: Dict[str, Any], key: str) -> Dict[str, float]:
+    """Worst value of each metric over the single attributes."""
+    return {
+        name: analysis[attr][key][name]
+        for name, attr in worst_attributes(analysis, key).items()
+    }
+
+
+class SensitiveEncoder:
+    """
+    Turns raw sensitive columns into group labels.
+
+    Columns with few distinct values are used as is. Continuous ones (age,
+    income, ...) are bucketed into quantile bins, labelled by their interval.
+    Missing values stay missing (rows with them are skipped by the counts),
+    they don't become a group of their own.
+
+    Whether a column gets bucketed, and its bin edges, are decided on the
+    first batch seen (or by fit) and reused afterwards, so streamed chunks
+    end up in the same buckets. That first batch has to be representative: a
+    handful of ages has few distinct values and would keep age categorical
+    for good. Audits stream in big chunks; the monitor holds rows back until
+    it has enough to fit on (SENSITIVE_FIT_ROWS).
+    """
+
+    def __init__(self, max_categories: int = 10, n_buckets: int = 4):
+        self.max_categories = max_categories
+        self.n_buckets = n_buckets
+        self._edges: Dict[str, Optional[np.ndarray]] = {}
+
+    def fit(self, frame: pd.DataFrame) -> "SensitiveEncoder":
+        """Decide the buckets of every column from frame, replacing earlier ones."""
+        for col in frame.columns:
+            self._edges[col] = self._fit_edges(frame[col])
+        return self
+
+    def transform(self, frame: pd.DataFrame) -> pd.DataFrame:
+        out = {}
+        for col in frame.columns:
+            values = frame[col]
+            if col not in self._edges:
+                self._edges[col] = self._fit_edges(values)
+            edges = self._edges[col]
+            if edges is None:
+                out[col] = values.values
+            else:
+                # interval labels as strings, NaN stays a missing code
+                out[col] = pd.cut(values, edges).cat.rename_categories(str).values
+        return pd.DataFrame(out, index=frame.index)
+
+    def _fit_edges(self, values: pd.Series) -> Optional[np.ndarray]:
+        if not pd.api.types.is_numeric_dtype(values):
+            return None
+        if values.nunique() <= self.max_categories:
+            return None
+        quantiles = np.linspace(0, 1, self.n_buckets + 1)[1:-1]
+        inner = np.unique(np.nanquantile(values, quantiles))
+        # open ended outer bins so later chunks always land somewhere
+        return np.concatenate([[-np.inf], inner, [np.inf]])
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(num, dtype=np.float64)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
@@ -0,0 +1,207 @@
+"""
+Per-stage timings for audits and a small Prometheus text exporter.
+
+Every audit records wall time, CPU time and the change in the worker's
+resident memory for each pipeline stage and returns them with the results. The API process feeds
+those into histograms served on /metrics/prometheus, which is all the
+Prometheus client library would give us here.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water mark of this process' resident memory."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident memory of this process right now (linux only, None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class StageTimings:
+    """
+    Collects timings per named stage. Re-entering a stage adds to it.
+
+    CPU time is for the whole process, so it includes threads started by the
+    stage (onnxruntime, torch, permutation repeats) and can exceed wall time.
+    Stages may run concurrently; their CPU times then overlap.
+
+    rss_delta_mb is how much resident memory the process gained (negative:
+    gave back) over the stage, sampled before and after it. Not ru_maxrss,
+    that's a process-lifetime peak every later stage would report as its own.
+    Concurrent stages see each other's allocations in it.
+
+    listener, if given, gets a stage_started / stage_finished event for
+    every stage as it happens.
+    """
+
+    def __init__(self, listener: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.listener = listener
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.listener is not None:
+            self.listener({"type": "stage_started", "stage": name})
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        rss = current_rss_mb()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            after = current_rss_mb()
+            with self._lock:
+                entry = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0})
+                entry["wall_s"] += wall
+                entry["cpu_s"] += cpu
+                if rss is not None and after is not None:
+                    entry["rss_delta_mb"] = entry.get("rss_delta_mb", 0.0) + after - rss
+            if self.listener is not None:
+                self.listener({
+                    "type": "stage_finished", "stage": name, "wall_s": round(wall, 6), "failed": failed
+                })
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_wall_s": round(time.perf_counter() - self._started, 6),
+                "stages": {
+                    name: {k: round(v, 6) if isinstance(v, float) else v for k, v in entry.items()}
+                    for name, entry in self.stages.items()
+                },
+            }
+
+
+def process_memory(pid="self") -> Dict[str, int]:
+    """
+    Resident, proportional and shared bytes of a process (linux only, {}
+    elsewhere). PSS splits every shared page between the processes mapping
+    it, so summing it over processes gives their real combined footprint
+    where summing RSS counts shared pages once per process.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared"}
+    memory = {"rss": 0, "pss": 0, "shared": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in fields:
+                    memory[fields[name]] += int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return {}
+    return memory
+
+
+def profile_call(fn: Callable, *args, top: int = 30, **kwargs) -> Tuple[Any, str]:
+    """Run fn under cProfile, returns (result, top functions by cumulative time)."""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+    return result, out.getvalue()
+
+
+class Histogram:
+    """Cumulative bucket histogram with a single label, Prometheus style."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = sorted(buckets)
+        self._series: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        with self._lock:
+            # per bucket counts, then +Inf count and sum
+            series = self._series.setdefault(label_value, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, series in sorted(self._series.items()):
+                label = f'{self.label}="{value}"'
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound:g}"}} {count:g}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-2]:g}')
+                lines.append(f"{self.name}_count{{{label}}} {series[-2]:g}")
+                lines.append(f"{self.name}_sum{{{label}}} {series[-1]:g}")
+        return lines
+
+
+_SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_WALL_SECONDS = Histogram(
+    "audit_stage_wall_seconds", "Wall time per audit pipeline stage", "stage", _SECONDS_BUCKETS
+)
+STAGE_CPU_SECONDS = Histogram(
+    "audit_stage_cpu_seconds", "CPU time per audit pipeline stage", "stage", _SECONDS_BUCKETS
+)
+AUDIT_WALL_SECONDS = Histogram(
+    "audit_wall_seconds", "Wall time of whole audits", "audit_type", _SECONDS_BUCKETS
+)
+
+
+def observe_timings(results):
+    """Feed the timings of finished audit results (one dict or a batch list) into the histograms."""
+    for result in results if isinstance(results, list) else [results]:
+        timings = result.get("timings") if isinstance(result, dict) else None
+        if not timings:
+            continue
+        for stage, entry in timings["stages"].items():
+            STAGE_WALL_SECONDS.observe(stage, entry["wall_s"])
+            STAGE_CPU_SECONDS.observe(stage, entry["cpu_s"])
+        AUDIT_WALL_SECONDS.observe(result.get("audit_type", "unknown"), timings["total_wall_s"])
+
+
+def render_prometheus(gauges: Dict[str, Tuple[str, Dict[str, float]]]) -> str:
+    """
+    Text exposition of the histograms plus some gauges, given as
+    {name: (help, {label_value: value})} with the label called "status", or
+    {name: (help, {label_value: value}, label)}.
+    """
+    lines: List[str] = []
+    for histogram in (AUDIT_WALL_SECONDS, STAGE_WALL_SECONDS, STAGE_CPU_SECONDS):
+        lines.extend(histogram.render())
+    for name, (help_text, values, *label) in gauges.items():
+        label = label[0] if label else "status"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for label_value, value in sorted(values.items()):
+            lines.append(f'{name}{{{label}="{label_value}"}} {value:g}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,508 @@
+"""
+Background job queue for audits.
+
+Audits are CPU heavy (SHAP especially) so they run on a process pool instead
+of blocking the uvicorn event loop. Every job gets a status record that the
+API can poll, and running jobs can be cancelled between pipeline stages.
+
+Identical requests (same engine method, file contents and parameters) are
+deduplicated: one that is already running is joined instead of started
+again, and one that finished before is answered from the result store.
+
+Workers send their progress and audit events (stage started / finished, rows
+predicted, partial metrics) back over a manager queue. Every job keeps the
+last JOB_EVENTS_MAX of them with sequence numbers, for GET /audit/{id}/events
+to stream.
+"""
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, Future, CancelledError, InvalidStateError
+from typing import Optional, Dict, Any, List, Tuple
+
+from audit_engine import AuditEngine, AuditCancelled
+from config import config
+from instrumentation import observe_timings
+from result_store import ResultStore, request_fingerprint
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_CANCELLING = "cancelling"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when there is no room left in the job queue."""
+    pass
+
+
+class AuditJob:
+    """Status record for a single queued audit."""
+
+    def __init__(self, job_id: str, params: Dict[str, Any]):
+        self.job_id = job_id
+        self.params = params
+        self.status = JOB_PENDING
+        self.stage: Optional[str] = None
+        self.progress = 0.0
+        self.result: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+        self.fingerprint: Optional[str] = None
+        # "in_flight" / "result_store" when the job reused another computation
+        self.deduplicated: Optional[str] = None
+        # running job this one waits on, and the jobs waiting on this one
+        self.leader: Optional["AuditJob"] = None
+        self.followers: List["AuditJob"] = []
+        # the pool computation this job owns and the (generated) id it runs
+        # under there, passed on to a duplicate when this job is cancelled
+        self.run: Optional[Future] = None
+        self.run_id: Optional[str] = None
+        # (sequence number, event), see add_event
+        self.events: deque = deque(maxlen=max(config.JOB_EVENTS_MAX, 1))
+        self._event_seq = 0
+        self._events_closed = False
+        self._events_changed = threading.Condition()
+        # (event loop, asyncio.Event) of the coroutines in wait_events
+        self._async_waiters: set = set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def add_event(self, event: Dict[str, Any]):
+        """Record an event. A status event for a finished state is the last one."""
+        with self._events_changed:
+            if self._events_closed:
+                return
+            self._event_seq += 1
+            self.events.append((self._event_seq, {**event, "time": time.time()}))
+            if event.get("type") == "status" and event.get("status") in FINISHED_STATES:
+                self._events_closed = True
+            self._events_changed.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, changed in waiters:
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def events_since(self, seq: int, timeout: Optional[float] = None) -> Tuple[List[Tuple[int, Dict[str, Any]]], bool]:
+        """
+        Events after sequence number seq, waiting up to timeout for one if
+        there are none yet. Also returns whether the job has recorded its last
+        event and all of them are in the list.
+        """
+        with self._events_changed:
+            if self._event_seq <= seq and not self._events_closed:
+                self._events_changed.wait(timeout)
+            events = [(n, event) for n, event in self.events if n > seq]
+            return events, self._events_closed
+
+    async def wait_events(self, seq: int, timeout: Optional[float] = None) -> Tuple[List[Tuple[int, Dict[str, Any]]], bool]:
+        """events_since for the event loop: waits there instead of in a thread."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._events_changed:
+            self._async_waiters.add(waiter)
+        try:
+            events, closed = self.events_since(seq, 0)
+            if not events and not closed:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                events, closed = self.events_since(seq, 0)
+            return events, closed
+        finally:
+            with self._events_changed:
+                self._async_waiters.discard(waiter)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # a joined job reports the progress of the one doing the work
+        source = self.leader if self.leader is not None and not self.finished else self
+        return {
+            "audit_id": self.job_id,
+            "status": source.status if source.status != JOB_CANCELLING else self.status,
+            "stage": source.stage,
+            "progress": round(source.progress, 3),
+            "deduplicated": self.deduplicated,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+# one engine per worker process so anything it caches survives between jobs
+_worker_engine: Optional[AuditEngine] = None
+
+
+def preload_engine(model_paths: List[str]) -> AuditEngine:
+    """
+    Create the worker engine in this process with the given models already
+    in its model cache. Pool workers forked afterwards (see start) start
+    from it, so the loaded models and their caches are shared copy-on-write
+    instead of loaded again per worker.
+    Models that fail to load are logged and skipped.
+    """
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = AuditEngine()
+    for path in model_paths:
+        try:
+            _worker_engine._load_model(path)
+            logger.info(f"Preloaded model {path}")
+        except Exception as e:
+            logger.warning(f"Could not preload model {path}: {e}")
+    return _worker_engine
+
+
+def _run_job(run_id: str, method: str, params: Dict[str, Any], events, cancelled):
+    """
+    Entry point inside the worker process, method is the engine method to
+    run. Events and cancellation go by run_id, not the job id: a job can be
+    cancelled and submitted again while the run it handed over goes on.
+    """
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = AuditEngine()
+
+    def emit(event: Dict[str, Any]):
+        events.put((run_id, event))
+
+    def report(stage: str, progress: float):
+        if run_id in cancelled:
+            raise AuditCancelled("Audit was cancelled")
+        emit({"type": "progress", "stage": stage, "progress": progress})
+
+    fn = getattr(_worker_engine, method)
+    if "event_callback" in inspect.signature(fn).parameters:
+        params = {**params, "event_callback": emit}
+    return fn(progress_callback=report, **params)
+
+
+class AuditJobQueue:
+    """
+    Bounded process pool plus job bookkeeping.
+
+    At most max_workers audits run at once and at most max_queued more wait
+    for a free worker; anything beyond that is rejected with QueueFullError.
+    Jobs that join a running duplicate don't take a slot.
+    """
+
+    def __init__(self, max_workers: int, max_queued: int, history_size: int = 500,
+                 result_store: Optional[ResultStore] = None):
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max(0, max_queued)
+        self.history_size = history_size
+        self.result_store = result_store
+        self._jobs: "OrderedDict[str, AuditJob]" = OrderedDict()
+        # fingerprint -> job computing it
+        self._in_flight: Dict[str, AuditJob] = {}
+        # run id of a computation in the pool -> job it reports to
+        self._runs: Dict[str, AuditJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._events = None
+        self._cancelled = None
+        self._event_thread: Optional[threading.Thread] = None
+
+    def start(self, fork_workers: bool = False):
+        """
+        Spin up the pool. Called lazily on first submit, workers then start
+        as jobs come in. fork_workers forks all of them right away instead,
+        before the event thread starts: serve.py calls it after preloading,
+        while the process has no other threads yet (forking one that has
+        torch / OpenMP / tensorflow pools running can deadlock the child).
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._manager = multiprocessing.Manager()
+            self._events = self._manager.Queue()
+            self._cancelled = self._manager.dict()
+            if fork_workers:
+                # with fork the first submit starts every worker, before the pool's own thread
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("fork")
+                )
+                self._executor.submit(os.getpid).result()
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._event_thread = threading.Thread(
+                target=self._drain_events, name="audit-job-events", daemon=True
+            )
+            self._event_thread.start()
+        logger.info(f"Audit job queue started with {self.max_workers} workers")
+
+    def shutdown(self):
+        with self._lock:
+            executor, manager = self._executor, self._manager
+            self._executor = None
+        if executor is None:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._events.put(None)  # stops the event thread
+        if self._event_thread is not None:
+            self._event_thread.join(timeout=5)
+        manager.shutdown()
+
+    def submit(self, job_id: str, method: str = "run_audit", **params) -> AuditJob:
+        """
+        Queue an audit. params are passed through to the AuditEngine method
+        (run_audit, run_batch_audit, ...). A request identical to a running
+        one waits on that one, and one that was answered before (and hasn't
+        expired) completes right away from the result store.
+        Hashes the files in the request, so call it off the event loop.
+        """
+        self.start()
+        fingerprint = self._fingerprint(method, params)
+        with self._lock:
+            existing = self._jobs.get(job_id)
+            if existing is not None and not existing.finished:
+                raise ValueError(f"Audit {job_id} is already queued")
+
+            job = AuditJob(job_id, params)
+            job.fingerprint = fingerprint
+            leader = self._in_flight.get(fingerprint) if fingerprint else None
+            if leader is not None and leader.status == JOB_CANCELLING:
+                leader = None  # about to stop, don't wait on it
+            stored = None
+            if fingerprint and leader is None and self.result_store is not None:
+                stored = self.result_store.get(fingerprint)
+
+            if leader is not None:
+                job.deduplicated, job.leader = "in_flight", leader
+                job.future = Future()
+                # catch up on what the running job reported so far, later events are copied
+                for _, event in list(leader.events):
+                    job.add_event(event)
+                leader.followers.append(job)
+                logger.info(f"Audit {job_id} joins running duplicate {leader.job_id}")
+            elif stored is not None:
+                job.deduplicated = "result_store"
+                job.future = Future()
+                job.future.set_result(stored)
+                logger.info(f"Audit {job_id} answered from the result store")
+            else:
+                if self._active_count() >= self.max_workers + self.max_queued:
+                    raise QueueFullError("Audit queue is full, try again later")
+                run_id = uuid.uuid4().hex
+                job.future = self._executor.submit(
+                    _run_job, run_id, method, params, self._events, self._cancelled
+                )
+                job.run, job.run_id = job.future, run_id
+                self._runs[run_id] = job
+                if fingerprint:
+                    self._in_flight[fingerprint] = job
+
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = job
+            self._trim_history()
+        if leader is not None:
+            leader.future.add_done_callback(lambda f, job=job: _follow(job.future, f))
+        if job.run is not None:
+            job.run.add_done_callback(lambda f, run_id=job.run_id: self._forget_run(run_id))
+        job.future.add_done_callback(lambda f, job=job, method=method: self._on_done(job, f, method))
+        return job
+
+    def get(self, job_id: str) -> Optional[AuditJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[AuditJob]:
+        """
+        Cancel a job. Pending jobs are dropped right away, running ones stop at
+        the next stage boundary. A job that others joined as duplicates only
+        drops out: the first of them takes over the computation. Likewise a
+        duplicate stops waiting and the job it joined goes on. Returns None if
+        the job is unknown.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        with self._lock:
+            if job.finished:
+                return job
+            if job.leader is not None and job in job.leader.followers:
+                job.leader.followers.remove(job)
+            handed_over = job.leader is None and self._hand_over(job) is not None
+            run = job.run
+        if handed_over:
+            job.add_event({"type": "status", "status": job.status, "error": job.error})
+            return job
+        if run is None:
+            # nothing of its own to stop, done callback marks it cancelled
+            job.future.cancel()
+            return job
+        if run.cancel():
+            # never started, done callback marks it cancelled
+            return job
+        with self._lock:
+            if not job.finished:
+                self._cancelled[job.run_id] = True
+                job.status = JOB_CANCELLING
+        job.add_event({"type": "status", "status": JOB_CANCELLING})
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "jobs": counts,
+            }
+
+    def worker_pids(self) -> List[int]:
+        """Process ids of the pool workers started so far."""
+        with self._lock:
+            processes = getattr(self._executor, "_processes", None) or {}
+            return list(processes)
+
+    def _active_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.finished and job.leader is None)
+
+    def _fingerprint(self, method: str, params: Dict[str, Any]) -> Optional[str]:
+        try:
+            return request_fingerprint(method, params, config.snapshot())
+        except OSError as e:
+            # unreadable file, the job itself will report it
+            logger.warning(f"Could not fingerprint audit request: {e}")
+            return None
+
+    def _hand_over(self, job: AuditJob) -> Optional[AuditJob]:
+        # give job's computation to the first duplicate still waiting on it
+        # and mark job cancelled; None if nobody is waiting. Under the lock.
+        waiting = [f for f in job.followers if not f.finished]
+        if job.run is None or not waiting:
+            return None
+        heir = waiting[0]
+        heir.leader, heir.followers = None, waiting[1:]
+        for follower in heir.followers:
+            follower.leader = heir
+        heir.run, heir.run_id = job.run, job.run_id
+        heir.status, heir.stage, heir.progress = job.status, job.stage, job.progress
+        heir.started_at = job.started_at
+        self._runs[heir.run_id] = heir
+        if job.fingerprint and self._in_flight.get(job.fingerprint) is job:
+            self._in_flight[job.fingerprint] = heir
+        job.run = job.run_id = None
+        job.followers = []
+        job.status = JOB_CANCELLED
+        job.finished_at = time.time()
+        logger.info(f"Audit {job.job_id} cancelled, {heir.job_id} takes over its computation")
+        return heir
+
+    def _trim_history(self):
+        # drop the oldest finished jobs once we keep too many around
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished][:excess]:
+            del self._jobs[job_id]
+
+    def _drain_events(self):
+        while True:
+            try:
+                event = self._events.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            job_id, event = event
+            with self._lock:
+                job = self._runs.get(job_id)
+                if job is None or job.finished:
+                    continue
+                started = job.status == JOB_PENDING
+                if started:
+                    job.status = JOB_RUNNING
+                    job.started_at = time.time()
+                if event["type"] == "progress":
+                    job.stage = event["stage"]
+                    # concurrent stages report out of order, progress only moves forward
+                    job.progress = max(job.progress, event["progress"])
+                listeners = [job] + job.followers
+            for listener in listeners:
+                if started:
+                    listener.add_event({"type": "status", "status": JOB_RUNNING})
+                listener.add_event(event)
+
+    def _forget_run(self, run_id: str):
+        with self._lock:
+            self._runs.pop(run_id, None)
+            try:
+                self._cancelled.pop(run_id, None)
+            except Exception:
+                pass  # manager already gone during shutdown
+
+    def _on_done(self, job: AuditJob, future: Future, method: str = "run_audit"):
+        with self._lock:
+            if job.finished:
+                return  # handed its computation over when it was cancelled
+            job.finished_at = time.time()
+            if job.fingerprint and self._in_flight.get(job.fingerprint) is job:
+                del self._in_flight[job.fingerprint]
+            try:
+                job.result = future.result()
+                job.status = JOB_COMPLETED
+                job.progress = 1.0
+                job.stage = None
+                if job.run_id is not None:
+                    observe_timings(job.result)
+            except (CancelledError, AuditCancelled):
+                job.status = JOB_CANCELLED
+            except Exception as e:
+                logger.error(f"Audit job {job.job_id} failed: {e}")
+                job.status = JOB_FAILED
+                job.error = str(e)
+        job.add_event({"type": "status", "status": job.status, "error": job.error})
+        store = (
+            job.status == JOB_COMPLETED and job.run_id is not None and job.fingerprint
+            and self.result_store is not None and _complete(job.result)
+        )
+        if store:
+            self.result_store.put(job.fingerprint, method, job.result)
+
+
+def _follow(follower: Future, leader: Future):
+    """Hand the outcome of a running job to a duplicate waiting on it."""
+    try:
+        if leader.cancelled():
+            follower.cancel()
+        elif leader.exception() is not None:
+            follower.set_exception(leader.exception())
+        else:
+            follower.set_result(leader.result())
+    except InvalidStateError:
+        pass  # the duplicate was cancelled on its own
+
+
+def _complete(result) -> bool:
+    """Partial or failed results are worth retrying, not storing."""
+    for entry in result if isinstance(result, list) else [result]:
+        if not isinstance(entry, dict) or entry.get("status") == "failed":
+            return False
+        if any(str(w).startswith("Partial audit") for w in entry.get("warnings", [])):
+            return False
+    return True
@@ -1,11 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
+import asyncio
+import json
 import os
 import logging
 
-from audit_engine import AuditEngine
+from audit_engine import AuditCancelled, SWEEP_METRICS
+from config import config
+from instrumentation import process_memory, render_prometheus
+from group_metrics import SensitiveEncoder
+from job_queue import AuditJobQueue, QueueFullError
+from monitor import MonitorRegistry, PredictionMonitor
+from result_store import ResultStore
+from warmup import Warmup
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,12 +35,31 @@ app.add_middleware(
 )
 
 # request models
+class ScoringThresholds(BaseModel):
+    """Per audit overrides of the config thresholds / compliance weights."""
+    bias_threshold: Optional[float] = None
+    disparate_impact_min: Optional[float] = None
+    transparency_weight: Optional[float] = None
+    accountability_weight: Optional[float] = None
+    fairness_weight: Optional[float] = None
+    safety_weight: Optional[float] = None
+
 class AuditRequest(BaseModel):
     audit_id: str
     model_path: str
     audit_type: str = "full"
     sensitive_features: Optional[List[str]] = None
     test_data_path: Optional[str] = None
+    # read test data in chunks, None = decide from file size
+    streaming: Optional[bool] = None
+    # False = just queue it and return the job id, poll GET /audit/{id} for results
+    wait: bool = True
+    # attach a cProfile summary of the audit to the results
+    profile: bool = False
+    thresholds: Optional[ScoringThresholds] = None
+    # audit_type "quick": grow the sample until every metric is within this,
+    # defaults to QUICK_TARGET_ERROR (0 = one sample of QUICK_SAMPLE_ROWS)
+    target_error: Optional[float] = None
 
 class AuditResponse(BaseModel):
     audit_id: str
@@ -40,47 +69,189 @@ class AuditResponse(BaseModel):
     cern_compliance: float
     bias_metrics: Dict[str, float]
     fairness_metrics: Dict[str, float]
+    # per attribute / intersection breakdown with group sizes
+    group_metrics: Dict[str, Any] = {}
+    # bootstrap interval of each bias / fairness metric
+    confidence_intervals: Dict[str, Any] = {}
     explainability: Dict[str, Any]
     cern_compliance_details: Dict[str, float]
     warnings: List[str]
     recommendations: List[str]
+    # wall / cpu seconds and rss change per pipeline stage
+    timings: Optional[Dict[str, Any]] = None
+    profile: Optional[str] = None
+    # thresholds / weights the scores were computed with
+    thresholds: Dict[str, float] = {}
+    # true when stored predictions of the same model + data were re-scored
+    reused_predictions: bool = False
+    # "in_flight" / "result_store" when an identical request was reused
+    deduplicated: Optional[str] = None
+    # MB held by the compacted test data / predictions, and the feature dtypes
+    memory: Dict[str, Any] = {}
+    # audit_type "quick": sample size and the error of each metric
+    sampling: Optional[Dict[str, Any]] = None
+
+class BatchAuditItem(BaseModel):
+    model_path: str
+    # defaults to the batch audit_type
+    audit_type: Optional[str] = None
+
+class BatchAuditRequest(BaseModel):
+    audit_id: str
+    models: List[BatchAuditItem]
+    audit_type: str = "full"
+    sensitive_features: Optional[List[str]] = None
+    test_data_path: Optional[str] = None
+    wait: bool = True
+
+class BatchAuditResponse(BaseModel):
+    audit_id: str
+    status: str
+    # one entry per requested model, in request order, each with its own
+    # status ("completed" / "failed") and the usual audit fields
+    results: List[Dict[str, Any]]
+
+class ThresholdSweepRequest(BaseModel):
+    audit_id: str
+    model_path: str
+    sensitive_features: Optional[List[str]] = None
+    test_data_path: Optional[str] = None
+    # defaults come from SWEEP_THRESHOLDS / SWEEP_METRIC / SWEEP_ACCURACY_TOLERANCE
+    n_thresholds: Optional[int] = None
+    metric: Optional[str] = None
+    accuracy_tolerance: Optional[float] = None
+    wait: bool = True
+
+class ThresholdSweepResponse(BaseModel):
+    audit_id: str
+    status: str
+    metric: str
+    accuracy_tolerance: float
+    thresholds: List[float]
+    # worst case over the sensitive attributes, one value per threshold
+    curve: Dict[str, List[float]]
+    by_attribute: Dict[str, Dict[str, List[float]]]
+    fairness_optimal: Dict[str, float]
+    accuracy_optimal: Dict[str, float]
+    frontier: List[Dict[str, float]]
+    timings: Optional[Dict[str, Any]] = None
+
+class MonitorRequest(BaseModel):
+    monitor_id: str
+    sensitive_features: List[str]
+    label_column: str = "label"
+    # 0/1 predictions, or scores that get thresholded at 0.5
+    prediction_column: str = "prediction"
+    # default to MONITOR_WINDOW_ROWS / MONITOR_PANES
+    window_rows: Optional[int] = None
+    panes: Optional[int] = None
+    # JSONL or Parquet prediction log to follow as it grows
+    source_path: Optional[str] = None
 
-# init audit engine
-audit_engine = AuditEngine()
+class MonitorRecords(BaseModel):
+    records: List[Dict[str, Any]]
+
+# audits run on a process pool so the event loop stays responsive
+job_queue = AuditJobQueue(
+    max_workers=config.AUDIT_WORKERS,
+    max_queued=config.AUDIT_MAX_QUEUED,
+    history_size=config.AUDIT_JOB_HISTORY,
+    result_store=ResultStore(
+        config.RESULT_STORE_PATH,
+        ttl_seconds=config.RESULT_STORE_TTL_SECONDS,
+        max_bytes=config.RESULT_STORE_MAX_MB * 1024 * 1024
+    )
+)
+
+# monitors are stateful and live in this process, only their counts are kept
+monitors = MonitorRegistry(max_monitors=config.MONITOR_MAX, poll_seconds=config.MONITOR_POLL_SECONDS)
+
+# heavy libs load in the background so /health answers right away
+warmup = Warmup(config.PRELOAD_MODULES)
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
+
+@app.on_event("startup")
+def start_monitors():
+    monitors.start()
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    job_queue.shutdown()
+
+@app.on_event("shutdown")
+def shutdown_monitors():
+    monitors.stop()
 
 @app.get("/health")
 def health_check():
+    """Liveness - the process is up."""
     return {"status": "ok", "service": "ml-audit"}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness - libraries are loaded and audits won't pay the import cost."""
+    status = warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **status})
+    return {"status": "ready", **status}
+
 @app.post("/audit", response_model=AuditResponse)
 async def run_audit(request: AuditRequest):
     """
     Run a full audit on the provided model.
-    This can take a while for big models so maybe add async queue later
+    With wait=false the audit is only queued and a 202 with the job status
+    comes back right away.
     """
     logger.info(f"Starting audit {request.audit_id} for model: {request.model_path}")
     
+    job = None
     try:
         # check if model file exists
         if not os.path.exists(request.model_path):
             raise HTTPException(status_code=404, detail=f"Model file not found: {request.model_path}")
         
-        # run the audit
-        results = audit_engine.run_audit(
+        job = await _submit_job(
+            request.audit_id,
             model_path=request.model_path,
             audit_type=request.audit_type,
             sensitive_features=request.sensitive_features,
-            test_data_path=request.test_data_path
+            test_data_path=request.test_data_path,
+            streaming=request.streaming,
+            profile=request.profile,
+            thresholds=request.thresholds.model_dump(exclude_none=True) if request.thresholds else None,
+            target_error=request.target_error
         )
         
-        logger.info(f"Audit {request.audit_id} completed successfully")
+        if not request.wait:
+            return JSONResponse(status_code=202, content=job.to_dict())
+        
+        # run the audit without blocking other requests
+        results = await asyncio.wrap_future(job.future)
+        
+        logger.info(
+            f"Audit {request.audit_id} completed in {results['timings']['total_wall_s']:.2f}s"
+        )
         
         return AuditResponse(
             audit_id=request.audit_id,
             status="completed",
+            deduplicated=job.deduplicated,
             **results
         )
         
+    except HTTPException:
+        raise
+    except AuditCancelled:
+        raise HTTPException(status_code=409, detail=f"Audit {request.audit_id} was cancelled")
+    except asyncio.CancelledError:
+        # job dropped from the queue before it started (or client went away,
+        # maybe before it was even submitted)
+        if job is not None and job.future.cancelled():
+            raise HTTPException(status_code=409, detail=f"Audit {request.audit_id} was cancelled")
+        raise
     except FileNotFoundError as e:
         logger.error(f"File not found: {e}")
         raise HTTPException(status_code=404, detail=str(e))
@@ -89,6 +260,227 @@ async def run_audit(request: AuditRequest):
         # return partial results with error
         raise HTTPException(status_code=500, detail=f"Audit failed: {str(e)}")
 
+@app.post("/audit/batch", response_model=BatchAuditResponse)
+async def run_batch_audit(request: BatchAuditRequest):
+    """
+    Audit several models against the same test data in one job. The data is
+    loaded and grouped once and every distinct model predicted once, so this
+    is much cheaper than one /audit call per model. A model that fails only
+    fails its own entry.
+    """
+    logger.info(f"Starting batch audit {request.audit_id} for {len(request.models)} models")
+    
+    if not request.models:
+        raise HTTPException(status_code=400, detail="No models given")
+    for item in request.models:
+        if not os.path.exists(item.model_path):
+            raise HTTPException(status_code=404, detail=f"Model file not found: {item.model_path}")
+    
+    job = await _submit_job(
+        request.audit_id,
+        method="run_batch_audit",
+        models=[item.model_dump() for item in request.models],
+        audit_type=request.audit_type,
+        sensitive_features=request.sensitive_features,
+        test_data_path=request.test_data_path
+    )
+    
+    if not request.wait:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    
+    try:
+        results = await asyncio.wrap_future(job.future)
+    except AuditCancelled:
+        raise HTTPException(status_code=409, detail=f"Audit {request.audit_id} was cancelled")
+    except asyncio.CancelledError:
+        if job.future.cancelled():
+            raise HTTPException(status_code=409, detail=f"Audit {request.audit_id} was cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Batch audit failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Audit failed: {str(e)}")
+    
+    logger.info(f"Batch audit {request.audit_id} completed")
+    return BatchAuditResponse(audit_id=request.audit_id, status="completed", results=results)
+
+@app.post("/audit/threshold-sweep", response_model=ThresholdSweepResponse)
+async def run_threshold_sweep(request: ThresholdSweepRequest):
+    """
+    Bias / fairness metrics and accuracy at many decision thresholds, plus
+    the fairness-accuracy frontier and the fairest threshold that keeps
+    accuracy within accuracy_tolerance of the best. The model scores the
+    data once, so a few hundred thresholds cost about as much as one audit.
+    """
+    logger.info(f"Starting threshold sweep {request.audit_id} for model: {request.model_path}")
+    
+    if not os.path.exists(request.model_path):
+        raise HTTPException(status_code=404, detail=f"Model file not found: {request.model_path}")
+    if request.metric is not None and request.metric not in SWEEP_METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {request.metric}")
+    if request.n_thresholds is not None and request.n_thresholds < 2:
+        raise HTTPException(status_code=400, detail="n_thresholds must be at least 2")
+    
+    job = await _submit_job(
+        request.audit_id,
+        method="run_threshold_sweep",
+        model_path=request.model_path,
+        sensitive_features=request.sensitive_features,
+        test_data_path=request.test_data_path,
+        n_thresholds=request.n_thresholds,
+        metric=request.metric,
+        accuracy_tolerance=request.accuracy_tolerance
+    )
+    
+    if not request.wait:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    
+    try:
+        results = await asyncio.wrap_future(job.future)
+    except AuditCancelled:
+        raise HTTPException(status_code=409, detail=f"Audit {request.audit_id} was cancelled")
+    except asyncio.CancelledError:
+        if job.future.cancelled():
+            raise HTTPException(status_code=409, detail=f"Audit {request.audit_id} was cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Threshold sweep failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Audit failed: {str(e)}")
+    
+    logger.info(f"Threshold sweep {request.audit_id} completed")
+    return ThresholdSweepResponse(audit_id=request.audit_id, status="completed", **results)
+
+async def _submit_job(audit_id: str, **params):
+    """Queue a job, mapping queue errors to HTTP ones."""
+    try:
+        # fingerprinting hashes the model and data files, keep that off the event loop
+        return await asyncio.to_thread(job_queue.submit, audit_id, **params)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/audit/{audit_id}")
+def get_audit(audit_id: str):
+    """Status, progress and (once finished) results of a queued audit."""
+    job = job_queue.get(audit_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Audit not found: {audit_id}")
+    return job.to_dict()
+
+@app.get("/audit/{audit_id}/events")
+async def audit_events(audit_id: str, request: Request):
+    """
+    Server-Sent Events stream of a queued audit: status changes, progress,
+    stage started / finished, rows predicted and partial metrics as soon as
+    they're computed. Event ids are sequence numbers, so a client that
+    reconnects with Last-Event-ID picks up where it left off. The stream ends
+    after the final status event (completed / failed / cancelled); the
+    results themselves are on GET /audit/{id}.
+    """
+    job = job_queue.get(audit_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Audit not found: {audit_id}")
+    last_id = request.headers.get("last-event-id", "")
+    
+    async def stream():
+        seq = int(last_id) if last_id.isdigit() else 0
+        while True:
+            events, closed = await job.wait_events(seq, config.SSE_KEEPALIVE_SECONDS)
+            for seq, event in events:
+                yield f"id: {seq}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+            if closed:
+                return
+            if not events:
+                if await request.is_disconnected():
+                    return
+                # keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+    
+    return StreamingResponse(
+        stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/audit/{audit_id}")
+def cancel_audit(audit_id: str):
+    """Cancel a pending or running audit."""
+    job = job_queue.cancel(audit_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Audit not found: {audit_id}")
+    return job.to_dict()
+
+@app.post("/monitor")
+def create_monitor(request: MonitorRequest):
+    """
+    Start monitoring a stream of production predictions. Rows come in through
+    POST /monitor/{id}/records, or are read from source_path as it grows.
+    Metrics cover a sliding window of the most recent rows. What the log
+    already holds is read in the background (catching_up in the summary).
+    """
+    if request.source_path and not os.path.exists(request.source_path):
+        raise HTTPException(status_code=404, detail=f"Prediction log not found: {request.source_path}")
+    try:
+        monitor = PredictionMonitor(
+            request.monitor_id,
+            request.sensitive_features,
+            label_column=request.label_column,
+            prediction_column=request.prediction_column,
+            window_rows=request.window_rows or config.MONITOR_WINDOW_ROWS,
+            panes=request.panes or config.MONITOR_PANES,
+            source_path=request.source_path,
+            read_bytes=config.MONITOR_READ_MB * 1024 * 1024,
+            encoder=SensitiveEncoder(config.SENSITIVE_MAX_CATEGORIES, config.SENSITIVE_BUCKETS),
+            bias_threshold=config.BIAS_THRESHOLD,
+            disparate_impact_min=config.DISPARATE_IMPACT_MIN,
+            drift_threshold=config.MONITOR_DRIFT_THRESHOLD,
+            fit_rows=config.MONITOR_FIT_ROWS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        monitors.add(monitor)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    logger.info(f"Started monitor {request.monitor_id}")
+    monitors.catch_up(monitor)
+    return monitor.summary()
+
+@app.post("/monitor/{monitor_id}/records")
+def push_monitor_records(monitor_id: str, batch: MonitorRecords):
+    """Add a batch of logged predictions, returns the updated window."""
+    monitor = _get_monitor(monitor_id)
+    try:
+        monitor.push_records(batch.records)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return monitor.summary()
+
+@app.get("/monitor/{monitor_id}")
+def get_monitor(monitor_id: str):
+    """
+    Metrics of the current window, reading anything new in the followed log
+    first unless a poll (or the initial catch up) is already doing that.
+    """
+    monitor = _get_monitor(monitor_id)
+    try:
+        monitor.poll(wait=False)
+    except Exception as e:
+        logger.warning(f"Monitor {monitor_id} could not read {monitor.source_path}: {e}")
+    return monitor.summary()
+
+@app.delete("/monitor/{monitor_id}")
+def delete_monitor(monitor_id: str):
+    if not monitors.remove(monitor_id):
+        raise HTTPException(status_code=404, detail=f"Monitor not found: {monitor_id}")
+    return {"monitor_id": monitor_id, "status": "deleted"}
+
+def _get_monitor(monitor_id: str) -> PredictionMonitor:
+    monitor = monitors.get(monitor_id)
+    if monitor is None:
+        raise HTTPException(status_code=404, detail=f"Monitor not found: {monitor_id}")
+    return monitor
+
 @app.get("/metrics")
 def get_available_metrics():
     """List all available fairness metrics"""
@@ -109,6 +501,28 @@ def get_available_metrics():
         ]
     }
 
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage timing histograms and job queue state in Prometheus text format."""
+    stats = job_queue.stats()
+    store = job_queue.result_store.stats()
+    # this API process plus its audit workers
+    memory: Dict[str, float] = {}
+    for pid in ["self"] + job_queue.worker_pids():
+        for kind, value in process_memory(pid).items():
+            memory[kind] = memory.get(kind, 0) + value
+    return render_prometheus({
+        "audit_jobs": ("Audit jobs currently tracked, by status", stats["jobs"]),
+        "audit_result_store_lookups": (
+            "Result store lookups since startup, by outcome",
+            {"hit": store["hits"], "miss": store["misses"]}
+        ),
+        "audit_process_memory_bytes": (
+            "Memory of the API process and its audit workers; pss counts shared pages once",
+            memory, "kind"
+        ),
+    })
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,91 @@
+"""
+In-process cache for deserialized models.
+
+Entries are keyed by file fingerprint so an overwritten upload never serves a
+stale model, and the least recently used models get evicted once the memory
+budget is used up.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from fingerprint import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCache:
+    """
+    LRU cache of (model, framework) tuples.
+
+    There's no reliable way to measure the in-memory size of an arbitrary
+    model, so the file size on disk is used as the cost estimate. For pickled
+    sklearn models and saved torch/keras weights that's close enough.
+    """
+
+    def __init__(self, max_bytes: int, hash_content: bool = False):
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self._entries: "OrderedDict[str, Tuple[Any, str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, path: str) -> str:
+        return file_fingerprint(path, content_hash=self.hash_content)
+
+    def get_or_load(self, path: str, loader: Callable[[str], Tuple[Any, str]]) -> Tuple[Any, str]:
+        """Return the cached model for path, calling loader(path) on a miss."""
+        key = self.key_for(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                logger.info(f"Model cache hit for {path}")
+                return entry[0], entry[1]
+            self.misses += 1
+
+        # load outside the lock, deserializing can take a while
+        model, framework = loader(path)
+        size = os.path.getsize(path)
+
+        if size > self.max_bytes:
+            # would evict everything else and still not fit
+            return model, framework
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (model, framework, size)
+                self.current_bytes += size
+                self._evict()
+        return model, framework
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            key, (_, _, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+            logger.info(f"Evicted model {key} from cache")
@@ -0,0 +1,397 @@
+"""
+Continuous fairness monitoring over production prediction logs.
+
+A monitor keeps per-group confusion counts for a sliding window of the most
+recent rows. The window is a queue of panes: every incoming batch is added to
+the current pane and to the window total, and once the window holds enough
+rows without its oldest pane, that pane is subtracted from the total again.
+So an update costs O(batch), memory is a handful of count matrices however
+long the log gets, and the metrics are recomputed from the window total
+without looking at old rows.
+
+Rows come in as pushed batches of records or by following a log that is
+appended to: JSONL from the last byte offset read, Parquet from the last row
+group read. Lines that aren't valid JSON, and rows or row groups missing a
+required column, are skipped and counted in bad_rows; the monitor moves on
+past them instead of failing on the same bytes every poll.
+"""
+import io
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from group_metrics import GroupConfusionCounts, SensitiveEncoder, worst_case
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionMonitor:
+    """
+    Sliding window bias / fairness metrics for one stream of predictions.
+
+    Each row needs the sensitive columns, the true label and the prediction
+    (a 0/1 class, or a score that is thresholded at 0.5). Rows without a
+    label yet are skipped. The window covers the last window_rows rows, give
+    or take one pane (window_rows / panes rows).
+
+    The first fit_rows rows are held back until the encoder has decided on
+    them which attributes get bucketed (and where), see SensitiveEncoder; a
+    first push of a few rows would fix that for good. Until then the window
+    is empty and rows_pending says how many rows are waiting.
+    """
+
+    def __init__(
+        self,
+        monitor_id: str,
+        sensitive_features: List[str],
+        label_column: str = "label",
+        prediction_column: str = "prediction",
+        window_rows: int = 100_000,
+        panes: int = 10,
+        source_path: Optional[str] = None,
+        read_bytes: int = 16 * 1024 * 1024,
+        encoder: Optional[SensitiveEncoder] = None,
+        bias_threshold: float = 0.1,
+        disparate_impact_min: float = 0.8,
+        drift_threshold: float = 0.05,
+        fit_rows: int = 1000
+    ):
+        if not sensitive_features:
+            raise ValueError("A monitor needs at least one sensitive feature")
+        self.monitor_id = monitor_id
+        self.sensitive_features = list(sensitive_features)
+        self.label_column = label_column
+        self.prediction_column = prediction_column
+        self.window_rows = max(window_rows, 1)
+        self.pane_rows = max(self.window_rows // max(panes, 1), 1)
+        self.source_path = source_path
+        self.read_bytes = read_bytes
+        self.encoder = encoder or SensitiveEncoder()
+        self.bias_threshold = bias_threshold
+        self.disparate_impact_min = disparate_impact_min
+        self.drift_threshold = drift_threshold
+        self.fit_rows = min(max(fit_rows, 1), self.window_rows)
+        # (sensitive, labels, predictions) held back until the encoder is fit
+        self._pending: Optional[List[tuple]] = []
+
+        self.window = GroupConfusionCounts(self.sensitive_features)
+        # closed panes, oldest first, as (counts, rows)
+        self._panes: deque = deque()
+        self._pane = np.zeros((0, 4), dtype=np.int64)
+        self._pane_filled = 0
+        self.rows_seen = 0
+        # log rows that couldn't be used (bad JSON, missing columns)
+        self.bad_rows = 0
+        # metrics of the first full window, drift is measured against it
+        self.baseline: Optional[Dict[str, float]] = None
+        # bytes (JSONL) or row groups (Parquet) of source_path consumed so far
+        self.offset = 0
+        self._lock = threading.Lock()
+        # the poller thread and API requests may poll at the same time
+        self._poll_lock = threading.Lock()
+        # reading what the log held when the monitor was added, see MonitorRegistry.catch_up
+        self.catching_up = False
+
+    @property
+    def rows_in_window(self) -> int:
+        return self.window.n_rows
+
+    @property
+    def rows_pending(self) -> int:
+        return sum(len(p[1]) for p in self._pending) if self._pending else 0
+
+    def push(self, frame: pd.DataFrame) -> int:
+        """Add a batch of log rows, returns how many were used."""
+        missing = [
+            c for c in self.sensitive_features + [self.label_column, self.prediction_column]
+            if c not in frame.columns
+        ]
+        if missing:
+            raise ValueError(f"Missing columns in prediction log: {missing}")
+        frame = frame[frame[self.label_column].notna()]
+        if frame.empty:
+            return 0
+
+        predictions = frame[self.prediction_column].to_numpy()
+        if predictions.dtype.kind == "f":
+            predictions = (predictions > 0.5).astype(np.int8)
+
+        raw = frame[self.sensitive_features]
+        labels = frame[self.label_column].to_numpy()
+        with self._lock:
+            self.rows_seen += len(frame)
+            if self._pending is not None:
+                self._pending.append((raw, labels, predictions))
+                if self.rows_pending < self.fit_rows:
+                    return len(frame)
+                # enough rows to decide the buckets on, count everything held back
+                raw = pd.concat([p[0] for p in self._pending], ignore_index=True)
+                labels = np.concatenate([p[1] for p in self._pending])
+                predictions = np.concatenate([p[2] for p in self._pending])
+                self._pending = None
+                self.encoder.fit(raw)
+
+            sensitive = self.encoder.transform(raw)
+            before = self.window.counts.copy()
+            self.window.update(sensitive, labels, predictions)
+            # what this batch added, per group (groups only ever get appended)
+            delta = self.window.counts.copy()
+            delta[:len(before)] -= before
+            self._pane = _padded(self._pane, len(delta))
+            self._pane += delta
+            self._pane_filled += len(labels)
+
+            if self._pane_filled >= self.pane_rows:
+                self._panes.append((self._pane, self._pane_filled))
+                self._pane = np.zeros((0, 4), dtype=np.int64)
+                self._pane_filled = 0
+            self._evict()
+
+            if self.baseline is None and self.rows_in_window >= self.window_rows:
+                self.baseline = self._flat_metrics()
+        return len(frame)
+
+    def push_records(self, records: List[Dict[str, Any]]) -> int:
+        return self.push(pd.DataFrame.from_records(records))
+
+    def poll(self, wait: bool = True) -> int:
+        """
+        Read whatever was appended to source_path since the last poll. With
+        wait=False it returns 0 right away if another poll is running.
+        """
+        if not self.source_path or not os.path.exists(self.source_path):
+            return 0
+        if not self._poll_lock.acquire(blocking=wait):
+            return 0
+        try:
+            if self.source_path.endswith(".parquet"):
+                return self._poll_parquet()
+            return self._poll_jsonl()
+        finally:
+            self._poll_lock.release()
+
+    def summary(self) -> Dict[str, Any]:
+        """Current window metrics, per attribute and worst case, plus drift."""
+        with self._lock:
+            analysis = self._analysis()
+            metrics = self._flat_metrics(analysis)
+            drift = {}
+            if self.baseline is not None:
+                drift = {name: value - self.baseline[name] for name, value in metrics.items()}
+            return {
+                "monitor_id": self.monitor_id,
+                "sensitive_features": self.sensitive_features,
+                "rows_seen": self.rows_seen,
+                "rows_in_window": self.rows_in_window,
+                "rows_pending": self.rows_pending,
+                "bad_rows": self.bad_rows,
+                "catching_up": self.catching_up,
+                "window_rows": self.window_rows,
+                "bias_metrics": worst_case(analysis, "bias_metrics"),
+                "fairness_metrics": worst_case(analysis, "fairness_metrics"),
+                "group_analysis": analysis,
+                "baseline": self.baseline,
+                "drift": drift,
+                "alerts": self._alerts(metrics, drift),
+                "source_path": self.source_path,
+                "offset": self.offset,
+            }
+
+    def _evict(self):
+        # drop the oldest pane while the rest still fills the window
+        while self._panes and self.rows_in_window - self._panes[0][1] >= self.window_rows:
+            oldest, _ = self._panes.popleft()
+            self.window.counts[:len(oldest)] -= oldest
+
+    def _analysis(self) -> Dict[str, Any]:
+        analysis = {}
+        for attr in self.sensitive_features:
+            sub = self.window.marginal([attr])
+            analysis[attr] = {
+                "attributes": [attr],
+                "bias_metrics": sub.bias_metrics(),
+                "fairness_metrics": sub.fairness_metrics(),
+                # groups that slid out of the window are still known but empty
+                "groups": [g for g in sub.group_table() if g["size"] > 0],
+            }
+        return analysis
+
+    def _flat_metrics(self, analysis: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+        analysis = analysis or self._analysis()
+        return {**worst_case(analysis, "bias_metrics"), **worst_case(analysis, "fairness_metrics")}
+
+    def _alerts(self, metrics: Dict[str, float], drift: Dict[str, float]) -> List[str]:
+        if self.rows_in_window == 0:
+            return []
+        alerts = []
+        for name, value in metrics.items():
+            if name == "disparate_impact":
+                if value < self.disparate_impact_min:
+                    alerts.append(f"disparate_impact {value:.3f} below {self.disparate_impact_min:g}")
+            elif value > self.bias_threshold:
+                alerts.append(f"{name} {value:.3f} above {self.bias_threshold:g}")
+        for name, change in drift.items():
+            if abs(change) > self.drift_threshold:
+                alerts.append(f"{name} drifted by {change:+.3f} since the baseline window")
+        return alerts
+
+    def _poll_jsonl(self) -> int:
+        if os.path.getsize(self.source_path) < self.offset:
+            # truncated or rotated, start over on the new file
+            logger.info(f"Monitor {self.monitor_id}: {self.source_path} shrank, reading from the start")
+            self.offset = 0
+        used = 0
+        with open(self.source_path, "rb") as f:
+            f.seek(self.offset)
+            pending = b""
+            while True:
+                data = f.read(self.read_bytes)
+                if not data:
+                    break
+                pending += data
+                # only whole lines, the writer may be half way through the last one
+                end = pending.rfind(b"\n") + 1
+                if end == 0:
+                    continue
+                lines, pending = pending[:end], pending[end:]
+                if lines.strip():
+                    used += self._push_lines(lines)
+                self.offset += end
+        return used
+
+    def _push_lines(self, lines: bytes) -> int:
+        try:
+            return self.push(pd.read_json(io.BytesIO(lines), lines=True, convert_dates=False))
+        except ValueError:
+            pass
+        # a broken line or a row without a required column: go line by line
+        required = self.sensitive_features + [self.label_column, self.prediction_column]
+        records, bad = [], 0
+        for line in lines.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict) and all(c in record for c in required):
+                records.append(record)
+            else:
+                bad += 1
+        with self._lock:
+            self.bad_rows += bad
+        logger.warning(f"Monitor {self.monitor_id}: skipped {bad} bad rows in {self.source_path}")
+        return self._push_or_skip(pd.DataFrame.from_records(records)) if records else 0
+
+    def _push_or_skip(self, frame: pd.DataFrame) -> int:
+        try:
+            return self.push(frame)
+        except ValueError as e:
+            logger.warning(f"Monitor {self.monitor_id}: skipped {len(frame)} rows of {self.source_path}: {e}")
+            with self._lock:
+                self.bad_rows += len(frame)
+            return 0
+
+    def _poll_parquet(self) -> int:
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(self.source_path)
+        if pf.num_row_groups < self.offset:
+            logger.info(f"Monitor {self.monitor_id}: {self.source_path} was rewritten, reading from the start")
+            self.offset = 0
+        used = 0
+        for i in range(self.offset, pf.num_row_groups):
+            used += self._push_or_skip(pf.read_row_group(i).to_pandas())
+            self.offset = i + 1
+        return used
+
+
+class MonitorRegistry:
+    """
+    Live monitors of this process, plus a thread that polls the ones
+    following a log file every poll_seconds.
+    """
+
+    def __init__(self, max_monitors: int = 32, poll_seconds: float = 5.0):
+        self.max_monitors = max_monitors
+        self.poll_seconds = poll_seconds
+        self._monitors: Dict[str, PredictionMonitor] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, monitor: PredictionMonitor):
+        with self._lock:
+            if monitor.monitor_id in self._monitors:
+                raise ValueError(f"Monitor {monitor.monitor_id} already exists")
+            if len(self._monitors) >= self.max_monitors:
+                raise ValueError(f"Too many monitors (max {self.max_monitors})")
+            self._monitors[monitor.monitor_id] = monitor
+
+    def get(self, monitor_id: str) -> Optional[PredictionMonitor]:
+        with self._lock:
+            return self._monitors.get(monitor_id)
+
+    def remove(self, monitor_id: str) -> bool:
+        with self._lock:
+            return self._monitors.pop(monitor_id, None) is not None
+
+    def catch_up(self, monitor: PredictionMonitor):
+        """
+        Read what monitor's log already holds on a thread of its own: a big
+        existing log would otherwise hold up the request that added it.
+        """
+        if not monitor.source_path:
+            return
+        monitor.catching_up = True
+
+        def run():
+            try:
+                monitor.poll()
+            except Exception as e:
+                logger.warning(f"Monitor {monitor.monitor_id} could not read {monitor.source_path}: {e}")
+            finally:
+                monitor.catching_up = False
+
+        threading.Thread(target=run, name=f"monitor-catch-up-{monitor.monitor_id}", daemon=True).start()
+
+    def poll_all(self):
+        with self._lock:
+            following = [m for m in self._monitors.values() if m.source_path]
+        for monitor in following:
+            try:
+                # a monitor still catching up is read by its own thread
+                monitor.poll(wait=False)
+            except Exception as e:
+                # a bad line or half written parquet file, try again next round
+                logger.warning(f"Monitor {monitor.monitor_id} could not read {monitor.source_path}: {e}")
+
+    def start(self):
+        if self._thread is not None or self.poll_seconds <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, name="monitor-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_seconds + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            self.poll_all()
+
+
+def _padded(counts: np.ndarray, n_groups: int) -> np.ndarray:
+    if len(counts) >= n_groups:
+        return counts
+    out = np.zeros((n_groups, 4), dtype=np.int64)
+    out[:len(counts)] = counts
+    return out
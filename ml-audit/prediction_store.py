@@ -0,0 +1,108 @@
+"""
+Persisted predictions and group statistics per (model, dataset).
+
+Everything the scores, compliance, warnings and recommendations are derived
+from is small: the per-group confusion counts plus the explainability
+summary. Keeping those on disk, keyed by the content hashes of the model and
+test data (and the settings that shape them), means re-auditing with other
+thresholds or another audit type skips loading, predicting and SHAP entirely.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from dataset_cache import evict_snapshots
+from group_metrics import GroupConfusionCounts
+
+logger = logging.getLogger(__name__)
+
+_META = "meta.json"
+# bump when the stored format or the way counts are built changes
+_VERSION = 2
+
+
+class PredictionStore:
+    """Directory of stored audits, least recently used ones go above max_bytes."""
+
+    def __init__(self, store_dir: str, max_bytes: int):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key_for(self, *parts) -> str:
+        """Stable key from JSON serializable parts (digests, settings)."""
+        blob = json.dumps([_VERSION, *parts], sort_keys=True, default=str)
+        return hashlib.blake2b(blob.encode(), digest_size=20).hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        {"counts", "sensitive_cols", "explainability"} for key, or None.
+        explainability is None if no stored audit computed it.
+        """
+        entry = os.path.join(self.store_dir, key)
+        meta_path = os.path.join(entry, _META)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass  # evicted meanwhile, meta is already read
+        with self._lock:
+            self.hits += 1
+        return {
+            "counts": GroupConfusionCounts.from_dict(meta["counts"]),
+            "sensitive_cols": meta["sensitive_cols"],
+            "explainability": meta.get("explainability"),
+        }
+
+    def save(
+        self,
+        key: str,
+        counts: GroupConfusionCounts,
+        sensitive_cols: List[str],
+        explainability: Optional[Dict[str, Any]] = None
+    ):
+        """Store (or update) an entry. Best effort, failures are only logged."""
+        entry = os.path.join(self.store_dir, key)
+        try:
+            os.makedirs(entry, exist_ok=True)
+            meta = {
+                "counts": counts.to_dict(),
+                "sensitive_cols": list(sensitive_cols or []),
+                "explainability": explainability,
+            }
+            _atomic_write(os.path.join(entry, _META), lambda f: f.write(json.dumps(meta).encode()))
+            evict_snapshots(self.store_dir, self.max_bytes, marker=_META)
+        except Exception as e:
+            logger.warning(f"Could not store predictions: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _atomic_write(path: str, write):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
@@ -0,0 +1,173 @@
+"""
+Finished audit results, keyed by a fingerprint of the request.
+
+Bulk re-audit campaigns and backend retries send the same request over and
+over. The fingerprint covers the engine method, the content hashes of every
+model / data file in the request, the remaining parameters and the service
+settings, so an identical request is answered from here instead of being
+recomputed. Entries expire after ttl_seconds and the least recently used
+ones go once the store is above max_bytes.
+
+SQLite in WAL mode, so several API processes can share one store file.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from sparse_data import data_digest
+
+logger = logging.getLogger(__name__)
+
+# bump when the result format changes
+_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    fingerprint TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    result BLOB NOT NULL
+)
+"""
+
+
+def request_fingerprint(method: str, params: Dict[str, Any], settings: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Stable key for an engine call. Parameters ending in _path that point at
+    a file are replaced by the file's content hash, so a copy of the same
+    model under another name is the same request and a retrained model
+    under the old name is not. The sidecar of a sparse test set counts as
+    part of it.
+    """
+    def resolve(value, key=""):
+        if isinstance(value, dict):
+            return {k: resolve(v, k) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [resolve(v, key) for v in value]
+        if key.endswith("_path") and isinstance(value, str) and os.path.isfile(value):
+            return data_digest(value)
+        return value
+
+    blob = json.dumps(
+        [_VERSION, method, resolve(params), settings or {}], sort_keys=True, default=str
+    )
+    return hashlib.blake2b(blob.encode(), digest_size=20).hexdigest()
+
+
+class ResultStore:
+    """Results by fingerprint in a SQLite file, with TTL and size based eviction."""
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, fingerprint: str) -> Optional[Any]:
+        """Stored result, or None if there's none or it expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db().execute(
+                "SELECT created_at, result FROM results WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds > 0 and now - row[0] > self.ttl_seconds:
+                self._db().execute("DELETE FROM results WHERE fingerprint = ?", (fingerprint,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db().execute(
+                "UPDATE results SET accessed_at = ? WHERE fingerprint = ?", (now, fingerprint)
+            )
+            self.hits += 1
+        return json.loads(zlib.decompress(row[1]))
+
+    def put(self, fingerprint: str, method: str, result: Any):
+        """Store a result. Best effort, failures are only logged."""
+        if not self.enabled:
+            return
+        try:
+            blob = zlib.compress(json.dumps(result, default=_jsonable).encode())
+            now = time.time()
+            with self._lock:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    (fingerprint, method, now, now, len(blob), blob)
+                )
+                self._evict(db, now)
+        except Exception as e:
+            logger.warning(f"Could not store audit result: {e}")
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db().execute("DELETE FROM results")
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, size = self._db().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+                ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "size_mb": round(size / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # autocommit, every statement is its own transaction
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+        return self._conn
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        if self.ttl_seconds > 0:
+            db.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # least recently used first until the rest fits
+        for fingerprint, size in db.execute(
+            "SELECT fingerprint, size FROM results ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM results WHERE fingerprint = ?", (fingerprint,))
+            total -= size
+
+
+def _jsonable(value):
+    # numpy scalars / arrays that slipped into a result
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
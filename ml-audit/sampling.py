@@ -0,0 +1,124 @@
+"""
+Stratified samples of a test set for quick audits.
+
+Group sizes and labels are known for every row without running the model, so
+a test set splits into strata of sensitive group x label whose sizes are
+exact. The only unknown is what the model predicts, and within a stratum that
+is a single proportion: the share of rows predicted positive. A sample gives
+that share per stratum, and scaling each share back up by its stratum size
+estimates the confusion counts of the whole test set, from which every
+metric follows as usual.
+
+The error of the estimate comes from replicates: each stratum's share is
+redrawn from the binomial it was estimated with, shrunk by the finite
+population correction (a stratum sampled completely has no error left), and
+the metrics are recomputed on every replicate.
+"""
+from typing import Optional
+
+import numpy as np
+
+
+class StratifiedSample:
+    """
+    Growing stratified sample of the rows of a test set.
+
+    strata gives every row's stratum (group * 2 + label), -1 for rows that
+    aren't used. Rows are drawn proportionally to the stratum sizes, but at
+    least min_rows from every stratum (or all of it, if it's smaller), so
+    small groups still get a usable estimate. Growing only draws rows that
+    weren't drawn before.
+    """
+
+    def __init__(self, strata: np.ndarray, n_strata: int, min_rows: int = 100, random_state: int = 0):
+        strata = np.asarray(strata, dtype=np.int64)
+        rng = np.random.default_rng(random_state)
+        rows = rng.permutation(np.flatnonzero(strata >= 0))
+        # random order within each stratum, strata one after another
+        self._order = rows[np.argsort(strata[rows], kind="stable")]
+        self._strata = strata
+        self.min_rows = min_rows
+        self.sizes = np.bincount(strata[rows], minlength=n_strata)
+        self._starts = np.concatenate([[0], np.cumsum(self.sizes)[:-1]])
+        self.taken = np.zeros(n_strata, dtype=np.int64)
+        self.positives = np.zeros(n_strata, dtype=np.int64)
+
+    @property
+    def rows_total(self) -> int:
+        return int(self.sizes.sum())
+
+    @property
+    def rows_taken(self) -> int:
+        return int(self.taken.sum())
+
+    @property
+    def complete(self) -> bool:
+        return bool((self.taken >= self.sizes).all())
+
+    def grow(self, n_rows: int) -> np.ndarray:
+        """Indices of the rows to add so the sample holds about n_rows rows."""
+        total = max(self.rows_total, 1)
+        target = np.ceil(self.sizes * min(n_rows / total, 1.0)).astype(np.int64)
+        target = np.minimum(np.maximum(target, self.min_rows), self.sizes)
+        target = np.maximum(target, self.taken)
+        new = [
+            self._order[start + taken:start + end]
+            for start, taken, end in zip(self._starts, self.taken, target)
+            if end > taken
+        ]
+        self.taken = target
+        return np.concatenate(new) if new else np.zeros(0, dtype=np.int64)
+
+    def add(self, rows: np.ndarray, y_pred):
+        """Record the predictions of rows returned by grow."""
+        positive = np.asarray(y_pred) == 1
+        self.positives += np.bincount(
+            self._strata[rows], weights=positive, minlength=len(self.sizes)
+        ).astype(np.int64)
+
+    def positive_rates(self) -> np.ndarray:
+        """Share of sampled rows predicted positive, per stratum."""
+        return self.positives / np.maximum(self.taken, 1)
+
+    def estimated_counts(self) -> np.ndarray:
+        """Estimated [tn, fp, fn, tp] of every group on the full test set."""
+        return stratum_counts(self.sizes, self.positive_rates())
+
+    def replicate_counts(self, n_replicates: int, random_state: int = 0) -> np.ndarray:
+        """(n_replicates, groups, 4) stack of counts the sample could as well have given."""
+        rng = np.random.default_rng(random_state)
+        n = np.maximum(self.taken, 1)
+        rate = self.positive_rates()
+        # drawn around a slightly shrunk rate, so a share of exactly 0 or 1
+        # in a partly sampled stratum doesn't claim to be exact
+        centre = (self.positives + 0.5) / (n + 1)
+        draws = rng.binomial(n, centre, size=(n_replicates, len(n))) / n
+        fpc = np.where(
+            self.sizes > 1, (self.sizes - self.taken) / np.maximum(self.sizes - 1, 1), 0.0
+        )
+        rates = np.clip(rate + np.sqrt(np.maximum(fpc, 0.0)) * (draws - centre), 0.0, 1.0)
+        return stratum_counts(self.sizes, rates)
+
+
+def stratum_counts(sizes: np.ndarray, positive_rates: np.ndarray) -> np.ndarray:
+    """
+    Per stratum sizes and predicted positive shares (strata group * 2 + label)
+    to per group [tn, fp, fn, tp]. positive_rates may have leading replicate
+    dimensions.
+    """
+    positive = sizes * positive_rates
+    negative = sizes - positive
+    shape = positive.shape[:-1] + (-1, 2)
+    positive, negative = positive.reshape(shape), negative.reshape(shape)
+    return np.stack(
+        [negative[..., 0], positive[..., 0], negative[..., 1], positive[..., 1]], axis=-1
+    )
+
+
+def interval(values: np.ndarray, confidence: float) -> Optional[list]:
+    """Percentile interval of replicate values."""
+    if values.size == 0:
+        return None
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(values, [alpha, 1 - alpha])
+    return [float(low), float(high)]
@@ -0,0 +1,82 @@
+"""
+Preloading server for the audit service.
+
+`uvicorn main:app` imports shap / sklearn / torch in the background and
+every audit worker loads its own copy of every model it audits. Here the
+process imports the PRELOAD_MODULES and loads the PRELOAD_MODELS into the
+audit engine before it starts serving, then forks the AUDIT_WORKERS pool
+workers, so they share all of that copy-on-write. gc.freeze() right before
+the fork keeps the garbage collector from touching (and so copying) those
+objects later.
+
+All of that happens on the main thread, before uvicorn, the job queue's
+event thread or the warmup thread exist: forking a process whose other
+threads hold locks (torch / OpenMP / tensorflow thread pools among them) can
+deadlock the child. That's why this forks the pool up front rather than
+using a forkserver: the workers still start from the process holding the
+preloaded models.
+
+It stays a single API process on purpose: the job queue, the monitors and
+the metrics live in it, and AUDIT_WORKERS already uses the cores. Several
+API processes would each have their own (so /audit/{id} could land on one
+that never saw the job) and their own audit pool.
+
+    python serve.py
+"""
+import gc
+import glob
+import logging
+import os
+import sys
+import threading
+import time
+from typing import List
+
+import uvicorn
+
+from config import config
+
+logger = logging.getLogger("serve")
+
+
+def expand_paths(patterns: List[str]) -> List[str]:
+    """Files matched by the paths / globs, in order, without duplicates."""
+    paths: List[str] = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.isfile(path) and path not in paths:
+                paths.append(path)
+    return paths
+
+
+def preload():
+    """Import the service, its heavy libraries and the preloaded models, then fork the audit workers."""
+    import main as service
+    from job_queue import preload_engine
+
+    started = time.perf_counter()
+    service.warmup.run()
+    preload_engine(expand_paths(config.PRELOAD_MODELS))
+    logger.info(f"Preloaded libraries and models in {time.perf_counter() - started:.1f}s")
+    # objects alive now are never collected, so the gc leaves their pages shared
+    gc.collect()
+    gc.freeze()
+    others = [t.name for t in threading.enumerate() if t is not threading.current_thread()]
+    if others:
+        logger.warning(f"Forking the audit workers with other threads running: {others}")
+    service.job_queue.start(fork_workers=True)
+    logger.info(f"Forked audit workers {service.job_queue.worker_pids()}")
+    return service.app
+
+
+def serve(host: str, port: int):
+    app = preload()
+    logger.info(f"Serving on {host}:{port}")
+    # uvicorn handles SIGTERM / SIGINT, shutdown stops the audit pool
+    uvicorn.run(app, host=host, port=port, log_level=config.LOG_LEVEL.lower())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=config.LOG_LEVEL)
+    serve(config.SERVE_HOST, config.SERVE_PORT)
+    sys.exit(0)
@@ -0,0 +1,200 @@
+"""
+Sparse test data for wide text / one-hot models.
+
+A test set with 100k+ mostly zero features doesn't fit in a dense frame, so
+these formats are read straight into a CSR matrix:
+
+- SciPy `.npz` (scipy.sparse.save_npz)
+- libsvm / svmlight text (`.svm`, `.libsvm`, `.svmlight`), labels in the file
+- Parquet with a list<int> `indices` and a list<float> `values` column per
+  row; the file's `n_features` metadata (else the largest index + 1) gives
+  the width
+
+The sensitive attributes aren't model features there, they're dense columns
+next to the matrix: the other columns of a sparse Parquet file, or a sidecar
+`<name>.meta.csv` / `<name>.meta.parquet` for the other two. As everywhere
+the last of those columns is the label (libsvm has its labels in the file,
+so there every sidecar column is an attribute).
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from fingerprint import cached_file_digest
+
+LIBSVM_EXTENSIONS = (".svm", ".libsvm", ".svmlight")
+INDICES_COLUMN = "indices"
+VALUES_COLUMN = "values"
+_SIDECARS = (".meta.csv", ".meta.parquet")
+
+
+class SparseFeatures:
+    """
+    CSR feature matrix plus the dense side columns of the same rows. Looks
+    enough like a DataFrame for the audit code around the model: `columns`,
+    `X[cols]` and `X.iloc[rows]` go to the side columns (rows of both), the
+    matrix itself only goes to the model.
+    """
+
+    def __init__(self, matrix, side: pd.DataFrame):
+        if matrix.shape[0] != len(side):
+            raise ValueError(f"{matrix.shape[0]} feature rows but {len(side)} rows of sensitive columns")
+        self.matrix = sp.csr_matrix(matrix)
+        self.side = side
+
+    @property
+    def columns(self) -> pd.Index:
+        return self.side.columns
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+
+    @property
+    def nbytes(self) -> int:
+        m = self.matrix
+        side = int(self.side.memory_usage(index=False, deep=True).sum())
+        return int(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes) + side
+
+    @property
+    def density(self) -> float:
+        rows, cols = self.matrix.shape
+        return self.matrix.nnz / max(rows * cols, 1)
+
+    @property
+    def iloc(self) -> "_RowIndexer":
+        return _RowIndexer(self)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def __getitem__(self, columns):
+        return self.side[columns]
+
+    def take(self, rows) -> "SparseFeatures":
+        if isinstance(rows, slice):
+            return SparseFeatures(self.matrix[rows], self.side.iloc[rows])
+        rows = np.asarray(rows)
+        return SparseFeatures(self.matrix[rows], self.side.iloc[rows])
+
+
+class _RowIndexer:
+    def __init__(self, features: SparseFeatures):
+        self._features = features
+
+    def __getitem__(self, rows) -> SparseFeatures:
+        return self._features.take(rows)
+
+
+def is_sparse_path(path: str) -> bool:
+    """Whether the test data at path is one of the sparse formats above."""
+    lower = path.lower()
+    if lower.endswith(".npz") or lower.endswith(LIBSVM_EXTENSIONS):
+        return True
+    if lower.endswith(".parquet") and os.path.isfile(path):
+        import pyarrow.parquet as pq
+        names = pq.read_schema(path).names
+        return INDICES_COLUMN in names and VALUES_COLUMN in names
+    return False
+
+
+def sidecar_path(path: str) -> Optional[str]:
+    """The dense side columns of an .npz / libsvm file, if there are any."""
+    if not (path.lower().endswith(".npz") or path.lower().endswith(LIBSVM_EXTENSIONS)):
+        return None
+    stem = os.path.splitext(path)[0]
+    for suffix in _SIDECARS:
+        if os.path.isfile(stem + suffix):
+            return stem + suffix
+    return None
+
+
+def data_digest(path: str) -> str:
+    """Content digest of a test data file, together with its sidecar if it has one."""
+    digest = cached_file_digest(path)
+    side = sidecar_path(path)
+    return digest if side is None else f"{digest}+{cached_file_digest(side)}"
+
+
+def load_sparse(path: str, zero_based="auto") -> Tuple[sp.csr_matrix, pd.DataFrame, np.ndarray]:
+    """(CSR features, side columns, labels) of a sparse test set."""
+    lower = path.lower()
+    if lower.endswith(".parquet"):
+        return _load_parquet(path)
+
+    side = _read_sidecar(path)
+    if lower.endswith(".npz"):
+        matrix = sp.load_npz(path).tocsr()
+        if side is None or side.shape[1] == 0:
+            raise ValueError(f"{path} needs a sidecar ({' or '.join(_SIDECARS)}) with the labels")
+        y = side.iloc[:, -1].to_numpy()
+        side = side.iloc[:, :-1]
+    else:
+        from sklearn.datasets import load_svmlight_file
+        matrix, y = load_svmlight_file(path, zero_based=zero_based)
+        if side is None:
+            side = pd.DataFrame(index=pd.RangeIndex(matrix.shape[0]))
+    if len(side) != matrix.shape[0]:
+        raise ValueError(f"{path} has {matrix.shape[0]} rows but its sidecar has {len(side)}")
+    return matrix, side, y
+
+
+def with_width(matrix: sp.csr_matrix, n_features: Optional[int]) -> sp.csr_matrix:
+    """
+    matrix with n_features columns, when trailing features never occur in
+    the file (libsvm / list columns only know the largest index seen). Shares
+    the arrays, nothing is copied.
+    """
+    if not n_features or matrix.shape[1] >= n_features:
+        return matrix
+    return sp.csr_matrix(
+        (matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], int(n_features))
+    )
+
+
+def densify_batches(X, batch_rows: int):
+    """(start, stop, dense rows) of a sparse matrix, batch_rows at a time."""
+    n = X.shape[0]
+    batch = min(batch_rows, n) if batch_rows > 0 else n
+    for start in range(0, n, max(batch, 1)):
+        stop = min(start + batch, n)
+        yield start, stop, X[start:stop].toarray()
+
+
+def _read_sidecar(path: str) -> Optional[pd.DataFrame]:
+    side = sidecar_path(path)
+    if side is None:
+        return None
+    return pd.read_parquet(side) if side.endswith(".parquet") else pd.read_csv(side)
+
+
+def _load_parquet(path: str):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    indices, offsets = _flatten_lists(table.column(INDICES_COLUMN))
+    values, value_offsets = _flatten_lists(table.column(VALUES_COLUMN))
+    if not np.array_equal(offsets, value_offsets):
+        raise ValueError(f"{path}: {INDICES_COLUMN} and {VALUES_COLUMN} differ in length")
+    metadata = table.schema.metadata or {}
+    width = int(metadata.get(b"n_features", 0)) or (int(indices.max()) + 1 if indices.size else 0)
+    matrix = sp.csr_matrix((values, indices, offsets), shape=(len(offsets) - 1, width))
+    # canonical form (sorted, no duplicate indices) like the other two loaders give
+    matrix.sum_duplicates()
+
+    dense: List[str] = [n for n in table.column_names if n not in (INDICES_COLUMN, VALUES_COLUMN)]
+    if not dense:
+        raise ValueError(f"{path} has no label column next to {INDICES_COLUMN} / {VALUES_COLUMN}")
+    side = table.select(dense).to_pandas()
+    return matrix, side.iloc[:, :-1], side.iloc[:, -1].to_numpy()
+
+
+def _flatten_lists(column) -> Tuple[np.ndarray, np.ndarray]:
+    # (flat values, row offsets starting at 0) of a list column, null rows are empty
+    array = column.combine_chunks() if hasattr(column, "combine_chunks") else column
+    offsets = np.asarray(array.offsets, dtype=np.int64)
+    flat = array.values.slice(int(offsets[0]), int(offsets[-1] - offsets[0]))
+    return np.asarray(flat.to_numpy(zero_copy_only=False)), offsets - offsets[0]
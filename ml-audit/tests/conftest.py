@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# the stores default to directories under the working directory. Point them
+# at a scratch dir before config (and main) get imported, so a test run
+# doesn't write into the source tree or re-score what an earlier run stored
+_STORE_DIR = tempfile.mkdtemp(prefix="ml-audit-tests-")
+os.environ["PREDICTION_STORE_DIR"] = os.path.join(_STORE_DIR, "prediction_store")
+os.environ["DATASET_CACHE_DIR"] = os.path.join(_STORE_DIR, "dataset_cache")
+os.environ["RESULT_STORE_PATH"] = os.path.join(_STORE_DIR, "result_store", "results.db")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def store_dir():
+    yield _STORE_DIR
+    shutil.rmtree(_STORE_DIR, ignore_errors=True)
+
+
+TEST_DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "backend", "test-data"
+)
+
+
+@pytest.fixture
+def model_path():
+    """The sklearn model in backend/test-data."""
+    return os.path.join(TEST_DATA_DIR, "test_model.pkl")
+
+
+@pytest.fixture
+def data_path():
+    """Its test set: gender, race, age and other features, the label last."""
+    return os.path.join(TEST_DATA_DIR, "test_data.csv")
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """
+    Overrides config values for one test, settings(STREAM_CHUNK_ROWS=128).
+    Returns the config. Settings the engine reads when it's created (store
+    dirs and sizes) need an AuditEngine made afterwards.
+    """
+    from config import config
+
+    def override(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(config, name, value)
+        return config
+
+    return override
+
+
+@pytest.fixture
+def engine():
+    from audit_engine import AuditEngine
+
+    return AuditEngine()
@@ -2,13 +2,34 @@ import pytest
 from fastapi.testclient import TestClient
 import sys
 import os
+import json
+import time
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from main import app
+from main import app, job_queue
 
+# the stores live in a scratch dir for the test session, see conftest.py
 client = TestClient(app)
 
+TEST_DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "backend", "test-data"
+)
+TEST_MODEL = os.path.join(TEST_DATA_DIR, "test_model.pkl")
+TEST_CSV = os.path.join(TEST_DATA_DIR, "test_data.csv")
+
+
+def wait_for_job(audit_id, timeout=120):
+    """Poll the job endpoint until the audit is finished."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/audit/{audit_id}").json()
+        if job["status"] in ("completed", "failed", "cancelled"):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f"audit {audit_id} did not finish in {timeout}s")
+
 
 def test_health_check():
     """Test health endpoint"""
@@ -36,5 +57,246 @@ def test_audit_missing_model():
     assert response.status_code == 404
 
 
-# TODO: add test with actual model file
+def test_audit_job_mode():
+    """Queued audit returns right away and can be polled"""
+    response = client.post("/audit", json={
+        "audit_id": "job-test-1",
+        "model_path": TEST_MODEL,
+        "test_data_path": TEST_CSV,
+        "audit_type": "bias",
+        "wait": False
+    })
+    assert response.status_code == 202
+    assert response.json()["audit_id"] == "job-test-1"
+
+    job = wait_for_job("job-test-1")
+    assert job["status"] == "completed"
+    assert job["progress"] == 1.0
+    assert "demographic_parity" in job["result"]["bias_metrics"]
+
+
+def test_audit_events_stream():
+    """Queued audit streams its progress as server-sent events until it finishes"""
+    response = client.post("/audit", json={
+        "audit_id": "events-test-1",
+        "model_path": TEST_MODEL,
+        "test_data_path": TEST_CSV,
+        "audit_type": "bias",
+        # a request no other test makes, so it really runs instead of coming from the result store
+        "thresholds": {"bias_threshold": 0.11},
+        "wait": False
+    })
+    assert response.status_code == 202
+
+    events = []
+    with client.stream("GET", "/audit/events-test-1/events") as stream:
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        for line in stream.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[len("data: "):]))
+
+    types = [event["type"] for event in events]
+    assert "stage_started" in types and "progress" in types
+    assert any(e["type"] == "metrics" and "bias_metrics" in e for e in events)
+    assert events[-1] == {**events[-1], "type": "status", "status": "completed"}
+
+    # replaying from an event id only sends what came after it
+    with client.stream("GET", "/audit/events-test-1/events", headers={"Last-Event-ID": "2"}) as stream:
+        ids = [int(line[4:]) for line in stream.iter_lines() if line.startswith("id: ")]
+    assert ids[0] == 3 and len(ids) == len(events) - 2
+
+
+def test_unknown_audit_events():
+    assert client.get("/audit/no-such-job/events").status_code == 404
+
+
+def test_event_watchers_dont_hold_threads():
+    """Stream clients wait on the event loop, so many of them don't use up the thread pool"""
+    import asyncio
+    import threading
+    from job_queue import AuditJob
+
+    job = AuditJob("watched", {})
+
+    async def watch():
+        before = threading.active_count()
+        waiters = [asyncio.ensure_future(job.wait_events(0, timeout=10)) for _ in range(100)]
+        await asyncio.sleep(0.1)
+        # a hundred watchers waiting and no new threads for them
+        assert threading.active_count() == before
+        emitter = threading.Thread(target=job.add_event, args=({"type": "progress", "progress": 0.5},))
+        emitter.start()
+        results = await asyncio.gather(*waiters)
+        emitter.join()
+        return results
+
+    results = asyncio.run(watch())
+    assert all(events[0][0] == 1 and not closed for events, closed in results)
+    # and nothing new times out empty
+    assert asyncio.run(job.wait_events(1, timeout=0.05)) == ([], False)
+
+
+def test_audit_wait_mode():
+    """Default mode still returns the full results"""
+    response = client.post("/audit", json={
+        "audit_id": "job-test-2",
+        "model_path": TEST_MODEL,
+        "test_data_path": TEST_CSV,
+        "audit_type": "fairness"
+    })
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert "compliance" in response.json()["timings"]["stages"]
+
+
+def test_audit_cancelled_while_submitting(monkeypatch):
+    """A client that goes away before the job is queued just cancels the request"""
+    import asyncio
+    import main
+
+    async def never_submitted(audit_id, **params):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(main, "_submit_job", never_submitted)
+
+    async def disconnect():
+        request = main.AuditRequest(audit_id="job-test-gone", model_path=TEST_MODEL)
+        task = asyncio.ensure_future(main.run_audit(request))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(disconnect())
+
+
+def test_prometheus_metrics():
+    """Stage timings of finished audits end up in the histograms"""
+    client.post("/audit", json={
+        "audit_id": "metrics-test-1",
+        "model_path": TEST_MODEL,
+        "test_data_path": TEST_CSV,
+        "audit_type": "bias",
+        "profile": True
+    })
+    assert wait_for_job("metrics-test-1")["result"]["profile"]
+
+    response = client.get("/metrics/prometheus")
+    assert response.status_code == 200
+    assert 'audit_stage_wall_seconds_count{stage="bias_metrics"}' in response.text
+    assert 'audit_jobs{status="completed"}' in response.text
+
+
+def test_unknown_audit_job():
+    assert client.get("/audit/does-not-exist").status_code == 404
+    assert client.delete("/audit/does-not-exist").status_code == 404
+
+
+def test_batch_audit():
+    """One job audits every model in the batch"""
+    response = client.post("/audit/batch", json={
+        "audit_id": "batch-test-1",
+        "models": [
+            {"model_path": TEST_MODEL},
+            {"model_path": TEST_MODEL, "audit_type": "bias"}
+        ],
+        "test_data_path": TEST_CSV,
+        "audit_type": "fairness"
+    })
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["audit_type"] for r in results] == ["fairness", "bias"]
+    assert all(r["status"] == "completed" for r in results)
+
+
+def test_batch_audit_missing_model():
+    response = client.post("/audit/batch", json={
+        "audit_id": "batch-test-2",
+        "models": [{"model_path": TEST_MODEL}, {"model_path": "/nonexistent/model.pkl"}]
+    })
+    assert response.status_code == 404
+
+
+def test_quick_audit():
+    response = client.post("/audit", json={
+        "audit_id": "quick-test-1",
+        "model_path": TEST_MODEL,
+        "test_data_path": TEST_CSV,
+        "audit_type": "quick",
+        "target_error": 0.05
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sampling"]["target_error"] == 0.05
+    assert set(data["sampling"]["errors"]) >= set(data["bias_metrics"])
+
+
+def test_threshold_sweep():
+    response = client.post("/audit/threshold-sweep", json={
+        "audit_id": "sweep-test-1",
+        "model_path": TEST_MODEL,
+        "test_data_path": TEST_CSV,
+        "n_thresholds": 21
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["thresholds"]) == 21
+    assert len(data["curve"]["demographic_parity"]) == 21
+    assert data["metric"] == "demographic_parity"
+    assert data["fairness_optimal"]["threshold"] in data["thresholds"]
+
+
+def test_threshold_sweep_unknown_metric():
+    response = client.post("/audit/threshold-sweep", json={
+        "audit_id": "sweep-test-2",
+        "model_path": TEST_MODEL,
+        "metric": "accuracy"
+    })
+    assert response.status_code == 400
+
+
+def test_monitor_records():
+    response = client.post("/monitor", json={
+        "monitor_id": "monitor-test-1",
+        "sensitive_features": ["gender"],
+        "window_rows": 100
+    })
+    assert response.status_code == 200
+    assert client.post("/monitor", json={
+        "monitor_id": "monitor-test-1", "sensitive_features": ["gender"]
+    }).status_code == 409
+
+    records = [
+        {"gender": i % 2, "label": i % 3 == 0, "prediction": int(i % 4 == 0)}
+        for i in range(150)
+    ]
+    response = client.post("/monitor/monitor-test-1/records", json={"records": records})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows_seen"] == 150
+    assert 100 <= data["rows_in_window"] <= 150
+    assert "demographic_parity" in data["bias_metrics"]
+
+    bad = client.post("/monitor/monitor-test-1/records", json={"records": [{"gender": 1}]})
+    assert bad.status_code == 400
+
+    assert client.delete("/monitor/monitor-test-1").status_code == 200
+    assert client.get("/monitor/monitor-test-1").status_code == 404
+
+
+def test_repeated_audit_comes_from_result_store():
+    request = {
+        "model_path": TEST_MODEL,
+        "test_data_path": TEST_CSV,
+        "audit_type": "bias",
+        "sensitive_features": ["gender"]
+    }
+    first = client.post("/audit", json={"audit_id": "dedup-1", **request})
+    again = client.post("/audit", json={"audit_id": "dedup-2", **request})
+    assert first.status_code == again.status_code == 200
+    assert first.json()["deduplicated"] is None
+    assert again.json()["deduplicated"] == "result_store"
+    assert again.json()["bias_metrics"] == first.json()["bias_metrics"]
+
+
 # TODO: test different audit types
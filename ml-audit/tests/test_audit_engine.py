@@ -9,6 +9,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from audit_engine import AuditEngine
+from group_metrics import GroupConfusionCounts
 
 
 class TestAuditEngine:
@@ -83,17 +84,534 @@ class TestAuditEngine:
         y_true = np.array([1, 1, 1, 0, 0])
         y_pred = np.array([1, 1, 0, 0, 0])
         
-        tpr = self.engine._true_positive_rate(y_true, y_pred)
-        assert tpr == pytest.approx(2/3, rel=0.01)
+        counts = GroupConfusionCounts.from_arrays(pd.DataFrame({"g": [0] * 5}), y_true, y_pred)
+        assert counts.group_rates()["tpr"][0] == pytest.approx(2/3, rel=0.01)
     
     def test_false_positive_rate(self):
         """Test FPR calculation"""
         y_true = np.array([0, 0, 0, 1, 1])
         y_pred = np.array([1, 0, 0, 1, 1])
         
-        fpr = self.engine._false_positive_rate(y_true, y_pred)
-        assert fpr == pytest.approx(1/3, rel=0.01)
+        counts = GroupConfusionCounts.from_arrays(pd.DataFrame({"g": [0] * 5}), y_true, y_pred)
+        assert counts.group_rates()["fpr"][0] == pytest.approx(1/3, rel=0.01)
 
 
-# TODO: add integration tests with actual models
-# TODO: test with different model formats
+class TestGroupKernels:
+    """Per-group confusion counts and the metrics computed from them"""
+
+    def test_confusion_by_group(self):
+        """Single bincount gives the per-group confusion matrices"""
+        from group_metrics import confusion_by_group
+
+        codes = np.array([0, 0, 0, 1, 1, 1])
+        y_true = np.array([1, 1, 0, 0, 0, 1])
+        y_pred = np.array([1, 0, 0, 1, 0, 1])
+
+        counts = confusion_by_group(codes, y_true, y_pred, 2)
+        # columns are tn, fp, fn, tp
+        assert counts.tolist() == [[1, 0, 1, 1], [1, 1, 0, 1]]
+
+    def test_bias_metrics_match_fairlearn(self, engine):
+        """Kernel based metrics agree with fairlearn, also for >2 groups"""
+        from fairlearn.metrics import demographic_parity_difference, equalized_odds_difference
+
+        rng = np.random.RandomState(1)
+        X = pd.DataFrame({"race": rng.choice(["a", "b", "c"], 2000)})
+        y_true = rng.randint(0, 2, 2000)
+        y_pred = rng.randint(0, 2, 2000)
+
+        metrics = engine._compute_bias_metrics(y_true, y_pred, X, ["race"])
+        assert metrics["demographic_parity"] == pytest.approx(
+            demographic_parity_difference(y_true, y_pred, sensitive_features=X["race"])
+        )
+        assert metrics["equalized_odds"] == pytest.approx(
+            equalized_odds_difference(y_true, y_pred, sensitive_features=X["race"])
+        )
+
+
+class TestStreaming:
+    """Chunked evaluation should give the same numbers as the in-memory path"""
+
+    def test_group_counts_match_bias_metrics(self, engine):
+        from group_metrics import GroupConfusionCounts
+
+        rng = np.random.RandomState(0)
+        sensitive = rng.randint(0, 2, 500)
+        y_true = rng.randint(0, 2, 500)
+        y_pred = rng.randint(0, 2, 500)
+        X = pd.DataFrame({"gender": sensitive})
+
+        counts = GroupConfusionCounts()
+        for start in range(0, 500, 128):
+            sl = slice(start, start + 128)
+            counts.update(sensitive[sl], y_true[sl], y_pred[sl])
+
+        expected_bias = engine._compute_bias_metrics(y_true, y_pred, X, ["gender"])
+        expected_fair = engine._compute_fairness_metrics(y_true, y_pred, X, ["gender"])
+        for key, value in counts.bias_metrics().items():
+            assert value == pytest.approx(expected_bias[key])
+        for key, value in counts.fairness_metrics().items():
+            assert value == pytest.approx(expected_fair[key])
+
+    @pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+    def test_streaming_matches_in_memory(self, engine, model_path, data_path, settings, tmp_path, suffix):
+        settings(STREAM_CHUNK_ROWS=128)
+        if suffix == ".parquet":
+            pd.read_csv(data_path).to_parquet(tmp_path / "test_data.parquet")
+            data_path = str(tmp_path / "test_data.parquet")
+
+        # only gender: age buckets are fit on the first chunk when streaming
+        full = engine.run_audit(
+            model_path, audit_type="fairness", sensitive_features=["gender"],
+            test_data_path=data_path, streaming=False
+        )
+        streamed = engine.run_audit(
+            model_path, audit_type="fairness", sensitive_features=["gender"],
+            test_data_path=data_path, streaming=True
+        )
+        for key, value in full["fairness_metrics"].items():
+            assert streamed["fairness_metrics"][key] == pytest.approx(value)
+        assert streamed["fairness_score"] == pytest.approx(full["fairness_score"])
+
+
+class TestGroupAnalysis:
+    """Multiple sensitive attributes and their intersections"""
+
+    def setup_method(self):
+        rng = np.random.RandomState(3)
+        n = 3000
+        self.X = pd.DataFrame({
+            "gender": rng.randint(0, 2, n),
+            "race": rng.choice(["a", "b", "c"], n),
+            "age": rng.randint(18, 70, n),
+        })
+        self.y_true = rng.randint(0, 2, n)
+        # only older women get approved less often
+        penalty = (self.X["gender"] == 0) & (self.X["age"] > 50)
+        self.y_pred = np.where(penalty, rng.rand(n) < 0.2, rng.rand(n) < 0.6).astype(int)
+
+    def test_marginals_match_direct_counts(self):
+        from group_metrics import GroupConfusionCounts
+
+        sensitive = self.X[["gender", "race"]]
+        joint = GroupConfusionCounts.from_arrays(sensitive, self.y_true, self.y_pred)
+        direct = GroupConfusionCounts.from_arrays(self.X["race"].values, self.y_true, self.y_pred)
+
+        marginal = joint.marginal(["race"])
+        for key, value in direct.bias_metrics().items():
+            assert marginal.bias_metrics()[key] == pytest.approx(value)
+        assert marginal.n_rows == len(self.X)
+
+    def test_high_cardinality_intersections_dont_overflow(self):
+        from group_metrics import factorize_rows
+
+        rng = np.random.RandomState(0)
+        # 9000 ** 5 combinations, more than an int64 holds
+        base = pd.DataFrame({f"id{i}": rng.permutation(9000) for i in range(5)})
+        sensitive = pd.concat([base, base], ignore_index=True)
+        sensitive.loc[3, "id2"] = None
+        codes, cells = factorize_rows(sensitive)
+
+        # one cell per distinct row, plus the placeholder missing rows point away from
+        assert len([c for c in cells if c is not None]) == 9000
+        assert codes[3] == -1 and codes[9003] != -1
+        np.testing.assert_array_equal(codes[:3], [0, 1, 2])
+        for row in [0, 17, 8999, 9003, 17999]:
+            assert cells[codes[row]] == tuple(sensitive.iloc[row % 9000 if row != 9003 else row])
+        np.testing.assert_array_equal(np.delete(codes[:9000], 3), np.delete(codes[9000:], 3))
+
+    def test_every_attribute_and_intersection_reported(self, engine):
+        counts = engine._group_counts(
+            self.y_true, self.y_pred, self.X, ["gender", "race", "age"]
+        )
+        analysis = engine._analyze_groups(counts)
+
+        assert set(analysis) == {
+            "gender", "race", "age", "gender*race", "gender*age", "race*age"
+        }
+        # age is continuous so it gets bucketed
+        assert len(analysis["age"]["groups"]) == 4
+        assert sum(g["size"] for g in analysis["race"]["groups"]) == len(self.X)
+        # the intersection shows more disparity than either attribute alone
+        gap = analysis["gender*age"]["bias_metrics"]["demographic_parity"]
+        assert gap > analysis["gender"]["bias_metrics"]["demographic_parity"]
+
+    def test_missing_bucketed_values_are_skipped(self, engine):
+        X = self.X.astype({"age": float})
+        X.loc[:99, "age"] = np.nan
+        counts = engine._group_counts(self.y_true, self.y_pred, X, ["age"])
+        groups = counts.group_table()
+        # no "nan" bucket, the rows are just not counted
+        assert len(groups) == 4
+        assert all("nan" not in g["group"]["age"] for g in groups)
+        assert counts.n_rows == len(X) - 100
+    
+    def test_non_binary_attribute(self, engine):
+        metrics = engine._compute_fairness_metrics(
+            self.y_true, self.y_pred, self.X, ["race"]
+        )
+        assert 0 <= metrics["statistical_parity_difference"] <= 1
+
+
+class TestBatchAudit:
+    """Several models over the same data in one pass"""
+
+    def test_batch_matches_single_audits(self, engine, model_path, data_path):
+        results = engine.run_batch_audit(
+            [{"model_path": model_path}, {"model_path": model_path, "audit_type": "bias"}],
+            audit_type="fairness", sensitive_features=["gender"], test_data_path=data_path
+        )
+        single = engine.run_audit(
+            model_path, audit_type="fairness", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+
+        assert [r["audit_type"] for r in results] == ["fairness", "bias"]
+        assert all(r["status"] == "completed" for r in results)
+        for key, value in single["fairness_metrics"].items():
+            assert results[0]["fairness_metrics"][key] == pytest.approx(value)
+        assert results[1]["bias_metrics"] and not results[1]["fairness_metrics"]
+
+    def test_failed_model_only_fails_its_entry(self, engine, model_path, data_path, tmp_path):
+        broken = tmp_path / "broken.pkl"
+        broken.write_bytes(b"not a model")
+
+        results = engine.run_batch_audit(
+            [{"model_path": str(broken)}, {"model_path": model_path}],
+            audit_type="bias", sensitive_features=["gender"], test_data_path=data_path
+        )
+        assert results[0]["status"] == "failed" and results[0]["error"]
+        assert results[1]["status"] == "completed"
+
+
+class TestBootstrapIntervals:
+    """Confidence intervals from resampled group counts"""
+
+    def make_counts(self, n, seed=0):
+        from group_metrics import GroupConfusionCounts
+
+        rng = np.random.RandomState(seed)
+        sensitive = rng.randint(0, 2, n)
+        y_true = rng.randint(0, 2, n)
+        y_pred = (rng.rand(n) < np.where(sensitive == 0, 0.45, 0.55)).astype(int)
+        return GroupConfusionCounts.from_arrays(sensitive, y_true, y_pred)
+
+    def test_vectorized_metrics_match_point_estimates(self):
+        counts = self.make_counts(2000)
+        batch = counts.batch_metrics(counts.counts[None], 1)
+        expected = {**counts.bias_metrics(), **counts.fairness_metrics()}
+        for key, value in expected.items():
+            assert batch[key][0] == pytest.approx(value)
+
+    def test_interval_shrinks_with_more_rows(self):
+        small = self.make_counts(200).bootstrap_intervals(500)
+        large = self.make_counts(200_000).bootstrap_intervals(500)
+
+        width = lambda iv: iv["demographic_parity"][1] - iv["demographic_parity"][0]
+        assert width(large) < width(small) / 10
+        assert large["demographic_parity"][0] <= 0.1 <= large["demographic_parity"][1]
+
+    def test_parallel_draws_are_reproducible(self):
+        counts = self.make_counts(1000)
+        one = counts.bootstrap_intervals(100_000, n_jobs=4)
+        two = counts.bootstrap_intervals(100_000, n_jobs=4)
+        assert one == two
+
+    def test_noisy_gap_gets_softer_warning(self, engine):
+        results = {
+            "bias_metrics": {"demographic_parity": 0.11, "disparate_impact": 0.9},
+            "confidence_intervals": {
+                "demographic_parity": {"attribute": "gender", "low": 0.02, "high": 0.2}
+            },
+        }
+        warnings = engine._generate_warnings(results)
+        assert "High demographic parity difference detected (>0.1)" not in warnings
+        assert any("within sampling noise" in w for w in warnings)
+
+        results["confidence_intervals"]["demographic_parity"]["low"] = 0.105
+        warnings = engine._generate_warnings(results)
+        assert "High demographic parity difference detected (>0.1)" in warnings
+
+
+class TestPredictionStore:
+    """Re-audits of the same model + data only redo the scoring"""
+
+    @pytest.fixture
+    def engine(self, settings, tmp_path):
+        settings(PREDICTION_STORE_DIR=str(tmp_path / "store"))
+        return AuditEngine()
+
+    def test_rescore_matches_full_audit(self, engine, model_path, data_path):
+        first = engine.run_audit(
+            model_path, audit_type="full", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        engine.model_cache.clear()
+        engine._deserialize_model = Mock(side_effect=AssertionError("model was loaded"))
+
+        again = engine.run_audit(
+            model_path, audit_type="full", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        assert not first.get("reused_predictions")
+        assert again["reused_predictions"]
+        assert "predicting" not in again["timings"]["stages"]
+        for key in ("bias_metrics", "fairness_metrics", "cern_compliance_details", "warnings"):
+            assert again[key] == first[key]
+        assert again["explainability"]["feature_importance"] == first["explainability"]["feature_importance"]
+
+    def test_thresholds_change_warnings_only(self, engine, model_path, data_path):
+        engine.run_audit(model_path, audit_type="bias", test_data_path=data_path)
+
+        strict = engine.run_audit(
+            model_path, audit_type="bias", test_data_path=data_path,
+            thresholds={"bias_threshold": 0.0, "fairness_weight": 1.0, "transparency_weight": 0.0,
+                        "accountability_weight": 0.0, "safety_weight": 0.0}
+        )
+        assert strict["reused_predictions"]
+        assert strict["thresholds"]["bias_threshold"] == 0.0
+        assert any("demographic parity" in w for w in strict["warnings"])
+        details = strict["cern_compliance_details"]
+        assert strict["cern_compliance"] == pytest.approx(details["fairness_score"])
+
+    def test_explainability_needs_a_stored_explanation(self, engine, model_path, data_path):
+        engine.run_audit(model_path, audit_type="bias", test_data_path=data_path)
+        full = engine.run_audit(model_path, audit_type="full", test_data_path=data_path)
+        assert not full.get("reused_predictions")
+        assert full["explainability"]["feature_importance"]
+
+    def test_prediction_settings_are_part_of_the_key(self, engine, model_path, data_path, settings, tmp_path):
+        engine.run_audit(model_path, audit_type="bias", test_data_path=data_path)
+        # only the counts are kept, not the predictions
+        entries = os.listdir(tmp_path / "store")
+        assert [os.listdir(tmp_path / "store" / e) for e in entries] == [["meta.json"]]
+
+        config = settings()
+        settings(FLOAT32_FEATURES=not config.FLOAT32_FEATURES)
+        again = engine.run_audit(model_path, audit_type="bias", test_data_path=data_path)
+        assert not again.get("reused_predictions")
+
+    def test_unknown_threshold(self, engine):
+        with pytest.raises(ValueError):
+            engine._thresholds({"bias_treshold": 0.2})
+
+
+class TestThresholdSweep:
+    """Metrics at many thresholds from one set of scores"""
+
+    def test_counts_match_thresholded_predictions(self):
+        from group_metrics import GroupConfusionCounts, threshold_counts
+
+        rng = np.random.RandomState(0)
+        groups = rng.randint(0, 3, 5000)
+        y_true = rng.randint(0, 2, 5000)
+        scores = np.round(rng.rand(5000), 2)
+        thresholds = np.linspace(0, 1, 11)
+
+        stack = threshold_counts(groups, 3, y_true, scores, thresholds)
+        for t, threshold in enumerate(thresholds):
+            expected = GroupConfusionCounts.from_arrays(groups, y_true, (scores > threshold).astype(int))
+            assert (stack[t] == expected.counts).all()
+
+    def test_sweep_at_half_matches_audit(self, engine, model_path, data_path):
+        sweep = engine.run_threshold_sweep(
+            model_path, sensitive_features=["gender"], test_data_path=data_path,
+            n_thresholds=11
+        )
+        audit = engine.run_audit(
+            model_path, audit_type="full", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        at_half = sweep["thresholds"].index(0.5)
+        for key, value in {**audit["bias_metrics"], **audit["fairness_metrics"]}.items():
+            assert sweep["curve"][key][at_half] == pytest.approx(value)
+
+    def test_fairness_optimal_threshold(self, engine, model_path, data_path):
+        sweep = engine.run_threshold_sweep(
+            model_path, sensitive_features=["gender"], test_data_path=data_path,
+            metric="equalized_odds", accuracy_tolerance=0.05
+        )
+        curve = sweep["curve"]
+        best = sweep["fairness_optimal"]
+        assert best["accuracy"] >= max(curve["accuracy"]) - 0.05
+        eligible = [
+            eo for eo, acc in zip(curve["equalized_odds"], curve["accuracy"])
+            if acc >= max(curve["accuracy"]) - 0.05
+        ]
+        assert best["equalized_odds"] == pytest.approx(min(eligible))
+        assert sweep["accuracy_optimal"]["accuracy"] == pytest.approx(max(curve["accuracy"]))
+        # frontier trades fairness for accuracy monotonically
+        frontier = sweep["frontier"]
+        assert [p["accuracy"] for p in frontier] == sorted(p["accuracy"] for p in frontier)
+        assert [p["equalized_odds"] for p in frontier] == sorted(p["equalized_odds"] for p in frontier)
+
+    def test_unknown_metric(self, engine, model_path):
+        with pytest.raises(ValueError):
+            engine.run_threshold_sweep(model_path, metric="accuracy")
+
+
+class TestConcurrentStages:
+    """Stages on the scheduler's threads give the same results as one thread"""
+
+    def test_same_results_any_thread_count(self, model_path, data_path, settings):
+        settings(PREDICTION_STORE_MAX_MB=0)
+        results = {}
+        for threads in (1, 4):
+            settings(STAGE_THREADS=threads)
+            results[threads] = AuditEngine().run_audit(
+                model_path, audit_type="full", sensitive_features=["gender", "race"],
+                test_data_path=data_path
+            )
+        for key in ["bias_metrics", "fairness_metrics", "group_metrics", "explainability", "cern_compliance"]:
+            assert results[1][key] == results[4][key]
+        assert set(results[4]["timings"]["stages"]) >= {"group_analysis", "explainability", "compliance"}
+
+
+class TestCompactDtypes:
+    """Test data is held in compact dtypes without changing results"""
+
+    def test_same_results_less_memory(self, model_path, data_path, settings):
+        settings(PREDICTION_STORE_MAX_MB=0, DATASET_CACHE_MAX_MB=0)
+        compact = AuditEngine().run_audit(
+            model_path, audit_type="bias", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        settings(COMPACT_DTYPES=False)
+        wide = AuditEngine().run_audit(
+            model_path, audit_type="bias", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        assert compact["bias_metrics"] == wide["bias_metrics"]
+        assert compact["memory"]["labels_mb"] * 8 == pytest.approx(wide["memory"]["labels_mb"], abs=1e-3)
+        assert compact["memory"]["features_mb"] < wide["memory"]["features_mb"]
+
+    def test_frame_and_label_helpers(self):
+        from compact import compact_frame, compact_labels, float32_safe
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.tree import DecisionTreeClassifier
+
+        df = pd.DataFrame({
+            "age": np.arange(100, dtype=np.int64),
+            "income": np.linspace(0, 1, 100),
+            "region": ["north", "south"] * 50,
+            "id": [f"row-{i}" for i in range(100)],
+        })
+        out = compact_frame(df, float32=True)
+        assert out["age"].dtype == np.int8
+        assert out["income"].dtype == np.float32
+        assert out["region"].dtype == "category"
+        # all distinct, a categorical wouldn't save anything
+        assert out["id"].dtype == object
+
+        assert compact_labels(np.array([0, 1, 1])).dtype == np.int8
+        assert compact_labels(np.array([0.0, 1.0])).dtype == np.int8
+        assert compact_labels(np.array(["yes", "no"])).dtype.kind == "U"
+
+        X, y = df[["age", "income"]], np.arange(100) % 2
+        assert float32_safe(DecisionTreeClassifier().fit(X, y), "sklearn")
+        assert not float32_safe(LogisticRegression().fit(X, y), "sklearn")
+        assert float32_safe(None, "onnx")
+
+
+class TestQuickAudit:
+    """Metrics from a stratified sample, within their reported error of the full audit"""
+
+    def big_test_set(self, data_path, tmp_path, n=60_000):
+        df = pd.read_csv(data_path).sample(n, replace=True, random_state=0)
+        path = str(tmp_path / "big.csv")
+        df.to_csv(path, index=False)
+        return path
+
+    def test_close_to_full_audit(self, model_path, data_path, settings, tmp_path):
+        settings(PREDICTION_STORE_MAX_MB=0, QUICK_SAMPLE_ROWS=5000)
+        path = self.big_test_set(data_path, tmp_path)
+        engine = AuditEngine()
+        quick = engine.run_audit(
+            model_path, audit_type="quick", sensitive_features=["gender"],
+            test_data_path=path, target_error=0
+        )
+        full = engine.run_audit(
+            model_path, audit_type="bias", sensitive_features=["gender"], test_data_path=path
+        )
+
+        sampling = quick["sampling"]
+        assert sampling["rows_total"] == 60_000
+        assert sampling["rows_sampled"] < 10_000
+        assert sampling["rounds"] == 1
+        for name, value in full["bias_metrics"].items():
+            # a 95% interval, so allow a little slack on top
+            assert abs(quick["bias_metrics"][name] - value) <= 1.5 * sampling["errors"][name] + 1e-6
+        assert quick["fairness_metrics"]
+        # exact group sizes, only the predictions are estimated
+        assert sum(g["size"] for g in quick["group_metrics"]["gender"]["groups"]) == 60_000
+
+    def test_grows_until_target(self, model_path, data_path, settings, tmp_path):
+        settings(QUICK_SAMPLE_ROWS=1000)
+        path = self.big_test_set(data_path, tmp_path)
+        result = AuditEngine().run_audit(
+            model_path, audit_type="quick", sensitive_features=["gender"],
+            test_data_path=path, target_error=0.01
+        )
+        sampling = result["sampling"]
+        assert sampling["rounds"] > 1
+        assert sampling["target_met"]
+        assert max(sampling["errors"].values()) <= 0.01
+        assert sampling["rows_sampled"] < 60_000
+
+    def test_small_test_set_is_exact(self, model_path, data_path, settings):
+        settings(PREDICTION_STORE_MAX_MB=0)
+        engine = AuditEngine()
+        quick = engine.run_audit(
+            model_path, audit_type="quick", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        full = engine.run_audit(
+            model_path, audit_type="fairness", sensitive_features=["gender"],
+            test_data_path=data_path
+        )
+        # every row fits in the first sample: nothing left to estimate
+        assert quick["sampling"]["sample_fraction"] == 1.0
+        assert set(quick["sampling"]["errors"].values()) == {0.0}
+        assert quick["fairness_metrics"] == pytest.approx(full["fairness_metrics"])
+
+    def test_stratified_sample(self):
+        from sampling import StratifiedSample
+
+        strata = np.repeat([0, 1, 2, -1], [9000, 900, 50, 10])
+        sample = StratifiedSample(strata, 3, min_rows=100)
+        first = sample.grow(1000)
+        # proportional, but at least 100 rows (or all) of every stratum
+        assert list(sample.taken) == [905, 100, 50]
+        second = sample.grow(2000)
+        assert len(np.intersect1d(first, second)) == 0
+        assert list(sample.taken) == [1810, 181, 50]
+        assert (strata[np.concatenate([first, second])] >= 0).all()
+        assert np.array_equal(np.bincount(strata[np.concatenate([first, second])]), sample.taken)
+
+
+class TestAuditEvents:
+    """Stage, rows and partial metrics events while an audit runs"""
+
+    def test_events_of_a_streamed_audit(self, model_path, data_path, settings):
+        settings(PREDICTION_STORE_MAX_MB=0, STREAM_CHUNK_ROWS=250)
+        events = []
+        results = AuditEngine().run_audit(
+            model_path, audit_type="full", sensitive_features=["gender"], test_data_path=data_path,
+            streaming=True, event_callback=events.append
+        )
+
+        started = [e["stage"] for e in events if e["type"] == "stage_started"]
+        finished = [e["stage"] for e in events if e["type"] == "stage_finished"]
+        assert sorted(started) == sorted(finished)
+        assert set(started) >= {"predicting", "bias_metrics", "explainability", "compliance"}
+        assert not any(e["failed"] for e in events if e["type"] == "stage_finished")
+
+        rows = [e for e in events if e["type"] == "rows"]
+        assert len(rows) == 4
+        assert rows[-1]["rows"] == 1000
+
+        metrics = {e["stage"]: e for e in events if e["type"] == "metrics"}
+        assert metrics["bias_metrics"]["bias_metrics"] == results["bias_metrics"]
+        assert metrics["fairness_metrics"]["fairness_score"] == results["fairness_score"]
+        # compliance needs every other stage, so its numbers come last
+        assert events.index(metrics["compliance"]) > events.index(metrics["bias_metrics"])
@@ -0,0 +1,34 @@
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_audit import compare, run_case
+
+
+def make_report(total, predicting):
+    return {"results": [{
+        "model": "tree", "rows": 1000, "wall_s": total,
+        "stages": {"predicting": {"wall_s": predicting, "cpu_s": predicting}},
+    }]}
+
+
+class TestBenchmarks:
+    """The harness itself, not the numbers"""
+
+    def test_run_case(self, model_path, data_path):
+        case = run_case(
+            model_path, data_path, n_rows=1000, repeats=2, audit_type="bias"
+        )
+        assert case["rows_per_s"] > 0
+        assert "predicting" in case["stages"]
+
+    def test_compare_flags_slowdowns(self):
+        baseline = make_report(1.0, 0.5)
+        assert compare(baseline, make_report(1.05, 0.5), tolerance=0.1) == []
+
+        regressions = compare(baseline, make_report(1.0, 0.8), tolerance=0.1)
+        assert len(regressions) == 1
+        assert regressions[0].startswith("tree/1000 predicting")
@@ -0,0 +1,138 @@
+import pytest
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset_cache
+from dataset_cache import DatasetCache, evict_snapshots
+
+
+def write_csv(path, n=200, seed=0):
+    rng = np.random.RandomState(seed)
+    pd.DataFrame({
+        "income": rng.rand(n),
+        "age": rng.randint(18, 70, n),
+        "gender": rng.choice(["f", "m", None], n),
+        "label": rng.randint(0, 2, n),
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+class TestDatasetCache:
+    """Tests for the parsed dataset snapshots"""
+
+    def setup_method(self):
+        self.reads = []
+
+    def reader(self, path):
+        self.reads.append(path)
+        return pd.read_csv(path)
+
+    def test_second_load_is_memory_mapped(self, tmp_path):
+        cache = DatasetCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+        path = write_csv(tmp_path / "data.csv")
+
+        first = cache.load(path, self.reader)
+        second = cache.load(path, self.reader)
+
+        assert len(self.reads) == 1
+        assert cache.stats()["hits"] == 1
+        # same values, stored compact: small ints downcast, strings as categoricals
+        pd.testing.assert_frame_equal(first, second.astype(first.dtypes.to_dict()))
+        assert second["age"].dtype == np.int8
+        assert second["gender"].dtype == "category"
+        # read-only mapping of the snapshot, not a parsed copy
+        assert not second["income"].values.flags.writeable
+
+    def test_only_requested_columns_are_mapped(self, tmp_path):
+        cache = DatasetCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+        path = write_csv(tmp_path / "data.csv")
+
+        first = cache.load(path, self.reader, columns=["age"])
+        second = cache.load(path, self.reader, columns=["age", "missing"])
+        # label (last column) always comes along
+        assert list(first.columns) == list(second.columns) == ["age", "label"]
+
+    def test_copies_share_a_snapshot(self, tmp_path):
+        cache = DatasetCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+        a = write_csv(tmp_path / "a.csv")
+        b = str(tmp_path / "b.csv")
+        with open(a) as src, open(b, "w") as dst:
+            dst.write(src.read())
+
+        cache.load(a, self.reader)
+        cache.load(b, self.reader)
+        assert len(self.reads) == 1
+
+    def test_edited_file_is_reparsed(self, tmp_path):
+        cache = DatasetCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+        path = write_csv(tmp_path / "data.csv")
+        cache.load(path, self.reader)
+
+        write_csv(path, seed=1)
+        os.utime(path, ns=(0, 0))  # new mtime even on coarse clocks
+        df = cache.load(path, self.reader)
+
+        assert len(self.reads) == 2
+        pd.testing.assert_frame_equal(df, pd.read_csv(path))
+
+    def test_old_snapshots_are_evicted(self, tmp_path):
+        cache_dir = tmp_path / "cache"
+        cache = DatasetCache(str(cache_dir), max_bytes=1)
+        cache.load(write_csv(tmp_path / "a.csv"), self.reader)
+        assert [p for p in os.listdir(cache_dir) if not p.startswith(".")] == []
+
+    def test_disabled(self, tmp_path):
+        cache = DatasetCache(str(tmp_path / "cache"), max_bytes=0)
+        path = write_csv(tmp_path / "data.csv")
+        cache.load(path, self.reader)
+        cache.load(path, self.reader)
+        assert len(self.reads) == 2
+        assert not os.path.exists(tmp_path / "cache")
+
+    def test_snapshot_evicted_while_reading(self, tmp_path, monkeypatch):
+        cache = DatasetCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+        path = write_csv(tmp_path / "data.csv")
+        cache.load(path, self.reader)
+        snapshot = os.path.join(cache.cache_dir, os.listdir(cache.cache_dir)[0])
+
+        json_load = dataset_cache.json.load
+
+        def evicted_after_meta(f):
+            meta = json_load(f)
+            # another worker's eviction gets in between
+            os.remove(os.path.join(snapshot, "0.npy"))
+            return meta
+
+        monkeypatch.setattr(dataset_cache.json, "load", evicted_after_meta)
+        df = cache.load(path, self.reader)
+        assert len(self.reads) == 2
+        pd.testing.assert_frame_equal(df, pd.read_csv(path))
+
+    def test_eviction_skips_vanishing_snapshots(self, tmp_path, monkeypatch):
+        cache = DatasetCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+        cache.load(write_csv(tmp_path / "data.csv"), self.reader)
+
+        def removed(path):
+            raise FileNotFoundError(path)
+
+        monkeypatch.setattr(dataset_cache.os, "scandir", removed)
+        evict_snapshots(cache.cache_dir, max_bytes=1)
+
+    def test_streaming_reads_snapshot_chunks(self, tmp_path, monkeypatch, settings):
+        from audit_engine import AuditEngine
+
+        settings(DATASET_CACHE_DIR=str(tmp_path / "cache"))
+        engine = AuditEngine()
+        path = write_csv(tmp_path / "data.csv", n=250)
+        engine.dataset_cache.load(path, pd.read_csv)
+
+        monkeypatch.setattr(pd, "read_csv", lambda *a, **k: pytest.fail("CSV parsed again"))
+        chunks = list(engine._iter_test_data(path, ["gender"], chunk_rows=100))
+        assert [len(y) for _, y, _, _ in chunks] == [100, 100, 50]
+        assert chunks[-1][3] == 1.0
+        assert engine.dataset_cache.stats()["hits"] == 1
@@ -0,0 +1,43 @@
+import pytest
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deep_inference import iter_batches, _collect
+
+
+class TestBatching:
+    """Batch slicing shared by the torch and tensorflow wrappers"""
+
+    def test_batches_cover_every_row(self):
+        X = pd.DataFrame(np.arange(30, dtype=np.float64).reshape(10, 3))
+        batches = list(iter_batches(X, 4))
+
+        assert [(start, stop) for start, stop, _ in batches] == [(0, 4), (4, 8), (8, 10)]
+        assert all(rows.dtype == np.float32 and rows.flags.c_contiguous for _, _, rows in batches)
+        out = _collect(((s, e, rows.sum(axis=1)) for s, e, rows in batches), len(X))
+        np.testing.assert_allclose(out, X.values.sum(axis=1))
+
+    def test_float32_arrays_are_not_copied(self):
+        X = np.ones((10, 3), dtype=np.float32)
+        _, _, rows = next(iter_batches(X, 0))
+        assert np.shares_memory(rows, X)
+
+
+class TestTorchModel:
+
+    def test_batched_matches_single_pass(self):
+        torch = pytest.importorskip("torch")
+        from deep_inference import TorchModel
+
+        module = torch.nn.Sequential(torch.nn.Linear(4, 1), torch.nn.Sigmoid())
+        X = np.random.RandomState(0).randn(100, 4)
+        with torch.no_grad():
+            expected = module(torch.FloatTensor(X)).numpy()
+
+        out = TorchModel(module, batch_rows=16).run(pd.DataFrame(X))
+        np.testing.assert_allclose(out, expected, atol=1e-6)
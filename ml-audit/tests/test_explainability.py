@@ -0,0 +1,126 @@
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+
+from audit_engine import AuditEngine
+from explainability import build_explainer, summarize_background
+
+
+def make_data(n=300, n_features=6):
+    rng = np.random.RandomState(0)
+    X = pd.DataFrame(rng.randn(n, n_features), columns=[f"f{i}" for i in range(n_features)])
+    y = (X["f0"] + 0.5 * X["f1"] > 0).astype(int)
+    return X, y
+
+
+class TestExplainability:
+    """Explainer selection, budget and caching"""
+
+    def setup_method(self):
+        self.engine = AuditEngine()
+        self.X, self.y = make_data()
+
+    def test_picks_explainer_by_model_type(self):
+        tree = RandomForestClassifier(n_estimators=5, random_state=0).fit(self.X, self.y)
+        linear = LogisticRegression().fit(self.X, self.y)
+        knn = KNeighborsClassifier().fit(self.X, self.y)
+
+        assert build_explainer(tree, self.X)[1] == "tree"
+        assert build_explainer(linear, self.X)[1] == "linear"
+        assert build_explainer(knn, self.X)[1] == "permutation"
+
+    def test_background_is_summarized(self):
+        background = summarize_background(self.X, 10)
+        assert background.shape == (10, self.X.shape[1])
+        # small data is left alone
+        assert summarize_background(self.X.iloc[:5], 10).shape == (5, self.X.shape[1])
+
+    def test_linear_model_is_fast(self):
+        model = LogisticRegression().fit(self.X, self.y)
+
+        start = time.time()
+        result = self.engine._compute_explainability(model, self.X, "sklearn", model_key="lr")
+        assert time.time() - start < 1.0
+
+        assert result["explainer"] == "linear"
+        assert result["top_features"][0] == "f0"
+
+    def test_explainer_is_reused(self, monkeypatch):
+        model = LogisticRegression().fit(self.X, self.y)
+        self.engine._compute_explainability(model, self.X, "sklearn", model_key="lr")
+        cached = self.engine.explainer_cache.get(("lr", tuple(self.X.columns)))
+        assert cached is not None
+
+        monkeypatch.setattr("audit_engine.build_explainer", lambda *a, **k: pytest.fail("rebuilt"))
+        result = self.engine._compute_explainability(model, self.X, "sklearn", model_key="lr")
+        assert result["explainer"] == "linear"
+        assert len(result["feature_importance"]) == self.X.shape[1]
+
+
+def save_onnx_logistic(path, coef, intercept):
+    """Tiny sigmoid(X @ w + b) model, so we don't need skl2onnx"""
+    import onnx
+    from onnx import helper, TensorProto, numpy_helper
+
+    d = len(coef)
+    graph = helper.make_graph(
+        [
+            helper.make_node("MatMul", ["X", "W"], ["xw"]),
+            helper.make_node("Add", ["xw", "B"], ["logit"]),
+            helper.make_node("Sigmoid", ["logit"], ["prob"]),
+        ],
+        "logistic",
+        [helper.make_tensor_value_info("X", TensorProto.FLOAT, [None, d])],
+        [helper.make_tensor_value_info("prob", TensorProto.FLOAT, [None, 1])],
+        initializer=[
+            numpy_helper.from_array(np.asarray(coef, dtype=np.float32).reshape(d, 1), "W"),
+            numpy_helper.from_array(np.asarray([intercept], dtype=np.float32), "B"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+    return str(path)
+
+
+class TestPermutationImportance:
+    """Batched permutation importance for non-sklearn models"""
+
+    def setup_method(self):
+        self.engine = AuditEngine()
+        self.X, self.y = make_data()
+
+    def test_stacked_matches_per_feature(self):
+        from explainability import permutation_importance
+
+        w = np.array([2.0, 1.0, 0, 0, 0, 0])
+        score = lambda X: 1 / (1 + np.exp(-(X @ w)))
+        X = self.X.values.astype(np.float32)
+
+        stacked, _ = permutation_importance(score, X, self.y.values, n_repeats=3)
+        looped, _ = permutation_importance(score, X, self.y.values, n_repeats=3, max_stack_bytes=0)
+        np.testing.assert_allclose(stacked, looped)
+        assert stacked[0] > stacked[1] > 0
+        assert stacked[2:].max() == 0
+
+    def test_onnx_model_gets_feature_importance(self, tmp_path):
+        path = save_onnx_logistic(tmp_path / "model.onnx", [3.0, 1.5, 0, 0, 0, 0], 0.0)
+        model, framework = self.engine._load_model(path)
+        assert framework == "onnx"
+
+        result = self.engine._compute_explainability(model, self.X, framework, y=self.y)
+        assert result["explainer"] == "permutation_importance"
+        assert result["top_features"][:2] == ["f0", "f1"]
+
+        # having importances lifts transparency in the compliance score
+        compliance = self.engine._compute_cern_compliance({"explainability": result})
+        assert compliance["transparency_score"] == 0.8
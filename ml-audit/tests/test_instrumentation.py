@@ -0,0 +1,69 @@
+import pytest
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instrumentation import Histogram, StageTimings, process_memory, profile_call
+
+
+class TestInstrumentation:
+    """Stage timings and the Prometheus histogram"""
+
+    def test_stage_timings_accumulate(self):
+        timings = StageTimings()
+        with timings.stage("predicting"):
+            time.sleep(0.01)
+        with timings.stage("predicting"):
+            time.sleep(0.01)
+
+        stages = timings.to_dict()["stages"]
+        assert stages["predicting"]["wall_s"] >= 0.02
+        assert "peak_rss_mb" not in stages["predicting"]
+
+    @pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="linux only")
+    def test_stage_memory_is_per_stage(self):
+        import numpy as np
+
+        timings = StageTimings()
+        with timings.stage("big"):
+            block = np.ones(64 * 1024 * 1024 // 8)
+        del block
+        with timings.stage("small"):
+            pass
+        stages = timings.to_dict()["stages"]
+        assert stages["big"]["rss_delta_mb"] > 32
+        # not the earlier stage's high-water mark
+        assert abs(stages["small"]["rss_delta_mb"]) < 16
+
+    def test_stage_recorded_on_error(self):
+        timings = StageTimings()
+        with pytest.raises(ValueError):
+            with timings.stage("explainability"):
+                raise ValueError("boom")
+        assert "explainability" in timings.stages
+
+    def test_histogram_render(self):
+        histogram = Histogram("audit_stage_wall_seconds", "help", "stage", [0.1, 1])
+        histogram.observe("predicting", 0.05)
+        histogram.observe("predicting", 0.5)
+        histogram.observe("predicting", 5)
+        lines = histogram.render()
+
+        assert 'audit_stage_wall_seconds_bucket{stage="predicting",le="0.1"} 1' in lines
+        assert 'audit_stage_wall_seconds_bucket{stage="predicting",le="1"} 2' in lines
+        assert 'audit_stage_wall_seconds_bucket{stage="predicting",le="+Inf"} 3' in lines
+        assert 'audit_stage_wall_seconds_sum{stage="predicting"} 5.55' in lines
+
+    def test_profile_call(self):
+        result, summary = profile_call(sorted, [3, 1, 2])
+        assert result == [1, 2, 3]
+        assert "function calls" in summary
+
+    def test_process_memory(self):
+        memory = process_memory()
+        if not memory:
+            pytest.skip("no /proc smaps_rollup here")
+        assert memory["rss"] >= memory["pss"] > 0
+        assert memory["shared"] <= memory["rss"]
@@ -0,0 +1,75 @@
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_cache import ModelCache
+from fingerprint import file_fingerprint
+
+
+def write_file(path, size):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return str(path)
+
+
+class TestModelCache:
+    """Tests for the LRU model cache"""
+
+    def setup_method(self):
+        self.loads = []
+
+    def loader(self, path):
+        self.loads.append(path)
+        return object(), "sklearn"
+
+    def test_hit_after_first_load(self, tmp_path):
+        cache = ModelCache(max_bytes=1000)
+        path = write_file(tmp_path / "a.pkl", 10)
+
+        first = cache.get_or_load(path, self.loader)
+        second = cache.get_or_load(path, self.loader)
+
+        assert first[0] is second[0]
+        assert len(self.loads) == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self, tmp_path):
+        cache = ModelCache(max_bytes=250)
+        a = write_file(tmp_path / "a.pkl", 100)
+        b = write_file(tmp_path / "b.pkl", 100)
+        c = write_file(tmp_path / "c.pkl", 100)
+
+        cache.get_or_load(a, self.loader)
+        cache.get_or_load(b, self.loader)
+        cache.get_or_load(a, self.loader)  # a is now most recent
+        cache.get_or_load(c, self.loader)  # evicts b
+
+        assert cache.stats()["evictions"] == 1
+        cache.get_or_load(a, self.loader)
+        assert self.loads.count(a) == 1
+        cache.get_or_load(b, self.loader)
+        assert self.loads.count(b) == 2
+
+    def test_modified_file_is_reloaded(self, tmp_path):
+        cache = ModelCache(max_bytes=1000)
+        path = write_file(tmp_path / "a.pkl", 10)
+        cache.get_or_load(path, self.loader)
+
+        write_file(tmp_path / "a.pkl", 20)
+        cache.get_or_load(path, self.loader)
+        assert len(self.loads) == 2
+
+    def test_too_big_is_not_cached(self, tmp_path):
+        cache = ModelCache(max_bytes=10)
+        path = write_file(tmp_path / "big.pkl", 100)
+        cache.get_or_load(path, self.loader)
+        assert cache.stats()["entries"] == 0
+
+    def test_content_fingerprint_ignores_path(self, tmp_path):
+        a = write_file(tmp_path / "a.pkl", 50)
+        b = write_file(tmp_path / "b.pkl", 50)
+        assert file_fingerprint(a, content_hash=True) == file_fingerprint(b, content_hash=True)
+        assert file_fingerprint(a) != file_fingerprint(b)
@@ -0,0 +1,185 @@
+import pytest
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from group_metrics import GroupConfusionCounts
+from monitor import MonitorRegistry, PredictionMonitor
+
+
+def make_log(n, seed=0, bias=0.1):
+    rng = np.random.RandomState(seed)
+    gender = rng.randint(0, 2, n)
+    return pd.DataFrame({
+        "gender": gender,
+        "region": rng.choice(["north", "south"], n),
+        "label": rng.randint(0, 2, n),
+        "prediction": (rng.rand(n) < 0.4 + bias * gender).astype(int),
+    })
+
+
+def expected_metrics(frame, attr):
+    counts = GroupConfusionCounts.from_arrays(frame[attr].values, frame["label"], frame["prediction"])
+    return {**counts.bias_metrics(), **counts.fairness_metrics()}
+
+
+class TestPredictionMonitor:
+    """Sliding window metrics over pushed and followed prediction logs"""
+
+    def test_window_matches_recomputing_from_scratch(self):
+        log = make_log(5000)
+        monitor = PredictionMonitor("m", ["gender"], window_rows=1000, panes=4)
+        for start in range(0, len(log), 250):
+            monitor.push(log.iloc[start:start + 250])
+
+        summary = monitor.summary()
+        # panes of 250 rows: the window is exactly the last 1000 rows
+        assert summary["rows_in_window"] == 1000
+        assert summary["rows_seen"] == 5000
+        window = log.iloc[-1000:]
+        for key, value in expected_metrics(window, "gender").items():
+            section = "bias_metrics" if key in summary["bias_metrics"] else "fairness_metrics"
+            assert summary[section][key] == pytest.approx(value)
+
+    def test_memory_stays_bounded(self):
+        monitor = PredictionMonitor("m", ["gender", "region"], window_rows=1000, panes=10)
+        for seed in range(200):
+            monitor.push(make_log(100, seed=seed))
+        assert len(monitor._panes) <= 10
+        assert monitor.rows_in_window <= 1100
+
+    def test_drift_against_first_window(self):
+        monitor = PredictionMonitor("m", ["gender"], window_rows=2000, panes=4, drift_threshold=0.05)
+        monitor.push(make_log(2000, seed=1, bias=0.0))
+        assert monitor.baseline is not None
+        monitor.push(make_log(2000, seed=2, bias=0.3))
+
+        summary = monitor.summary()
+        assert summary["drift"]["demographic_parity"] > 0.2
+        assert any("drifted" in alert for alert in summary["alerts"])
+
+    def test_scores_and_missing_labels(self):
+        log = make_log(500)
+        log["prediction"] = np.where(log["prediction"] == 1, 0.9, 0.2)
+        log.loc[:99, "label"] = None
+        monitor = PredictionMonitor("m", ["gender"], window_rows=10_000, fit_rows=100)
+        assert monitor.push(log) == 400
+        assert monitor.rows_in_window == 400
+
+    def test_buckets_fit_on_enough_rows(self):
+        rng = np.random.RandomState(0)
+        log = make_log(2000)
+        log["age"] = rng.randint(18, 80, len(log))
+        monitor = PredictionMonitor("m", ["age"], window_rows=10_000, fit_rows=500)
+        # a first push of a few rows has few distinct ages, it mustn't decide
+        monitor.push(log.iloc[:5])
+        assert monitor.rows_in_window == 0
+        assert monitor.summary()["rows_pending"] == 5
+        monitor.push(log.iloc[5:])
+
+        summary = monitor.summary()
+        assert summary["rows_pending"] == 0
+        assert summary["rows_in_window"] == summary["rows_seen"] == 2000
+        # age is bucketed, every held back row counted
+        assert len(summary["group_analysis"]["age"]["groups"]) == 4
+
+    def test_missing_columns(self):
+        monitor = PredictionMonitor("m", ["gender"])
+        with pytest.raises(ValueError):
+            monitor.push(make_log(10).drop(columns="prediction"))
+
+    def test_follows_growing_jsonl(self, tmp_path):
+        path = tmp_path / "predictions.jsonl"
+        first, second = make_log(300, seed=1), make_log(200, seed=2)
+        path.write_text(first.to_json(orient="records", lines=True))
+
+        monitor = PredictionMonitor(
+            "m", ["gender"], window_rows=10_000, source_path=str(path), fit_rows=100
+        )
+        assert monitor.poll() == 300
+        assert monitor.poll() == 0
+
+        # a half written line is left for the next poll
+        text = second.to_json(orient="records", lines=True)
+        with open(path, "a") as f:
+            f.write(text[:-20])
+        assert monitor.poll() == 199
+        with open(path, "a") as f:
+            f.write(text[-20:])
+        assert monitor.poll() == 1
+
+        assert monitor.rows_in_window == 500
+        both = pd.concat([first, second])
+        assert monitor.summary()["bias_metrics"]["demographic_parity"] == pytest.approx(
+            expected_metrics(both, "gender")["demographic_parity"]
+        )
+
+    def test_bad_lines_are_skipped(self, tmp_path):
+        path = tmp_path / "predictions.jsonl"
+        log = make_log(300, seed=1)
+        lines = log.to_json(orient="records", lines=True).splitlines()
+        lines.insert(10, '{"gender": 1, "label": ')
+        lines.insert(20, '{"gender": 0, "label": 1}')
+        path.write_text("\n".join(lines) + "\n")
+
+        monitor = PredictionMonitor(
+            "m", ["gender"], window_rows=10_000, source_path=str(path), fit_rows=100
+        )
+        assert monitor.poll() == 300
+        assert monitor.offset == os.path.getsize(path)
+        # the next rows still come through
+        with open(path, "a") as f:
+            f.write(make_log(50, seed=2).to_json(orient="records", lines=True))
+        assert monitor.poll() == 50
+        summary = monitor.summary()
+        assert summary["bad_rows"] == 2
+        assert summary["rows_in_window"] == 350
+
+    def test_existing_log_is_read_in_the_background(self, tmp_path):
+        path = tmp_path / "predictions.jsonl"
+        path.write_text(make_log(300, seed=1).to_json(orient="records", lines=True))
+        monitor = PredictionMonitor(
+            "m", ["gender"], window_rows=10_000, source_path=str(path), fit_rows=100
+        )
+        reading = threading.Event()
+        release = threading.Event()
+        push = monitor.push
+
+        def slow_push(frame):
+            reading.set()
+            release.wait(5)
+            return push(frame)
+
+        monitor.push = slow_push
+        MonitorRegistry(poll_seconds=0).catch_up(monitor)
+        assert reading.wait(5)
+        # nobody waits on the read, polls in the meantime just skip
+        assert monitor.summary()["catching_up"]
+        assert monitor.poll(wait=False) == 0
+
+        release.set()
+        deadline = time.time() + 5
+        while monitor.catching_up and time.time() < deadline:
+            time.sleep(0.01)
+        summary = monitor.summary()
+        assert not summary["catching_up"]
+        assert summary["rows_in_window"] == 300
+
+    def test_follows_parquet_row_groups(self, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        import pyarrow as pa
+
+        path = tmp_path / "predictions.parquet"
+        log = make_log(600)
+        pq.write_table(pa.Table.from_pandas(log), path, row_group_size=200)
+
+        monitor = PredictionMonitor("m", ["gender"], window_rows=10_000, source_path=str(path))
+        assert monitor.poll() == 600
+        assert monitor.offset == 3
+        assert monitor.poll() == 0
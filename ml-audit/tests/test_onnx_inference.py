@@ -0,0 +1,59 @@
+import pytest
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from onnx_inference import OnnxModel, load_session
+from tests.test_explainability import save_onnx_logistic
+
+
+class TestOnnxInference:
+    """Session options and batched, IO bound inference"""
+
+    def setup_method(self):
+        rng = np.random.RandomState(0)
+        self.X = rng.randn(1000, 4)
+        self.coef = [1.0, -2.0, 0.5, 0.0]
+
+    def expected(self):
+        return 1 / (1 + np.exp(-(self.X @ np.array(self.coef))))
+
+    @pytest.mark.parametrize("batch_rows,io_binding", [(0, True), (128, True), (300, False)])
+    def test_batches_match_full_run(self, tmp_path, batch_rows, io_binding):
+        path = save_onnx_logistic(tmp_path / "model.onnx", self.coef, 0.0)
+        model = OnnxModel(load_session(path), batch_rows=batch_rows, io_binding=io_binding)
+
+        out = model.run(self.X)
+        assert out.shape == (1000, 1)
+        np.testing.assert_allclose(out[:, 0], self.expected(), atol=1e-6)
+
+    def test_threads_get_their_own_buffers(self, tmp_path):
+        path = save_onnx_logistic(tmp_path / "model.onnx", self.coef, 0.0)
+        model = OnnxModel(load_session(path, intra_op_threads=1), batch_rows=64)
+
+        inputs = [self.X * scale for scale in (1, -1, 2, 0.5)]
+        with ThreadPoolExecutor(4) as pool:
+            outputs = list(pool.map(model.run, inputs))
+        for X, out in zip(inputs, outputs):
+            np.testing.assert_allclose(out[:, 0], 1 / (1 + np.exp(-(X @ np.array(self.coef)))), atol=1e-6)
+
+    def test_optimized_model_is_saved_and_reused(self, tmp_path):
+        path = save_onnx_logistic(tmp_path / "model.onnx", self.coef, 0.0)
+        optimized_dir = tmp_path / "optimized"
+
+        load_session(path, optimized_dir=str(optimized_dir))
+        saved = os.listdir(optimized_dir)
+        assert len(saved) == 1 and saved[0].endswith("-all.onnx")
+
+        session = load_session(path, optimized_dir=str(optimized_dir))
+        model = OnnxModel(session)
+        np.testing.assert_allclose(model.run(self.X)[:, 0], self.expected(), atol=1e-6)
+
+    def test_unknown_optimization_level(self, tmp_path):
+        path = save_onnx_logistic(tmp_path / "model.onnx", self.coef, 0.0)
+        with pytest.raises(ValueError):
+            load_session(path, optimization="max")
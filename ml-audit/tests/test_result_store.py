@@ -0,0 +1,185 @@
+import pytest
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import AuditJob, AuditJobQueue
+from result_store import ResultStore, request_fingerprint
+
+
+class TestResultStore:
+    """Tests for the fingerprinted result store"""
+
+    def test_fingerprint_follows_file_contents(self, tmp_path):
+        model = tmp_path / "model.pkl"
+        model.write_bytes(b"weights v1")
+        copy = tmp_path / "copy.pkl"
+        shutil.copy(model, copy)
+
+        params = {"model_path": str(model), "audit_type": "bias"}
+        key = request_fingerprint("run_audit", params)
+        assert request_fingerprint("run_audit", {**params, "model_path": str(copy)}) == key
+        assert request_fingerprint("run_audit", {**params, "audit_type": "full"}) != key
+        assert request_fingerprint("run_audit", params, {"BIAS_THRESHOLD": 0.2}) != key
+
+        time.sleep(0.01)
+        model.write_bytes(b"weights v2")
+        assert request_fingerprint("run_audit", params) != key
+
+    def test_roundtrip_and_ttl(self, tmp_path):
+        store = ResultStore(str(tmp_path / "results.db"), ttl_seconds=3600, max_bytes=1 << 20)
+        assert store.get("abc") is None
+        store.put("abc", "run_audit", {"bias_score": 0.5, "warnings": []})
+        assert store.get("abc") == {"bias_score": 0.5, "warnings": []}
+
+        store.ttl_seconds = 1e-6
+        time.sleep(0.01)
+        assert store.get("abc") is None
+        assert store.stats()["entries"] == 0
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        store = ResultStore(str(tmp_path / "results.db"), ttl_seconds=0, max_bytes=2000)
+        # random-ish payloads so compression doesn't shrink them away
+        payload = lambda i: {"values": [((i + 1) * 7919 * j) % 10007 for j in range(300)]}
+        store.put("a", "run_audit", payload(0))
+        store.put("b", "run_audit", payload(1))
+        store.get("a")
+        store.put("c", "run_audit", payload(2))
+
+        assert store.get("b") is None
+        assert store.get("a") is not None
+        assert store.get("c") is not None
+
+
+class TestDeduplication:
+    """Identical requests share one computation"""
+
+    def make_queue(self, tmp_path):
+        store = ResultStore(str(tmp_path / "results.db"), ttl_seconds=3600, max_bytes=1 << 20)
+        queue = AuditJobQueue(max_workers=1, max_queued=0, result_store=store)
+        queue.start()
+        return queue
+
+    def running(self, queue, job_id, params):
+        # stands in for a job that's busy on a worker
+        leader = AuditJob(job_id, params)
+        leader.fingerprint = queue._fingerprint("run_audit", params)
+        leader.future = Future()
+        leader.run, leader.run_id = leader.future, f"run-{job_id}"
+        leader.future.add_done_callback(lambda f: queue._forget_run(leader.run_id))
+        leader.future.add_done_callback(lambda f: queue._on_done(leader, f))
+        queue._jobs[job_id] = leader
+        queue._runs[leader.run_id] = leader
+        queue._in_flight[leader.fingerprint] = leader
+        return leader
+
+    def test_duplicate_joins_running_job(self, tmp_path):
+        queue = self.make_queue(tmp_path)
+        try:
+            params = {"model_path": "m.pkl", "audit_type": "bias"}
+            leader = self.running(queue, "first", params)
+            # the queue is full, but joining doesn't need a worker
+            follower = queue.submit("second", **params)
+            assert follower.deduplicated == "in_flight"
+            assert follower.to_dict()["status"] == "pending"
+
+            result = {"bias_score": 0.1, "warnings": []}
+            leader.future.set_result(result)
+            assert follower.future.result(timeout=5) == result
+            assert follower.to_dict()["status"] == "completed"
+
+            # and later duplicates come from the store
+            stored = queue.submit("third", **params)
+            assert stored.deduplicated == "result_store"
+            assert stored.future.result(timeout=5) == result
+        finally:
+            queue.shutdown()
+
+    def test_partial_results_are_not_stored(self, tmp_path):
+        queue = self.make_queue(tmp_path)
+        try:
+            params = {"model_path": "m.pkl", "audit_type": "full"}
+            leader = self.running(queue, "first", params)
+            leader.future.set_result({"warnings": ["Partial audit - error: boom"]})
+            assert queue.result_store.get(leader.fingerprint) is None
+        finally:
+            queue.shutdown()
+
+    def test_cancelling_duplicate_leaves_leader_running(self, tmp_path):
+        queue = self.make_queue(tmp_path)
+        try:
+            params = {"model_path": "m.pkl", "audit_type": "fairness"}
+            leader = self.running(queue, "first", params)
+            follower = queue.submit("second", **params)
+            queue.cancel("second")
+            assert follower.status == "cancelled"
+            assert not leader.future.done()
+            leader.future.set_result({"warnings": []})
+            assert leader.status == "completed"
+        finally:
+            queue.shutdown()
+
+    def test_cancelling_joined_job_hands_over_computation(self, tmp_path):
+        queue = self.make_queue(tmp_path)
+        try:
+            params = {"model_path": "m.pkl", "audit_type": "fairness"}
+            leader = self.running(queue, "first", params)
+            heir = queue.submit("second", **params)
+            other = queue.submit("third", **params)
+            queue.cancel("first")
+            assert leader.status == "cancelled"
+            # the computation goes on for the others, nobody told the worker to stop
+            assert not leader.future.done()
+            assert "run-first" not in queue._cancelled
+            assert heir.leader is None and other.leader is heir
+            assert queue._in_flight[leader.fingerprint] is heir
+
+            # worker events still reach them, keyed by the id the run started under
+            queue._events.put(("run-first", {"type": "progress", "stage": "bias", "progress": 0.5}))
+            deadline = time.time() + 5
+            while heir.progress < 0.5 and time.time() < deadline:
+                time.sleep(0.01)
+            assert heir.to_dict()["stage"] == "bias"
+
+            result = {"bias_score": 0.1, "warnings": []}
+            leader.future.set_result(result)
+            assert leader.status == "cancelled"
+            assert heir.future.result(timeout=5) == result
+            assert other.future.result(timeout=5) == result
+            assert heir.status == other.status == "completed"
+            assert queue.result_store.get(leader.fingerprint) == result
+        finally:
+            queue.shutdown()
+
+    def test_cancelled_job_can_be_resubmitted_while_its_run_goes_on(self, tmp_path):
+        store = ResultStore(str(tmp_path / "results.db"), ttl_seconds=3600, max_bytes=1 << 20)
+        queue = AuditJobQueue(max_workers=1, max_queued=1, result_store=store)
+        queue.start()
+        try:
+            params = {"model_path": "m.pkl", "audit_type": "fairness"}
+            leader = self.running(queue, "first", params)
+            heir = queue.submit("second", **params)
+            queue.cancel("first")
+
+            # same audit id, other request: a run of its own next to the handed over one
+            again = queue.submit("first", model_path="missing.pkl", audit_type="bias")
+            assert again.run_id not in (None, heir.run_id)
+            assert queue._runs[heir.run_id] is heir
+            assert queue._runs[again.run_id] is again
+            again.future.exception(timeout=60)  # no such model
+            deadline = time.time() + 5
+            while not again.finished and time.time() < deadline:
+                time.sleep(0.01)
+            assert again.status == "failed"
+
+            # the handed over run is untouched by it
+            assert queue._runs[heir.run_id] is heir
+            leader.future.set_result({"warnings": []})
+            assert heir.future.result(timeout=5) == {"warnings": []}
+            assert heir.status == "completed" and leader.status == "cancelled"
+        finally:
+            queue.shutdown()
@@ -0,0 +1,135 @@
+import pytest
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audit_engine import AuditEngine
+from config import config
+from serve import expand_paths
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA_DIR = os.path.join(os.path.dirname(SERVICE_DIR), "backend", "test-data")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fetch(url, body=None, timeout=60):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read().decode()
+
+
+class TestSharedModels:
+    """Models memory-mapped so processes share their arrays"""
+
+    def make_model(self, tmp_path, **dump_kwargs):
+        from sklearn.neighbors import KNeighborsClassifier
+
+        X = np.random.RandomState(0).rand(500, 4)
+        path = str(tmp_path / "knn.joblib")
+        joblib.dump(KNeighborsClassifier().fit(X, X[:, 0] > 0.5), path, **dump_kwargs)
+        return path, X
+
+    def test_joblib_arrays_are_mapped(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "MODEL_MMAP", True)
+        path, X = self.make_model(tmp_path)
+        model, framework = AuditEngine()._deserialize_model(path)
+        assert framework == "sklearn"
+        assert isinstance(model._fit_X, np.memmap)
+        assert model._fit_X.filename == os.path.abspath(path)
+        assert (model.predict(X[:20]) == (X[:20, 0] > 0.5)).mean() > 0.8
+
+    def test_compressed_and_disabled_load_normally(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "MODEL_MMAP", True)
+        path, _ = self.make_model(tmp_path, compress=3)
+        model, _ = AuditEngine()._deserialize_model(path)
+        assert not isinstance(model._fit_X, np.memmap)
+
+        monkeypatch.setattr(config, "MODEL_MMAP", False)
+        path, _ = self.make_model(tmp_path)
+        model, _ = AuditEngine()._deserialize_model(path)
+        assert not isinstance(model._fit_X, np.memmap)
+
+    def test_expand_paths(self, tmp_path):
+        for name in ["a.pkl", "b.pkl", "c.onnx"]:
+            (tmp_path / name).write_bytes(b"")
+        paths = expand_paths([str(tmp_path / "*.pkl"), str(tmp_path / "a.pkl"), str(tmp_path / "missing.pkl")])
+        assert paths == [str(tmp_path / "a.pkl"), str(tmp_path / "b.pkl")]
+
+
+def child_pids(pid):
+    """Processes whose parent is pid."""
+    children = []
+    for entry in os.listdir("/proc"):
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name in brackets can contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if entry.isdigit() and int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+def test_preloading_server():
+    """One preloaded API process serves audits, its audit workers fork from it"""
+    port = free_port()
+    env = dict(
+        os.environ, SERVE_HOST="127.0.0.1", SERVE_PORT=str(port),
+        PRELOAD_MODULES="sklearn", PRELOAD_MODELS=os.path.join(TEST_DATA_DIR, "*.pkl"),
+        AUDIT_WORKERS="2", RESULT_STORE_MAX_MB="0", PREDICTION_STORE_MAX_MB="0"
+    )
+    server = subprocess.Popen(
+        [sys.executable, "serve.py"], cwd=SERVICE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                fetch(f"http://127.0.0.1:{port}/health", timeout=2)
+                break
+            except OSError:
+                assert server.poll() is None, server.stderr.read()
+                assert time.time() < deadline, "server did not come up"
+                time.sleep(0.2)
+        # the audit workers are forked before serving: the job queue's manager and AUDIT_WORKERS workers
+        assert len(child_pids(server.pid)) == 1 + 2
+
+        result = json.loads(fetch(f"http://127.0.0.1:{port}/audit", {
+            "audit_id": "preload-1",
+            "model_path": os.path.join(TEST_DATA_DIR, "test_model.pkl"),
+            "test_data_path": os.path.join(TEST_DATA_DIR, "test_data.csv"),
+            "audit_type": "bias",
+        }))
+        assert result["status"] == "completed"
+        # every request sees the same job queue
+        for _ in range(5):
+            job = json.loads(fetch(f"http://127.0.0.1:{port}/audit/preload-1"))
+            assert job["status"] == "completed"
+        # the server's own children: the job queue's manager and the AUDIT_WORKERS audit workers
+        assert len(child_pids(server.pid)) == 1 + 2
+        assert "audit_process_memory_bytes" in fetch(f"http://127.0.0.1:{port}/metrics/prometheus")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+    assert server.returncode == 0
+    log = server.stderr.read()
+    assert "Preloaded model" in log
+    assert "other threads running" not in log
@@ -0,0 +1,148 @@
+import pytest
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import joblib
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.datasets import dump_svmlight_file
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+
+from audit_engine import AuditEngine
+from explainability import sparse_importance
+from sparse_data import SparseFeatures, data_digest, is_sparse_path, load_sparse
+from tests.test_explainability import save_onnx_logistic
+
+
+def make_sparse(n=2000, d=5000, nnz=20, seed=0):
+    """Wide CSR features, a binary gender and labels that depend on both"""
+    rng = np.random.default_rng(seed)
+    rows = np.repeat(np.arange(n), nnz)
+    cols = np.concatenate([np.sort(rng.choice(d, nnz, replace=False)) for _ in range(n)])
+    X = sp.csr_matrix((rng.random(n * nnz), (rows, cols)), shape=(n, d))
+    gender = rng.integers(0, 2, n)
+    w = np.zeros(d)
+    w[:500] = rng.normal(size=500) * 4
+    y = ((X @ w + 0.5 * gender + rng.normal(size=n)) > 0).astype(int)
+    return X, gender, y
+
+
+class TestSparseData:
+    """Sparse test sets are audited without densifying them"""
+
+    def setup_method(self):
+        self.X, self.gender, self.y = make_sparse()
+        self.model = LogisticRegression(max_iter=500).fit(self.X, self.y)
+
+    def write_npz(self, tmp_path):
+        path = str(tmp_path / "test.npz")
+        sp.save_npz(path, self.X)
+        pd.DataFrame({
+            "gender": np.where(self.gender == 1, "f", "m"), "label": self.y
+        }).to_csv(tmp_path / "test.meta.csv", index=False)
+        return path
+
+    def write_parquet(self, tmp_path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            "indices": [self.X[i].indices.tolist() for i in range(self.X.shape[0])],
+            "values": [self.X[i].data.tolist() for i in range(self.X.shape[0])],
+            "gender": np.where(self.gender == 1, "f", "m"),
+            "label": self.y,
+        }).replace_schema_metadata({b"n_features": str(self.X.shape[1]).encode()})
+        path = str(tmp_path / "test.parquet")
+        pq.write_table(table, path)
+        return path
+
+    def audit(self, model_path, data_path, **kwargs):
+        return AuditEngine().run_audit(
+            model_path, audit_type="bias", sensitive_features=["gender"],
+            test_data_path=data_path, **kwargs
+        )
+
+    def test_formats_load_the_same_matrix(self, tmp_path):
+        npz = self.write_npz(tmp_path)
+        parquet = self.write_parquet(tmp_path)
+        svm = str(tmp_path / "test.svm")
+        dump_svmlight_file(self.X, self.y, svm, zero_based=True)
+
+        assert all(is_sparse_path(p) for p in (npz, parquet, svm))
+        assert not is_sparse_path(os.path.join(os.path.dirname(__file__), "..", "test_data", "test_data.csv"))
+        for path in (npz, parquet, svm):
+            matrix, side, y = load_sparse(path, zero_based=True)
+            # libsvm is text, so equal up to float formatting
+            assert abs(matrix - self.X).max() < 1e-12
+            np.testing.assert_array_equal(y, self.y)
+        assert list(load_sparse(npz)[1].columns) == ["gender"]
+
+    def test_audit_matches_dense_predictions(self, tmp_path, settings):
+        settings(PREDICTION_STORE_MAX_MB=0)
+        model_path = str(tmp_path / "model.joblib")
+        joblib.dump(self.model, model_path)
+        engine = AuditEngine()
+        dense_pred = self.model.predict(self.X.toarray())
+        expected = engine._group_counts(
+            self.y, dense_pred, pd.DataFrame({"gender": np.where(self.gender == 1, "f", "m")}), ["gender"]
+        )
+        expected = engine._bias_metrics_from_groups(engine._analyze_groups(expected))
+
+        for path in (self.write_npz(tmp_path), self.write_parquet(tmp_path)):
+            results = self.audit(model_path, path, streaming=True)
+            assert results["bias_metrics"] == pytest.approx(expected)
+            memory = results["memory"]
+            assert memory["sparse"]["features"] == self.X.shape[1]
+            assert memory["sparse"]["nnz"] == self.X.nnz
+            # a dense float64 frame would be ~80MB
+            assert memory["features_mb"] < 1
+
+    def test_dense_only_model_is_densified_in_batches(self, settings):
+        settings(INFERENCE_BATCH_ROWS=256)
+        X = self.X[:, :50]
+        model = HistGradientBoostingClassifier(max_iter=10).fit(X.toarray(), self.y)
+        features = SparseFeatures(X, pd.DataFrame({"gender": self.gender}))
+        pred = AuditEngine()._get_predictions(model, features, "sklearn")
+        np.testing.assert_array_equal(pred, model.predict(X.toarray()))
+
+    def test_onnx_model_gets_padded_dense_batches(self, tmp_path, settings):
+        pytest.importorskip("onnxruntime")
+
+        d = 40
+        coef = np.linspace(-2, 2, d)
+        settings(ONNX_BATCH_ROWS=300)
+        engine = AuditEngine()
+        model, framework = engine._load_model(save_onnx_logistic(tmp_path / "model.onnx", coef, 0.0))
+        # the file never has the last feature, so the matrix is one column short
+        X = sp.csr_matrix(self.X[:, :d - 1])
+        features = SparseFeatures(X, pd.DataFrame({"gender": self.gender}))
+        scores = engine._predict_scores(model, features, framework)
+        expected = 1 / (1 + np.exp(-(X @ coef[:-1])))
+        np.testing.assert_allclose(scores, expected, rtol=1e-4)
+
+    def test_sidecar_is_part_of_the_data(self, tmp_path):
+        path = self.write_npz(tmp_path)
+        before = data_digest(path)
+        pd.DataFrame({"gender": self.gender, "label": self.y}).to_csv(tmp_path / "test.meta.csv", index=False)
+        assert data_digest(path) != before
+
+    def test_npz_without_sidecar(self, tmp_path):
+        path = str(tmp_path / "alone.npz")
+        sp.save_npz(path, self.X)
+        with pytest.raises(ValueError, match="sidecar"):
+            load_sparse(path)
+
+    def test_linear_importance_matches_shap(self):
+        shap = pytest.importorskip("shap")
+        X = self.X[:300, :40]
+        model = LogisticRegression().fit(X, self.y[:300])
+        importance, kind = sparse_importance(model, X)
+        dense = X.toarray()
+        # the full data as background (shap would subsample it)
+        values = shap.LinearExplainer(model, (dense.mean(axis=0), None)).shap_values(dense)
+        assert kind == "linear"
+        np.testing.assert_allclose(importance, np.abs(values).mean(axis=0), rtol=1e-6, atol=1e-12)
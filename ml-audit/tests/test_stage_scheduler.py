@@ -0,0 +1,60 @@
+import pytest
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stage_scheduler import StageScheduler
+
+
+class TestStageScheduler:
+    """Audit stages run as soon as their dependencies are done"""
+
+    def test_dependencies_run_first(self):
+        order = []
+        scheduler = StageScheduler(max_workers=4)
+        scheduler.add("groups", lambda: order.append("groups"))
+        scheduler.add("bias", lambda: order.append("bias"), after=["groups"])
+        scheduler.add("fairness", lambda: order.append("fairness"), after=["groups"])
+        scheduler.add("compliance", lambda: order.append("compliance"), after=scheduler.stages)
+        scheduler.run()
+
+        assert order[0] == "groups"
+        assert order[-1] == "compliance"
+        assert sorted(order[1:3]) == ["bias", "fairness"]
+
+    def test_independent_stages_overlap(self):
+        # each stage waits for the other, which only works if both run at once
+        barrier = threading.Barrier(2, timeout=5)
+        scheduler = StageScheduler(max_workers=2)
+        scheduler.add("groups", barrier.wait)
+        scheduler.add("explainability", barrier.wait)
+        scheduler.run()
+
+    def test_single_worker_runs_in_order(self):
+        order = []
+        scheduler = StageScheduler(max_workers=1)
+        for name in ["a", "b", "c"]:
+            scheduler.add(name, lambda name=name: order.append((name, threading.current_thread())))
+        scheduler.run()
+        assert [name for name, _ in order] == ["a", "b", "c"]
+        assert all(thread is threading.current_thread() for _, thread in order)
+
+    def test_error_skips_dependents(self):
+        ran = []
+
+        def fail():
+            raise RuntimeError("boom")
+
+        scheduler = StageScheduler(max_workers=4)
+        scheduler.add("groups", fail)
+        scheduler.add("bias", lambda: ran.append("bias"), after=["groups"])
+        with pytest.raises(RuntimeError):
+            scheduler.run()
+        assert ran == []
+
+    def test_unknown_dependency(self):
+        scheduler = StageScheduler()
+        with pytest.raises(ValueError):
+            scheduler.add("bias", lambda: None, after=["groups"])
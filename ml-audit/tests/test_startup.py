@@ -0,0 +1,51 @@
+import pytest
+import subprocess
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from warmup import Warmup
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["shap", "sklearn", "fairlearn", "aif360", "torch", "tensorflow", "onnxruntime"]
+
+
+def import_main():
+    """Import main in a fresh interpreter, return the heavy modules it loaded."""
+    code = (
+        "import sys\n"
+        "import main\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=SERVICE_DIR,
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()
+    return [m for m in (out[-1] if out else "").split(",") if m]
+
+
+def test_no_heavy_imports_at_startup():
+    # what keeps startup fast; a wall clock budget would flake on busy CI runners
+    assert import_main() == []
+
+
+def test_warmup_loads_modules():
+    warmup = Warmup(["json", "definitely_not_a_module"])
+    warmup.start()
+    assert warmup.wait(timeout=10)
+
+    status = warmup.status()
+    assert status["ready"]
+    assert "json" in status["modules"]
+    assert "definitely_not_a_module" in status["errors"]
+
+
+def test_ready_endpoint():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    response = TestClient(app).get("/ready")
+    assert response.status_code in (200, 503)
+    assert "ready" in response.json()
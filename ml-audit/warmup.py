@@ -0,0 +1,80 @@
+"""
+Background preloading of the heavy ML libraries.
+
+Importing shap / sklearn / torch takes seconds, so the service doesn't do it
+at import time. Instead a thread pulls them in right after startup and the
+readiness endpoint reports when that's done. Worker processes forked after
+that inherit the loaded modules.
+"""
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Imports a list of modules on a background thread."""
+
+    def __init__(self, modules: List[str]):
+        self.modules = modules
+        self.ready = threading.Event()
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None or self.ready.is_set():
+            return
+        if not self.modules:
+            self.ready.set()
+            return
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """Import the modules on this thread instead, for serve.py."""
+        if self._thread is None and not self.ready.is_set():
+            self._run()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.ready.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready.is_set(),
+            "modules": {m: round(t, 3) for m, t in self.timings.items()},
+            "errors": dict(self.errors),
+        }
+
+    def _run(self):
+        for name in self.modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+                if name == "shap":
+                    _compile_shap()
+            except Exception as e:
+                # optional frameworks (torch, tensorflow) might not be installed
+                logger.warning(f"Warmup could not load {name}: {e}")
+                self.errors[name] = str(e)
+                continue
+            self.timings[name] = time.perf_counter() - start
+        logger.info(f"Warmup finished in {sum(self.timings.values()):.1f}s")
+        self.ready.set()
+
+
+def _compile_shap():
+    """Run a tiny permutation explanation so numba compiles shap's kernels now."""
+    import numpy as np
+    from explainability import build_explainer, compute_shap_values
+
+    class _Toy:
+        def predict(self, X):
+            return X.sum(axis=1)
+
+    X = np.random.RandomState(0).randn(20, 3)
+    explainer, kind = build_explainer(_Toy(), X, preferred="permutation", background_k=0)
+    compute_shap_values(explainer, kind, X[:2], nsamples=10)